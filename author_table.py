@@ -0,0 +1,220 @@
+__author__ = 'jorgesaldivar'
+
+
+import collections
+import csv
+import itertools
+import numpy
+import os
+import re
+import shutil
+
+
+ADMIN = 1  # bits of the flags of authors
+MODERATOR = 2
+ADMIN_COLUMN, MODERATOR_COLUMN = 2, 3
+HEADER_LINES = 2  # observation date and header
+SAMPLE_SIZE = 1000  # rows read to infer the layout of a file
+REPORT = 'data/malformed_authors.txt'
+DATETIME = re.compile(r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d*)?(Z|[+-]\d{2}:?\d{2})?$')
+
+
+def is_int(value):
+    try:
+        int(value)
+        return True
+    except ValueError:
+        return False
+
+
+###
+# Layout of the exports of authors
+#
+# Exports of authors don't always have the same columns,
+# the layout of every file is inferred once from a sample
+# of its rows. The registration datetime is the last
+# column holding datetimes and the community the last
+# one holding integers, in most of the rows where they
+# aren't empty. Admin and moderator flags are the third
+# and fourth columns
+###
+def infer_layout(fname, sample):
+    width = collections.Counter(len(row) for row in sample).most_common(1)[0][0] \
+        if sample else 0
+    rows = [row for row in sample if len(row) == width]
+    registration, community = None, None
+    for idx in range(width):
+        values = [row[idx] for row in rows if row[idx]]
+        if not values:
+            continue
+        if sum(1 for value in values if DATETIME.match(value)) * 2 > len(values):
+            registration = idx
+        if sum(1 for value in values if is_int(value)) * 2 > len(values):
+            community = idx
+    if rows and community is None:
+        raise Exception('The community of the authors in {} couldn\'t be found'.format(fname))
+    if rows and width <= MODERATOR_COLUMN:
+        raise Exception('The authors in {} have no admin and moderator flags'.format(fname))
+    return {'width': width, 'registration': registration, 'community': community}
+
+
+###
+# Read the authors of an export. Columns are located once
+# (see infer_layout) and parsed directly, rows that don't
+# follow the layout of their file (wrong number of columns,
+# community that isn't a number, registration that isn't a
+# datetime) are skipped and added to malformed with the
+# reason. Authors are added to columns, a list by field.
+# An empty registration is an unknown one, not an error
+###
+def read_authors(fname, to_epoch, columns, malformed):
+    with open(fname, 'rb') as csv_authors:
+        reader_authors = csv.reader(csv_authors, delimiter=',')
+        for _ in range(HEADER_LINES):
+            next(reader_authors, None)
+        sample = []
+        for author in reader_authors:
+            sample.append((reader_authors.line_num, author))
+            if len(sample) == SAMPLE_SIZE:
+                break
+        layout = infer_layout(fname, [author for _, author in sample])
+        width, idx_registration, idx_community = \
+            layout['width'], layout['registration'], layout['community']
+        ids, epochs, communities, flags = columns
+        rest = ((reader_authors.line_num, author) for author in reader_authors)
+        for line_num, author in itertools.chain(sample, rest):
+            if len(author) != width:
+                malformed.append((fname, line_num, 'has {} columns instead of {}'.
+                                  format(len(author), width)))
+                continue
+            reg_datetime = author[idx_registration] if idx_registration is not None else ''
+            if reg_datetime and not DATETIME.match(reg_datetime):
+                malformed.append((fname, line_num, 'registration {} isn\'t a datetime'.
+                                  format(reg_datetime)))
+                continue
+            try:
+                community = int(author[idx_community])
+            except ValueError:
+                malformed.append((fname, line_num, 'community {} isn\'t a number'.
+                                  format(author[idx_community])))
+                continue
+            epoch = to_epoch(reg_datetime)
+            ids.append(author[0])
+            epochs.append(numpy.nan if epoch is None else epoch)
+            communities.append(community)
+            flags.append((ADMIN if author[ADMIN_COLUMN] == 'True' else 0) |
+                         (MODERATOR if author[MODERATOR_COLUMN] == 'True' else 0))
+
+    return columns
+
+
+def save_report(malformed, fname=REPORT):
+    with open(fname, 'w') as f_report:
+        for fname_authors, line_num, reason in malformed:
+            f_report.write('{}:{}: {}\n'.format(fname_authors, line_num, reason))
+
+
+###
+# Table of authors
+#
+# One array by field, sorted by author id: registration
+# as seconds since epoch (nan when unknown), community
+# and flags (see ADMIN and MODERATOR). Ids of many
+# authors are looked up at once with a binary search,
+# a dictionary of positions is only built when authors
+# are looked up one by one. When an author appears more
+# than once, the last row wins
+###
+class AuthorTable(object):
+
+    def __init__(self, ids, registration_epochs, communities, flags, is_sorted=False):
+        ids = numpy.asarray(ids, dtype=numpy.string_)
+        if is_sorted:
+            order = slice(None)
+        else:
+            # stable, so the last row of an author is the last
+            # one of its run of equal ids
+            order = numpy.argsort(ids, kind='mergesort')
+            sorted_ids = ids[order]
+            last = numpy.ones(len(order), dtype=bool)
+            last[:-1] = sorted_ids[1:] != sorted_ids[:-1]
+            order = order[last]
+        self.ids = ids[order]
+        self.registration_epochs = numpy.asarray(registration_epochs, dtype=numpy.float64)[order]
+        self.communities = numpy.asarray(communities, dtype=numpy.int32)[order]
+        self.flags = numpy.asarray(flags, dtype=numpy.uint8)[order]
+        self.index = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, author_id):
+        return self.position(author_id) >= 0
+
+    def positions(self, author_ids):
+        # position of the authors in the table, -1 if unknown
+        author_ids = numpy.asarray(author_ids, dtype=numpy.string_)
+        if len(self.ids) == 0:
+            return numpy.full(len(author_ids), -1, dtype=numpy.int64)
+        positions = numpy.searchsorted(self.ids, author_ids)
+        positions[positions == len(self.ids)] = 0
+        return numpy.where(self.ids[positions] == author_ids, positions, -1)
+
+    def position(self, author_id):
+        if self.index is None:
+            self.index = dict((author_id, position) for position, author_id
+                              in enumerate(self.ids.tolist()))
+        return self.index.get(author_id, -1)
+
+    def registration_epoch(self, author_id):
+        position = self.position(author_id)
+        if position < 0:
+            return None
+        epoch = self.registration_epochs[position]
+        return None if epoch != epoch else float(epoch)  # nan
+
+    def is_admin_or_mod(self, author_id):
+        position = self.position(author_id)
+        return position >= 0 and bool(self.flags[position] & (ADMIN | MODERATOR))
+
+    def admins_or_mods(self, author_ids):
+        # whether each author is admin or moderator, unknown
+        # authors aren't
+        positions = self.positions(author_ids)
+        flags = numpy.where(positions >= 0, self.flags[positions], 0) if len(self.ids) > 0 \
+            else numpy.zeros(len(positions), dtype=numpy.uint8)
+        return (flags & (ADMIN | MODERATOR)) != 0
+
+    def merge(self, table):
+        # authors of both tables, the ones of table win
+        return AuthorTable(numpy.concatenate((self.ids, table.ids)),
+                           numpy.concatenate((self.registration_epochs,
+                                              table.registration_epochs)),
+                           numpy.concatenate((self.communities, table.communities)),
+                           numpy.concatenate((self.flags, table.flags)))
+
+    def save(self, path):
+        # the table is written in a temporary directory that
+        # replaces the previous one
+        tmp_path = path + '.tmp'
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+        for name in ('ids', 'registration_epochs', 'communities', 'flags'):
+            numpy.save(os.path.join(tmp_path, name + '.npy'), getattr(self, name))
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.rename(tmp_path, path)
+
+
+def load_table(path):
+    return AuthorTable(*[numpy.load(os.path.join(path, name + '.npy')) for name in
+                         ('ids', 'registration_epochs', 'communities', 'flags')],
+                       is_sorted=True)
+
+
+def read_table(fnames, to_epoch, malformed):
+    columns = ([], [], [], [])
+    for fname in fnames:
+        read_authors(fname, to_epoch, columns, malformed)
+    return AuthorTable(*columns)
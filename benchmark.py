@@ -0,0 +1,244 @@
+__author__ = 'jorgesaldivar'
+
+
+import argparse
+import cache_manifest
+import data_correctness_checker
+import datetime
+import external_sort
+import json
+import metric_calculator
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import synthetic_data
+import tempfile
+import time
+
+
+HISTORY = 'data/benchmark_history.json'
+BASELINE = 'data/benchmark_baseline.json'
+MIN_SECONDS = 0.1  # faster stages are too noisy to be compared
+SIZES = {
+    # communities, mean ideas by community
+    'small': (20, 50),
+    'medium': (100, 200),
+    'large': (200, 1000)
+}
+
+
+###
+# Benchmark of the stages of the pipeline
+#
+# Every stage runs on synthetic exports (see
+# synthetic_data) of a few fixed sizes, always generated
+# with the same seed. Stages run in the order of the
+# pipeline, each one in its own process so its peak
+# memory can be measured, after the cached files it
+# depends on were built by the previous stages. The
+# cached files a stage builds are removed before it
+# runs, the cache ignores the number of workers and a
+# stage would otherwise time a cache hit. Wall
+# time, rows processed by second and peak memory are
+# added to a history file and compared against a
+# baseline, a stage fails when it is slower or uses
+# more memory than the baseline by more than the
+# given threshold.
+###
+def stage_checker(workers):
+    fname_ideas, fname_comments, _ = \
+        external_sort.sort_exports(*metric_calculator.CACHED_FILES[metric_calculator.DATASET][0])
+    idea_index = data_correctness_checker.index_ideas(fname_ideas)
+    data_correctness_checker.save_report(*data_correctness_checker.check_comments(fname_comments,
+                                                                                  idea_index))
+
+
+def stage_build_dataset(workers):
+    metric_calculator.load_data()
+
+
+def stage_load_authors(workers):
+    metric_calculator.load_authors()
+
+
+def stage_gather_data(workers):
+    metric_calculator.collect_data_for_metrics(workers)
+
+
+def stage_compute_metrics(workers):
+    return metric_calculator.compute_metrics(workers)
+
+
+def stage_save_metric_results(workers, community_metrics):
+    metric_calculator.save_metric_results(community_metrics)
+
+
+def stage_interventions(workers):
+    metric_calculator.compute_influence_mod_intervention(workers)
+
+
+def stage_participation(workers):
+    metric_calculator.compute_participation_level()
+
+
+# name, function, stage whose result is passed to it
+# (not timed), rows it processes and cached files it
+# builds
+STAGES = [
+    ('checker', stage_checker, None, 'exports', []),
+    ('build_dataset', stage_build_dataset, None, 'exports', [metric_calculator.DATASET]),
+    ('load_authors', stage_load_authors, None, 'authors', [metric_calculator.AUTHORS]),
+    ('gather_data', stage_gather_data, None, 'exports', [metric_calculator.METRIC_DATA]),
+    ('compute_metrics', stage_compute_metrics, None, 'communities',
+     [metric_calculator.METRIC_DATA, metric_calculator.COMMUNITY_METRICS]),
+    ('save_metric_results', stage_save_metric_results, stage_compute_metrics, 'communities', []),
+    ('compute_influence_mod_intervention', stage_interventions, None, 'exports', []),
+    ('compute_participation_level', stage_participation, None, 'exports', [])
+]
+
+
+def clear_cached(artifacts):
+    for artifact in artifacts:
+        if os.path.isdir(artifact):
+            shutil.rmtree(artifact)
+        elif os.path.exists(artifact):
+            os.remove(artifact)
+        cache_manifest.forget(artifact)
+
+
+def run_stage(connection, path, stage, setup, workers, artifacts):
+    os.chdir(path)
+    # progress of the pipeline isn't part of the report
+    sys.stdout = open(os.devnull, 'w')
+    clear_cached(artifacts)
+    args = [workers]
+    if setup is not None:
+        args.append(setup(workers))
+    start = time.time()
+    stage(*args)
+    seconds = time.time() - start
+    # kilobytes on linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    connection.send({'seconds': seconds, 'peak_rss_mb': peak_rss / 1024.0})
+    connection.close()
+
+
+def time_stage(path, stage, setup, workers, artifacts):
+    parent_connection, child_connection = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=run_stage, args=(child_connection, path, stage,
+                                                              setup, workers, artifacts))
+    process.start()
+    child_connection.close()
+    try:
+        result = parent_connection.recv()
+    except EOFError:
+        result = None
+    process.join()
+    if result is None or process.exitcode != 0:
+        raise RuntimeError('Stage {} failed (exit code {})'.format(stage.__name__,
+                                                                   process.exitcode))
+    return result
+
+
+def benchmark_size(path, size, seed, workers):
+    communities, ideas = SIZES[size]
+    os.makedirs(os.path.join(path, 'data'))
+    rows = synthetic_data.SyntheticExports(os.path.join(path, 'data'), seed, communities,
+                                           ideas).write()
+    rows = {'exports': rows['ideas'] + rows['comments'] + rows['votes'],
+            'authors': rows['authors'], 'communities': communities}
+    results = {}
+    for name, stage, setup, stage_rows, artifacts in STAGES:
+        result = time_stage(path, stage, setup, workers, artifacts)
+        result['rows'] = rows[stage_rows]
+        result['rows_per_second'] = rows[stage_rows] / max(result['seconds'], 1e-6)
+        results[name] = result
+        print('{:>8} {:<36} {:>9.2f}s {:>12.0f} rows/s {:>9.1f} MB'.
+              format(size, name, result['seconds'], result['rows_per_second'],
+                     result['peak_rss_mb']))
+    return results
+
+
+def regressions(run, baseline, threshold):
+    failures = []
+    for size, stages in run['sizes'].iteritems():
+        for name, result in stages.iteritems():
+            base_result = baseline['sizes'].get(size, {}).get(name)
+            if base_result is None:
+                continue
+            if result['seconds'] >= MIN_SECONDS and \
+               result['seconds'] > base_result['seconds'] * (1 + threshold / 100.0):
+                failures.append('{} {}: {:.2f}s, baseline {:.2f}s'.
+                                format(size, name, result['seconds'], base_result['seconds']))
+            if result['peak_rss_mb'] > base_result['peak_rss_mb'] * (1 + threshold / 100.0):
+                failures.append('{} {}: {:.1f} MB, baseline {:.1f} MB'.
+                                format(size, name, result['peak_rss_mb'],
+                                       base_result['peak_rss_mb']))
+    return failures
+
+
+def load_json(fname, default):
+    try:
+        with open(fname, 'rb') as json_file:
+            return json.load(json_file)
+    except (IOError, ValueError):
+        return default
+
+
+def save_json(fname, content):
+    with open(fname, 'w') as json_file:
+        json.dump(content, json_file, sort_keys=True, indent=1)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Time the stages of the pipeline on '
+                                                     'synthetic data and check them against '
+                                                     'a baseline')
+    arg_parser.add_argument('--sizes', nargs='+', default=['small', 'medium'],
+                            choices=sorted(SIZES.keys()))
+    arg_parser.add_argument('--seed', type=int, default=1)
+    arg_parser.add_argument('--workers', type=int, default=1)
+    arg_parser.add_argument('--threshold', type=float, default=20,
+                            help='max slowdown or memory growth (percentage) against the '
+                                 'baseline before failing')
+    arg_parser.add_argument('--history', default=HISTORY)
+    arg_parser.add_argument('--baseline', default=BASELINE)
+    arg_parser.add_argument('--save-baseline', action='store_true',
+                            help='save this run as the baseline')
+    arg_parser.add_argument('--label', default='', help='label of the run in the history')
+    args = arg_parser.parse_args()
+
+    run = {'date': datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+           'label': args.label, 'python': platform.python_version(), 'seed': args.seed,
+           'workers': args.workers, 'sizes': {}}
+    work_path = tempfile.mkdtemp(prefix='benchmark_')
+    try:
+        for size in args.sizes:
+            run['sizes'][size] = benchmark_size(os.path.join(work_path, size), size, args.seed,
+                                                args.workers)
+    finally:
+        shutil.rmtree(work_path)
+
+    history = load_json(args.history, [])
+    history.append(run)
+    save_json(args.history, history)
+    baseline = load_json(args.baseline, None)
+    if args.save_baseline or baseline is None:
+        print('Saving the run as baseline ({})'.format(args.baseline))
+        save_json(args.baseline, run)
+        sys.exit(0)
+    if baseline['seed'] != run['seed'] or baseline['workers'] != run['workers']:
+        print('The baseline was run with other settings (seed {}, {} workers), '
+              'it can\'t be compared'.format(baseline['seed'], baseline['workers']))
+        sys.exit(1)
+    failures = regressions(run, baseline, args.threshold)
+    if failures:
+        print('Stages slower or bigger than the baseline by more than {}%:'.
+              format(args.threshold))
+        for failure in failures:
+            print('  ' + failure)
+        sys.exit(1)
+    print('No stage regressed more than {}%'.format(args.threshold))
@@ -0,0 +1,141 @@
+__author__ = 'jorgesaldivar'
+
+
+from contextlib import contextmanager
+
+import hashlib
+import json
+import os
+
+
+MANIFEST = 'data/cache_manifest.json'
+BLOCK_SIZE = 1 << 20  # bytes read at once when hashing files
+
+
+###
+# Cache manifest
+#
+# Intermediate files (sorted exports, data set, authors,
+# data collected for metrics) are cached between runs.
+# The manifest records for every cached file (artifact)
+# a key computed from the content of its inputs, the
+# version of the code that produced it and the
+# configuration used. An artifact is reused only while
+# its key doesn't change, i.e., touching an input
+# doesn't invalidate the cache but editing it does.
+#
+# Inputs are hashed once, their hashes are kept along
+# with their size and modification time so unchanged
+# files aren't hashed again.
+#
+# Artifacts updated in place (see incremental_update)
+# keep their key, the deltas applied are recorded and
+# change their build id, which is what artifacts built
+# from them depend on.
+###
+def load_manifest(fname=MANIFEST):
+    try:
+        with open(fname, 'rb') as json_manifest:
+            manifest = json.load(json_manifest)
+        if 'artifacts' in manifest and 'files' in manifest:
+            return manifest
+    except (IOError, ValueError):
+        pass
+    return {'artifacts': {}, 'files': {}}
+
+
+def save_manifest(manifest, fname=MANIFEST):
+    with atomic_write(fname) as json_manifest:
+        json.dump(manifest, json_manifest, sort_keys=True, indent=1)
+
+
+@contextmanager
+def atomic_write(fname, mode='w'):
+    # readers see either the previous file or the new one,
+    # never a partially written file
+    tmp_fname = fname + '.tmp'
+    with open(tmp_fname, mode) as tmp_file:
+        yield tmp_file
+        tmp_file.flush()
+        os.fsync(tmp_file.fileno())
+    os.rename(tmp_fname, fname)
+
+
+def file_digest(manifest, fname):
+    stat = os.stat(fname)
+    cached = manifest['files'].get(fname)
+    if cached is not None and cached['size'] == stat.st_size and \
+       cached['mtime'] == stat.st_mtime:
+        return cached['sha1']
+    sha1 = hashlib.sha1()
+    with open(fname, 'rb') as input_file:
+        for block in iter(lambda: input_file.read(BLOCK_SIZE), b''):
+            sha1.update(block)
+    manifest['files'][fname] = {'size': stat.st_size, 'mtime': stat.st_mtime,
+                                'sha1': sha1.hexdigest()}
+    return sha1.hexdigest()
+
+
+def artifact_key(manifest, fnames_in, version, config=None):
+    digests = [(fname, file_digest(manifest, fname)) for fname in fnames_in]
+    description = json.dumps([version, config, digests], sort_keys=True)
+    return hashlib.sha1(description).hexdigest()
+
+
+def recorded_build(artifact, fname=MANIFEST):
+    # id of the last build of an artifact, artifacts built
+    # from other artifacts include it in their configuration
+    entry = load_manifest(fname)['artifacts'].get(artifact)
+    return entry['build'] if entry else None
+
+
+def recorded_config(artifact, fname=MANIFEST):
+    # configuration of the last build of an artifact
+    entry = load_manifest(fname)['artifacts'].get(artifact)
+    return entry['config'] if entry else None
+
+
+def is_fresh(artifact, fnames_in, version, config=None, fname=MANIFEST):
+    if not os.path.exists(artifact):
+        return False
+    manifest = load_manifest(fname)
+    entry = manifest['artifacts'].get(artifact)
+    if entry is None:
+        return False
+    try:
+        key = artifact_key(manifest, fnames_in, version, config)
+    except OSError:
+        # missing input
+        return False
+    save_manifest(manifest, fname)  # keep the hashes computed
+    return entry['key'] == key
+
+
+def record(artifact, fnames_in, version, config=None, fname=MANIFEST):
+    manifest = load_manifest(fname)
+    key = artifact_key(manifest, fnames_in, version, config)
+    manifest['artifacts'][artifact] = {'key': key, 'build': key, 'deltas': [],
+                                       'inputs': list(fnames_in), 'version': version,
+                                       'config': config}
+    save_manifest(manifest, fname)
+    return key
+
+
+def record_delta(artifact, fnames_delta, fname=MANIFEST):
+    manifest = load_manifest(fname)
+    entry = manifest['artifacts'].get(artifact)
+    if entry is None:
+        return None
+    entry['deltas'].append([(fname_delta, file_digest(manifest, fname_delta))
+                            for fname_delta in fnames_delta])
+    entry['build'] = hashlib.sha1(json.dumps([entry['key'], entry['deltas']])).hexdigest()
+    save_manifest(manifest, fname)
+    return entry['build']
+
+
+def forget(artifact, fname=MANIFEST):
+    # the artifact was written outside of the cache, it
+    # has to be rebuilt before being reused
+    manifest = load_manifest(fname)
+    if manifest['artifacts'].pop(artifact, None) is not None:
+        save_manifest(manifest, fname)
@@ -1,114 +1,147 @@
 __author__ = 'jorgesaldivar'
 
 
+import ast
+import cache_manifest
 import csv
+import external_sort
 
 
-def exists_idea_in_community(ideas_vec, idea_id, community_id):
-    total_ideas = len(ideas_vec)
+###
+# Index of the ideas of the data set by community
+# and idea id, built in one pass over the ideas
+###
+def index_ideas(fname_ideas):
+    idea_index = set()
 
-    for idx in range(0, total_ideas):
-        line_idea = ideas_vec[idx]
-        if line_idea[12] == community_id:
-            if line_idea[0] == idea_id:
-                return True
-        else:
-            return False
+    with open(fname_ideas) as csv_ideas:
+        reader_ideas = csv.reader(csv_ideas, delimiter=',')
+        next(reader_ideas)  # header
+        for line_idea in reader_ideas:
+            idea_index.add((line_idea[12], line_idea[0]))
 
-    return False
+    return idea_index
 
 
-def remove_ideas(ideas_vec, community_id):
-    total_ideas = len(ideas_vec)
-    idx_to_remove = 0
+def orphaned_replies(replies, top_comment_ids):
+    # ids of the replies whose chain of parents doesn't end
+    # in a comment to an idea of the community, replies to
+    # replies are fine as long as their chain does
+    parents = dict(replies)
+    resolved = dict.fromkeys(top_comment_ids, True)
+    for reply_id, _ in replies:
+        chain, comment_id = [], reply_id
+        while comment_id not in resolved and comment_id in parents:
+            resolved[comment_id] = False  # until the end of the chain is found, breaks cycles
+            chain.append(comment_id)
+            comment_id = parents[comment_id]
+        is_resolved = resolved.get(comment_id, False)
+        for chain_id in chain:
+            resolved[chain_id] = is_resolved
+    return set(reply_id for reply_id, _ in replies if not resolved[reply_id])
 
-    for idx in range(0, total_ideas):
-        line_idea = ideas_vec[idx]
-        if line_idea[12] == community_id:
-            idx_to_remove += 1
-        else:
-            break
 
-    ideas_vec = ideas_vec[idx_to_remove:]
-    return ideas_vec
+def community_errors(community_id, error_ids, replies, top_comment_ids, errors):
+    orphaned_ids = orphaned_replies(replies, top_comment_ids)
+    orphaned_ids = [reply_id for reply_id, _ in replies if reply_id in orphaned_ids]
+    error_ids += orphaned_ids
+    if len(error_ids) > 0:
+        errors.append({'community': community_id, 'errors': len(error_ids), 'ids': error_ids})
+    return len(orphaned_ids)
 
 
-if __name__ == '__main__':
-    print('Checking data correctness...')
-
+###
+# Check the comments in one pass. Comments are grouped by
+# community, comments to ideas are looked up in the index
+# of ideas and replies are checked against the comments
+# of their community when the community ends
+###
+def check_comments(fname_comments, idea_index):
     errors = []
-    num_errors = 0
     total_errors = 0
-    community_id = None
-    error_ids = []
     total_comments = 0
-    orphaned_replies = []
+    community_id = None
+    error_ids, replies, top_comment_ids = [], [], set()
 
-    with open('data/idsc_ideas_no_text_last.csv') as csv_ideas:
-        reader_ideas = csv.reader(csv_ideas, delimiter=',')
-        list_ideas = list(reader_ideas)[1:]
-        with open('data/idsc_comments_no_text_last.csv') as csv_comments:
-            reader_comments = csv.reader(csv_comments, delimiter=',')
-            for comment in reader_comments:
-                if comment[0] == 'Observation Date':
-                    continue
-                if comment[0] == 'id':
-                    continue
-                total_comments += 1
-                if community_id is None:
-                    community_id = comment[9]
-                if community_id != comment[9]:
-                    num_orphaned_replies = len(orphaned_replies)
-                    if num_orphaned_replies > 0:
-                        num_errors += len(orphaned_replies)
-                        total_errors += len(orphaned_replies)
-                        for orphaned_reply in orphaned_replies:
-                            error_ids.append(orphaned_reply[0])
-                    if num_errors > 0 and community_id is not None:
-                        errors.append({'community': community_id,
-                                       'errors': num_errors,
-                                       'ids': error_ids})
-                    # Delete from list ideas belonging to previous community
-                    # Implemented this as a loop to take of communities
-                    # without comments
-                    while list_ideas[0][12] != comment[9]:
-                        list_ideas = remove_ideas(list_ideas, community_id)
-                        community_id = list_ideas[0][12]
-                    community_id = comment[9]
-                    num_errors = 0
-                    error_ids = []
-                    orphaned_replies = []
-                parent_type = comment[7]
-                if parent_type == 'idea':
-                    # search parent
-                    for reply in list(orphaned_replies):
-                        if reply[8] == comment[0]:
-                            orphaned_replies.pop(orphaned_replies.index(reply))
-                    if not exists_idea_in_community(list_ideas, comment[8], comment[9]):
-                        total_errors += 1
-                        num_errors += 1
-                        error_ids.append(comment[0])
-                else:
-                    # assume that reply is orphaned
-                    orphaned_replies.append(comment)
-            csv_comments.close()
-        csv_ideas.close()
+    with open(fname_comments) as csv_comments:
+        reader_comments = csv.reader(csv_comments, delimiter=',')
+        for comment in reader_comments:
+            if comment[0] == 'Observation Date':
+                continue
+            if comment[0] == 'id':
+                continue
+            total_comments += 1
+            if community_id is None:
+                community_id = comment[9]
+            if community_id != comment[9]:
+                total_errors += community_errors(community_id, error_ids, replies,
+                                                 top_comment_ids, errors)
+                community_id = comment[9]
+                error_ids, replies, top_comment_ids = [], [], set()
+            if comment[7] == 'idea':
+                top_comment_ids.add(comment[0])
+                if (comment[9], comment[8]) not in idea_index:
+                    total_errors += 1
+                    error_ids.append(comment[0])
+            else:
+                replies.append((comment[0], comment[8]))
+    if community_id is not None:
+        total_errors += community_errors(community_id, error_ids, replies, top_comment_ids,
+                                         errors)
+
+    return total_comments, total_errors, errors
 
+
+def save_report(total_comments, total_errors, errors, fname_orphans='data/orphaned_comments.txt',
+                fname_output='data/output_checker.txt'):
     # Print out a report and save into a file the id of the
     # "orphan" comments, comments whose idea parents exist
     # but were missed during the creation of the data set
-    f_orphan = open('data/orphaned_comments.txt', 'w')
-    f_output = open('data/output_checker.txt', 'w')
-    f_output.write('Out of {} comments, {} ({}) have problems\n\n\n'.
-                    format(total_comments, total_errors,
-                           float(total_errors)/float(total_comments)))
-    for error in errors:
-        output_line = 'Community {} --------------------------------\n'.format(error['community'])
-        output_line += 'It has {} comments placed to ideas that could\'nt be found within the community\n'.\
-                        format(error['errors'])
-        output_line += 'Comment ids: {}\n\n'.format(error['ids'])
-        f_output.write(output_line)
-        for error_id in error['ids']:
-            f_orphan.write('{}\n'.format(error_id))
-    f_output.close()
-    f_orphan.close()
+    with cache_manifest.atomic_write(fname_orphans) as f_orphan, \
+            cache_manifest.atomic_write(fname_output) as f_output:
+        f_output.write('Out of {} comments, {} ({}) have problems\n\n\n'.
+                        format(total_comments, total_errors,
+                               float(total_errors)/float(total_comments)))
+        for error in errors:
+            output_line = 'Community {} --------------------------------\n'.format(error['community'])
+            output_line += 'It has {} comments placed to ideas that could\'nt be found within the community\n'.\
+                            format(error['errors'])
+            output_line += 'Comment ids: {}\n\n'.format(error['ids'])
+            f_output.write(output_line)
+            for error_id in error['ids']:
+                f_orphan.write('{}\n'.format(error_id))
+
+
+def load_report(fname_output='data/output_checker.txt'):
+    # total of comments and errors by community of a report
+    # written by save_report
+    total_comments, errors = 0, []
+
+    with open(fname_output) as f_output:
+        for line in f_output:
+            if line.startswith('Out of '):
+                total_comments = int(line.split()[2])
+            elif line.startswith('Community '):
+                errors.append({'community': line.split()[1]})
+            elif line.startswith('Comment ids: '):
+                errors[-1]['ids'] = [str(error_id) for error_id in
+                                     ast.literal_eval(line[len('Comment ids: '):].strip())]
+                errors[-1]['errors'] = len(errors[-1]['ids'])
+
+    return total_comments, sum(error['errors'] for error in errors), errors
+
+
+if __name__ == '__main__':
+    print('Checking data correctness...')
+
+    # Comments have to be grouped by community. The same
+    # check is done while the data set is built (see
+    # metric_calculator.load_data), run this script to get
+    # the report alone
+    fname_ideas, fname_comments, _ = \
+        external_sort.sort_exports('data/idsc_ideas_no_text_last.csv',
+                                   'data/idsc_comments_no_text_last.csv',
+                                   'data/idsc_votes_last.csv')
+
+    idea_index = index_ideas(fname_ideas)
+    save_report(*check_comments(fname_comments, idea_index))
@@ -0,0 +1,362 @@
+__author__ = 'jorgesaldivar'
+
+
+import id_dictionary
+import json
+import numpy
+import os
+import records
+import shutil
+
+
+EPOCH_FIELD = 'creation_epoch'
+TABLES = ('ideas', 'comments', 'votes')
+CHUNK_SIZE = 100000  # rows kept as python values before being packed
+# id space of the columns holding ids, top-level comments
+# carry the id of their idea as parent_id, which is given
+# a code of the comments space as well. Ids of votes
+# aren't joined with anything, they are kept as strings
+ID_FIELDS = {
+    'ideas': {'id': 'ideas', 'author_id': 'authors', 'community_id': 'communities'},
+    'comments': {'id': 'comments', 'author_id': 'authors', 'parent_id': 'comments',
+                 'community_id': 'communities'},
+    'votes': {'author': 'authors', 'idea_id': 'ideas'}
+}
+ID_SPACES = ('communities', 'ideas', 'comments', 'authors')
+
+
+###
+# Columnar data set
+#
+# The ideas, comments and votes of the data set are
+# saved as one numpy array per field, counters as
+# integers, ids as int32 codes (see id_dictionary) and
+# the rest of the fields as strings. Offset arrays
+# link communities to their ideas and ideas to their
+# comments and votes, i.e., the ideas of the community
+# c are ideas[community_offsets[c]:community_offsets[c+1]].
+# Arrays are memory-mapped when the data set is opened,
+# so only the columns used are read from disk.
+###
+class ColumnWriter(object):
+
+    def __init__(self, id_fields=None, dictionaries=None):
+        # dictionaries of the id spaces of the id fields
+        self.id_fields = id_fields or {}
+        self.dictionaries = dictionaries or {}
+        self.fields = None
+        self.getter = None
+        self.values = {}
+        self.chunks = {}
+        self.num_rows = 0
+
+    def set_fields(self, fields):
+        if self.fields is None:
+            self.fields = sorted(fields)
+            for field in self.fields:
+                self.values[field], self.chunks[field] = [], []
+        elif self.fields != sorted(fields):
+            raise Exception('Fields miss match')
+
+    def append(self, row):
+        if self.fields is None:
+            self.set_fields(field for field in row.keys() if not field.endswith('_array'))
+        if self.getter is None:
+            self.getter = records.getter(row, self.fields)
+            self.value_lists = [self.values[field] for field in self.fields]
+        for values, value in zip(self.value_lists, self.getter(row)):
+            values.append(value)
+        self.num_rows += 1
+        if len(self.values[self.fields[0]]) >= CHUNK_SIZE:
+            self.pack()
+
+    def append_columns(self, dataset, table, start, end):
+        # copy the rows [start, end) of the table of another
+        # data set, its codes have to be valid in this one
+        if end <= start:
+            return
+        self.set_fields(dataset.fields[table])
+        self.pack()
+        for field in self.fields:
+            column = dataset.column(table, field)[start:end]
+            dtype = numpy.int32 if field in self.id_fields else None
+            self.chunks[field].append(numpy.array(column, dtype=dtype))
+        self.num_rows += end - start
+
+    def pack(self):
+        for field in self.fields or []:
+            if not self.values[field]:
+                continue
+            if field == EPOCH_FIELD:
+                values = [numpy.nan if value is None else value
+                          for value in self.values[field]]
+                self.chunks[field].append(numpy.array(values, dtype=numpy.float64))
+            elif field in self.id_fields:
+                dictionary = self.dictionaries[self.id_fields[field]]
+                self.chunks[field].append(dictionary.encode(self.values[field]))
+            elif field in records.INT_FIELDS:
+                self.chunks[field].append(numpy.array(self.values[field], dtype=numpy.int32))
+            else:
+                self.chunks[field].append(numpy.array(self.values[field], dtype=numpy.string_))
+            del self.values[field][:]
+
+    def save(self, path, table):
+        self.pack()
+        for field in self.fields or []:
+            if self.chunks[field]:
+                column = numpy.concatenate(self.chunks[field])
+            elif field in self.id_fields or field in records.INT_FIELDS:
+                column = numpy.array([], dtype=numpy.int32)
+            else:
+                column = numpy.array([], dtype=numpy.string_)
+            numpy.save(column_fname(path, table, field), column)
+        return self.fields or []
+
+
+def column_fname(path, table, field):
+    return os.path.join(path, '{}.{}.npy'.format(table, field))
+
+
+###
+# Write a data set idea by idea, or copying whole
+# communities (blocks) of an existing data set. The
+# data set is written in a temporary directory that
+# replaces the previous one when it is closed.
+#
+# Blocks can only be copied from the data set the
+# writer is based on, whose dictionaries of ids are
+# taken as they are, so its codes stay the same
+###
+class DatasetWriter(object):
+
+    def __init__(self, path, base=None):
+        self.path = path
+        self.base = base
+        self.tmp_path = path + '.tmp'
+        if os.path.exists(self.tmp_path):
+            shutil.rmtree(self.tmp_path)
+        os.makedirs(self.tmp_path)
+        self.dictionaries = dict((space, id_dictionary.IdDictionary(
+            base.id_table(space).tolist() if base is not None else None)) for space in ID_SPACES)
+        self.writers = dict((table, ColumnWriter(ID_FIELDS[table], self.dictionaries))
+                            for table in TABLES)
+        self.communities, self.community_offsets = [], []
+        self.comment_offsets, self.vote_offsets = [0], [0]
+
+    def start_community(self, community_id):
+        self.communities.append(community_id)
+        self.community_offsets.append(self.writers['ideas'].num_rows)
+
+    def add_idea(self, community_id, idea):
+        if not self.communities or self.communities[-1] != community_id:
+            self.start_community(community_id)
+        self.writers['ideas'].append(idea)
+        for comment in idea['comments_array']:
+            self.writers['comments'].append(comment)
+        for vote in idea['votes_array']:
+            self.writers['votes'].append(vote)
+        self.comment_offsets.append(self.writers['comments'].num_rows)
+        self.vote_offsets.append(self.writers['votes'].num_rows)
+
+    def add_block(self, dataset, block):
+        if self.base is None or dataset.path != self.base.path:
+            raise Exception('Blocks of {} can\'t be copied, the writer isn\'t based on it'.
+                            format(dataset.path))
+        self.start_community(dataset.communities[block])
+        community_offsets = dataset.array('community_offsets')
+        start, end = int(community_offsets[block]), int(community_offsets[block + 1])
+        for table, offsets in (('comments', self.comment_offsets),
+                               ('votes', self.vote_offsets)):
+            table_offsets = numpy.asarray(dataset.array(table[:-1] + '_offsets')[start:end + 1])
+            base = self.writers[table].num_rows - int(table_offsets[0])
+            offsets.extend((table_offsets[1:] + base).tolist())
+            self.writers[table].append_columns(dataset, table, int(table_offsets[0]),
+                                               int(table_offsets[-1]))
+        self.writers['ideas'].append_columns(dataset, 'ideas', start, end)
+
+    def close(self):
+        self.community_offsets.append(self.writers['ideas'].num_rows)
+        meta = {'fields': {}, 'id_fields': {}}
+        for table in TABLES:
+            meta['fields'][table] = self.writers[table].save(self.tmp_path, table)
+            meta['id_fields'][table] = ID_FIELDS[table]
+        for space, dictionary in self.dictionaries.iteritems():
+            numpy.save(os.path.join(self.tmp_path, 'ids.{}.npy'.format(space)),
+                       dictionary.table())
+        numpy.save(os.path.join(self.tmp_path, 'communities.npy'),
+                   numpy.array(self.communities, dtype=numpy.string_))
+        for name, offsets in (('community_offsets', self.community_offsets),
+                              ('comment_offsets', self.comment_offsets),
+                              ('vote_offsets', self.vote_offsets)):
+            numpy.save(os.path.join(self.tmp_path, name + '.npy'),
+                       numpy.array(offsets, dtype=numpy.int64))
+        with open(os.path.join(self.tmp_path, 'meta.json'), 'w') as json_file:
+            json.dump(meta, json_file)
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.rename(self.tmp_path, self.path)
+
+
+def write_dataset(ideas, path):
+    writer = DatasetWriter(path)
+    for community_id, idea in ideas:
+        writer.add_idea(community_id, idea)
+    writer.close()
+
+
+def save_columns(path, tables):
+    # one array by table and field, same layout as the
+    # columns of a data set, replacing the previous ones
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+    for table, columns in tables.iteritems():
+        for field, values in columns.iteritems():
+            numpy.save(column_fname(tmp_path, table, field), values)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.rename(tmp_path, path)
+
+
+def load_array(fname):
+    try:
+        return numpy.load(fname, mmap_mode='r')
+    except ValueError:
+        # empty arrays can't be memory-mapped
+        return numpy.load(fname)
+
+
+class ColumnarDataset(object):
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as json_file:
+            meta = json.load(json_file)
+        self.fields, self.id_fields = meta['fields'], meta['id_fields']
+        self.arrays = {}
+        self.communities = self.array('communities').tolist()
+        # when a community is split, the last block wins
+        self.community_idx = dict((community_id, idx) for idx, community_id
+                                  in enumerate(self.communities))
+
+    def array(self, name):
+        if name not in self.arrays:
+            self.arrays[name] = load_array(os.path.join(self.path, name + '.npy'))
+        return self.arrays[name]
+
+    def column(self, table, field):
+        # ids are given as codes, see decode
+        return self.array('{}.{}'.format(table, field))
+
+    def id_table(self, space):
+        # code -> id
+        return self.array('ids.' + space)
+
+    def decode(self, table, field, codes):
+        return id_dictionary.decode(self.id_table(self.id_fields[table][field]), codes)
+
+    def idea_range(self, community_id):
+        idx = self.community_idx[community_id]
+        offsets = self.array('community_offsets')
+        return int(offsets[idx]), int(offsets[idx + 1])
+
+    def rows(self, table, start, end, fields, decode_ids=True):
+        columns = []
+        for field in fields:
+            values = self.column(table, field)[start:end]
+            if decode_ids and field in self.id_fields[table]:
+                values = self.decode(table, field, values)
+            else:
+                values = values.tolist()
+            if field == EPOCH_FIELD:
+                values = [None if value != value else value for value in values]  # nan
+            columns.append(values)
+        return records.from_columns(fields, columns, end - start)
+
+    ###
+    # Rebuild the ideas of a community as records with
+    # their comments and votes, the same structure streamed
+    # by iter_checked_dataset. Passing the list of fields
+    # needed avoids reading the rest of the columns, and ids
+    # can be left as codes when they aren't output
+    ###
+    def community_ideas(self, community_id, idea_fields=None, comment_fields=None,
+                        vote_fields=None, decode_ids=True):
+        start, end = self.idea_range(community_id)
+        comment_offsets = self.array('comment_offsets')[start:end + 1].tolist()
+        vote_offsets = self.array('vote_offsets')[start:end + 1].tolist()
+        ideas = self.rows('ideas', start, end, idea_fields or self.fields['ideas'], decode_ids)
+        comments = self.rows('comments', comment_offsets[0], comment_offsets[-1],
+                             comment_fields or self.fields['comments'], decode_ids)
+        votes = self.rows('votes', vote_offsets[0], vote_offsets[-1],
+                          vote_fields or self.fields['votes'], decode_ids)
+        for idx, idea in enumerate(ideas):
+            idea.comments_array = comments[comment_offsets[idx] - comment_offsets[0]:
+                                           comment_offsets[idx + 1] - comment_offsets[0]]
+            idea.votes_array = votes[vote_offsets[idx] - vote_offsets[0]:
+                                     vote_offsets[idx + 1] - vote_offsets[0]]
+        return ideas
+
+    # dictionary-like access, community id -> ideas
+    def __len__(self):
+        return len(self.community_idx)
+
+    def __contains__(self, community_id):
+        return community_id in self.community_idx
+
+    def __getitem__(self, community_id):
+        return self.community_ideas(community_id)
+
+    def get(self, community_id, default=None):
+        if community_id in self.community_idx:
+            return self.community_ideas(community_id)
+        return default
+
+    def keys(self):
+        return [community_id for idx, community_id in enumerate(self.communities)
+                if self.community_idx.get(community_id) == idx]
+
+    def iteritems(self, **options):
+        for community_id in self.keys():
+            yield community_id, self.community_ideas(community_id, **options)
+
+    def slice(self, start_block, end_block):
+        return DatasetSlice(self, start_block, end_block)
+
+
+###
+# View of a range of communities (blocks) of the data
+# set, columns and offsets are sliced on access
+###
+class DatasetSlice(ColumnarDataset):
+
+    def __init__(self, dataset, start_block, end_block):
+        self.dataset = dataset
+        self.path = dataset.path
+        self.fields, self.id_fields = dataset.fields, dataset.id_fields
+        community_offsets = dataset.array('community_offsets')[start_block:end_block + 1]
+        idea_start, idea_end = int(community_offsets[0]), int(community_offsets[-1])
+        comment_offsets = dataset.array('comment_offsets')[idea_start:idea_end + 1]
+        vote_offsets = dataset.array('vote_offsets')[idea_start:idea_end + 1]
+        self.ranges = {'ideas': (idea_start, idea_end),
+                       'comments': (int(comment_offsets[0]), int(comment_offsets[-1])),
+                       'votes': (int(vote_offsets[0]), int(vote_offsets[-1]))}
+        self.arrays = {'community_offsets': community_offsets - idea_start,
+                       'comment_offsets': comment_offsets - comment_offsets[0],
+                       'vote_offsets': vote_offsets - vote_offsets[0]}
+        self.communities = dataset.communities[start_block:end_block]
+        self.community_idx = dict((community_id, idx - start_block) for community_id, idx
+                                  in dataset.community_idx.iteritems()
+                                  if start_block <= idx < end_block)
+
+    def column(self, table, field):
+        start, end = self.ranges[table]
+        return self.dataset.column(table, field)[start:end]
+
+    def id_table(self, space):
+        return self.dataset.id_table(space)
+
+
+def open_dataset(path):
+    return ColumnarDataset(path)
@@ -0,0 +1,248 @@
+__author__ = 'jorgesaldivar'
+
+
+import cache_manifest
+import csv
+import heapq
+import os
+import shutil
+import tempfile
+
+
+SORT_VERSION = 1  # bump when the order changes
+RUN_SIZE = 500000  # max number of rows sorted in memory at once
+MAX_FAN_IN = 64    # max number of runs merged at once (open files)
+
+
+###
+# Sort keys
+#
+# Ids are numeric strings, compare them as numbers
+# so that the order is the same no matter how
+# the platform dumped them
+###
+def natural_key(value):
+    try:
+        return 0, int(value), ''
+    except ValueError:
+        return 1, 0, value
+
+
+def idea_key(line_idea):
+    # community, idea
+    return natural_key(line_idea[12]), natural_key(line_idea[0])
+
+
+def comment_key(line_comment):
+    # Replies are placed at the beginning of the community
+    # so that they are held back until their parents appear,
+    # comments to ideas follow ordered by idea. The idea of
+    # a reply isn't in its row, so replies can't be ordered
+    # by idea (see metric_calculator.iter_checked_dataset)
+    if line_comment[7] == 'idea':
+        return natural_key(line_comment[9]), 1, natural_key(line_comment[8]), \
+               natural_key(line_comment[0])
+    else:
+        return natural_key(line_comment[9]), 0, natural_key(line_comment[8]), \
+               natural_key(line_comment[0])
+
+
+def vote_key(line_vote):
+    # votes are decorated with the community of their
+    # idea (last column) before being sorted
+    return natural_key(line_vote[-1]), natural_key(line_vote[2]), natural_key(line_vote[0])
+
+
+###
+# Bounded-memory external merge sort
+#
+# Rows are sorted in chunks of max_rows, every sorted
+# chunk (run) is spilled to a temporary file and the
+# runs are then combined with a k-way merge. The sort
+# is stable.
+###
+def keyed_rows(fname, key, run_idx):
+    with open(fname, 'rb') as csv_run:
+        for row in csv.reader(csv_run, delimiter=','):
+            yield key(row), run_idx, row
+
+
+def merge_runs(fnames, key):
+    runs = [keyed_rows(fname, key, idx) for idx, fname in enumerate(fnames)]
+    for _, _, row in heapq.merge(*runs):
+        yield row
+
+
+def write_run(rows, tmp_dir):
+    fd, fname = tempfile.mkstemp(suffix='.csv', dir=tmp_dir)
+    with os.fdopen(fd, 'wb') as csv_run:
+        csv.writer(csv_run, delimiter=',').writerows(rows)
+    return fname
+
+
+def external_sort(rows, key, max_rows=RUN_SIZE, tmp_dir=None):
+    chunk, runs = [], []
+    run_dir = tempfile.mkdtemp(prefix='sort_', dir=tmp_dir)
+
+    try:
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= max_rows:
+                chunk.sort(key=key)
+                runs.append(write_run(chunk, run_dir))
+                chunk = []
+        chunk.sort(key=key)
+        if not runs:
+            # everything fit in memory
+            for row in chunk:
+                yield row
+            return
+        if chunk:
+            runs.append(write_run(chunk, run_dir))
+        chunk = []
+        # merge consecutive groups of runs until they
+        # can be merged all at once
+        while len(runs) > MAX_FAN_IN:
+            merged_runs = []
+            for idx in range(0, len(runs), MAX_FAN_IN):
+                group = runs[idx:idx + MAX_FAN_IN]
+                merged_runs.append(write_run(merge_runs(group, key), run_dir))
+                for fname in group:
+                    os.remove(fname)
+            runs = merged_runs
+        for row in merge_runs(runs, key):
+            yield row
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def read_csv(fname, header_lines):
+    with open(fname, 'rb') as csv_file:
+        reader = csv.reader(csv_file, delimiter=',')
+        header = [next(reader) for _ in range(header_lines)]
+        yield header
+        for row in reader:
+            yield row
+
+
+def is_sorted(fname, key, header_lines=1):
+    rows = read_csv(fname, header_lines)
+    next(rows)
+    previous = None
+    for row in rows:
+        current = key(row)
+        if previous is not None and current < previous:
+            return False
+        previous = current
+    return True
+
+
+def sort_csv(fname_in, fname_out, key, header_lines=1, max_rows=RUN_SIZE, tmp_dir=None):
+    rows = read_csv(fname_in, header_lines)
+    header = next(rows)
+    with cache_manifest.atomic_write(fname_out, 'wb') as csv_output:
+        output = csv.writer(csv_output, delimiter=',')
+        output.writerows(header)
+        output.writerows(external_sort(rows, key, max_rows, tmp_dir))
+
+
+###
+# Attach to every vote the community of its idea
+#
+# Votes don't carry the community id, so both files
+# are sorted by idea id and merge-joined. Votes whose
+# idea isn't in the data set can't be placed and are
+# dropped
+###
+def decorate_votes(fname_ideas, fname_votes, max_rows=RUN_SIZE, tmp_dir=None):
+    by_idea = lambda row: natural_key(row[0])
+    ideas = read_csv(fname_ideas, 1)
+    next(ideas)
+    ideas = external_sort(ideas, by_idea, max_rows, tmp_dir)
+    votes = read_csv(fname_votes, 2)
+    next(votes)
+    votes = external_sort(votes, lambda row: natural_key(row[2]), max_rows, tmp_dir)
+    line_idea = next(ideas, None)
+    dropped_votes = 0
+
+    for line_vote in votes:
+        vote_idea = natural_key(line_vote[2])
+        while line_idea is not None and by_idea(line_idea) < vote_idea:
+            line_idea = next(ideas, None)
+        if line_idea is not None and by_idea(line_idea) == vote_idea:
+            yield line_vote + [line_idea[12]]
+        else:
+            dropped_votes += 1
+    if dropped_votes > 0:
+        print('{} votes were dropped because their ideas are not in the data set'.
+              format(dropped_votes))
+
+
+def sort_votes(fname_ideas, fname_votes, fname_out, max_rows=RUN_SIZE, tmp_dir=None):
+    header = next(read_csv(fname_votes, 2))
+    votes = decorate_votes(fname_ideas, fname_votes, max_rows, tmp_dir)
+    with cache_manifest.atomic_write(fname_out, 'wb') as csv_output:
+        output = csv.writer(csv_output, delimiter=',')
+        output.writerows(header)
+        for line_vote in external_sort(votes, vote_key, max_rows, tmp_dir):
+            output.writerow(line_vote[:-1])
+
+
+def votes_follow_ideas(fname_ideas, fname_votes):
+    # votes are in order when a forward pass over the
+    # ideas finds the idea of every vote
+    ideas = read_csv(fname_ideas, 1)
+    next(ideas)
+    votes = read_csv(fname_votes, 2)
+    next(votes)
+    line_idea = next(ideas, None)
+
+    for line_vote in votes:
+        while line_idea is not None and line_idea[0] != line_vote[2]:
+            line_idea = next(ideas, None)
+        if line_idea is None:
+            return False
+    return True
+
+
+###
+# Put the ideas, comments and votes exports in the order
+# expected by the data set builder and the checker, i.e.,
+# grouped by community and idea. Exports that are already
+# in that order are used as they are. Sorted exports,
+# and the outcome of checking that the exports are in
+# order (an empty file, IN_ORDER), are cached (see
+# cache_manifest), so unchanged exports aren't scanned
+# again.
+###
+IN_ORDER = 'in_order'
+
+
+def sort_exports(fname_ideas, fname_comments, fname_votes, out_dir='data/sorted',
+                 max_rows=RUN_SIZE):
+    fnames_in = [fname_ideas, fname_comments, fname_votes]
+    fnames_out = [os.path.join(out_dir, os.path.basename(fname)) for fname in fnames_in]
+    fname_in_order = os.path.join(out_dir, IN_ORDER)
+
+    if cache_manifest.is_fresh(fname_in_order, fnames_in, SORT_VERSION):
+        return fnames_in
+    if all(cache_manifest.is_fresh(fname_out, fnames_in, SORT_VERSION)
+           for fname_out in fnames_out):
+        return fnames_out
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    if is_sorted(fname_ideas, idea_key) and is_sorted(fname_comments, comment_key) and \
+       votes_follow_ideas(fname_ideas, fname_votes):
+        with cache_manifest.atomic_write(fname_in_order):
+            pass
+        cache_manifest.record(fname_in_order, fnames_in, SORT_VERSION)
+        return fnames_in
+
+    print('Sorting exports, please wait...')
+    sort_csv(fname_ideas, fnames_out[0], idea_key, 1, max_rows)
+    sort_csv(fname_comments, fnames_out[1], comment_key, 1, max_rows)
+    sort_votes(fname_ideas, fname_votes, fnames_out[2], max_rows)
+    for fname_out in fnames_out:
+        cache_manifest.record(fname_out, fnames_in, SORT_VERSION)
+
+    return fnames_out
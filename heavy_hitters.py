@@ -0,0 +1,136 @@
+__author__ = 'jorgesaldivar'
+
+
+import heapq
+import math
+import random
+
+
+SEED = 17  # hash functions are random, but runs are reproducible
+
+
+###
+# Space-Saving summary
+#
+# Bounded-memory summary of the most frequent items of a
+# stream (Metwally, Agrawal and El Abbadi, "Efficient
+# computation of frequent and top-k elements in data
+# streams", 2005). At most capacity items are counted,
+# a new item takes the place of the one with the smallest
+# count and inherits it as its error. Counts of the items
+# kept are overestimated by at most their error, which is
+# never more than n / capacity for a stream of n items,
+# and every item more frequent than that is kept. The
+# item with the smallest count is found in a heap whose
+# stale entries are skipped.
+###
+class SpaceSaving(object):
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.heap = []  # (count, item), an entry is stale when the count changed
+        self.total = 0
+
+    def update(self, item, count=1):
+        self.total += count
+        if item in self.counts:
+            self.counts[item] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = count
+            self.errors[item] = 0
+        else:
+            min_count, min_item = self.pop_min()
+            del self.counts[min_item]
+            del self.errors[min_item]
+            self.counts[item] = min_count + count
+            self.errors[item] = min_count
+        heapq.heappush(self.heap, (self.counts[item], item))
+        if len(self.heap) > 4 * self.capacity:
+            self.heap = [(count, item) for item, count in self.counts.iteritems()]
+            heapq.heapify(self.heap)
+
+    def pop_min(self):
+        while True:
+            count, item = heapq.heappop(self.heap)
+            if self.counts.get(item) == count:
+                return count, item
+
+    def top(self, k):
+        # (item, count, error) of the k items with the largest
+        # counts, ties broken by item
+        items = sorted(self.counts.iteritems(), key=lambda (item, count): (-count, item))
+        return [(item, count, self.errors[item]) for item, count in items[:k]]
+
+
+###
+# Count-Min sketch
+#
+# Bounded-memory table of counters answering how many
+# times an item was seen (Cormode and Muthukrishnan, "An
+# improved data stream summary: the count-min sketch and
+# its applications", 2005). Every item adds to one counter
+# by row, picked by a hash function of the row, and its
+# count is the smallest of its counters. Counts are never
+# underestimated and, with probability 1 - delta, they
+# are overestimated by at most error * n for a stream of
+# n items. The table takes e / error by ln(1 / delta)
+# counters no matter how many items are seen.
+###
+class CountMinSketch(object):
+
+    def __init__(self, error=0.01, delta=0.01):
+        self.width = int(math.ceil(math.e / error))
+        self.depth = int(math.ceil(math.log(1.0 / delta)))
+        rng = random.Random(SEED)
+        self.seeds = [rng.getrandbits(32) for _ in range(self.depth)]
+        self.table = [[0] * self.width for _ in range(self.depth)]
+
+    def buckets(self, item):
+        return [hash((seed, item)) % self.width for seed in self.seeds]
+
+    def update(self, item, count=1):
+        for row, bucket in zip(self.table, self.buckets(item)):
+            row[bucket] += count
+
+    def estimate(self, item):
+        return min(row[bucket] for row, bucket in zip(self.table, self.buckets(item)))
+
+
+###
+# Heavy hitters
+#
+# Top items of a stream in fixed memory. Space-Saving
+# finds the candidates and bounds their counts from
+# above (its count) and from below (its count minus its
+# error). Count-Min never underestimates either, so it
+# tightens the upper bound. For a stream of n items,
+# every item seen more than error * n times is kept, and
+# the true count of an item is between count - max_error
+# and count. Both bounds always hold, delta is the
+# probability that Count-Min doesn't tighten the upper
+# one to within error * n
+###
+class HeavyHitters(object):
+
+    def __init__(self, error=0.01, delta=0.01):
+        self.error = error
+        self.summary = SpaceSaving(int(math.ceil(1.0 / error)))
+        self.sketch = CountMinSketch(error, delta)
+
+    def __len__(self):
+        return self.summary.total
+
+    def update(self, item, count=1):
+        self.summary.update(item, count)
+        self.sketch.update(item, count)
+
+    def top(self, k):
+        # (item, count, max_error) of the k most frequent items
+        results = []
+        for item, count in self.summary.counts.iteritems():
+            upper = min(count, self.sketch.estimate(item))
+            results.append((item, upper, upper - (count - self.summary.errors[item])))
+        results.sort(key=lambda (item, count, max_error): (-count, item))
+        return results[:k]
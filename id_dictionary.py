@@ -0,0 +1,63 @@
+__author__ = 'jorgesaldivar'
+
+
+import numpy
+
+
+###
+# Dictionary encoding of ids
+#
+# Ids of communities, ideas, comments and authors are
+# strings in the exports. Each id space is mapped to
+# dense int32 codes, given in the order in which ids are
+# first seen, so that columns of ids take four bytes by
+# row and joins, sets and lookups between them are done
+# on integers (or by indexing arrays with the codes).
+# The ids themselves are kept once, in a reverse table
+# (code -> id), and are only needed to output results.
+###
+class IdDictionary(object):
+
+    def __init__(self, ids=None):
+        self.codes = {}
+        self.ids = []
+        if ids is not None:
+            self.encode(ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, id_):
+        return id_ in self.codes
+
+    def code(self, id_):
+        code = self.codes.get(id_)
+        if code is None:
+            code = self.codes[id_] = len(self.ids)
+            self.ids.append(id_)
+        return code
+
+    def encode(self, ids):
+        codes, id_codes = self.codes, []
+        for id_ in ids:
+            if id_ not in codes:
+                codes[id_] = len(self.ids)
+                self.ids.append(id_)
+            id_codes.append(codes[id_])
+        return numpy.array(id_codes, dtype=numpy.int32)
+
+    def lookup(self, ids):
+        # codes of ids that may not be in the dictionary, -1
+        # for the unknown ones, the dictionary isn't changed
+        return numpy.array([self.codes.get(id_, -1) for id_ in ids], dtype=numpy.int32)
+
+    def decode(self, codes):
+        return [self.ids[code] for code in codes]
+
+    def table(self):
+        return numpy.array(self.ids, dtype=numpy.string_)
+
+
+def decode(table, codes):
+    # ids of the codes given a reverse table
+    return table[numpy.asarray(codes)].tolist() if len(codes) > 0 else []
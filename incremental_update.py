@@ -0,0 +1,333 @@
+__author__ = 'jorgesaldivar'
+
+
+from collections import OrderedDict
+
+import argparse
+import cache_manifest
+import csv
+import dataset_store
+import data_correctness_checker
+import json
+import metric_calculator
+import numpy
+import os
+import records
+
+
+###
+# Incremental update
+#
+# Apply a delta export (new and changed ideas, comments,
+# votes and authors) to the data set, and update the data
+# collected for metrics (data/metric_data.json) and the
+# metrics (data/community_metrics.json) only for the
+# communities affected by the delta. The rest of the
+# communities are copied as they are.
+#
+# Ideas that received new comments or votes are expected
+# to be part of the delta, since their counters changed.
+###
+def read_delta(fname, header_lines=1):
+    rows = []
+
+    if fname is None:
+        return rows, None
+    with open(fname, 'rb') as csv_delta:
+        reader = csv.reader(csv_delta, delimiter=',')
+        for _ in range(header_lines - 1):
+            next(reader)
+        header = next(reader)
+        row_reader = records.RowReader(header, metric_calculator.to_epoch)
+        for row in reader:
+            rows.append((row, row_reader.read(row)))
+
+    return rows, header
+
+
+def idea_communities(data, idea_ids):
+    # community of the ideas of the data set whose ids are given
+    communities = {}
+
+    if not idea_ids or not data.communities:
+        return communities
+    # codes of the ids are their positions in the reverse table
+    codes = numpy.flatnonzero(numpy.in1d(data.id_table('ideas'), list(idea_ids)))
+    column_codes = data.column('ideas', 'id')
+    positions = numpy.flatnonzero(numpy.in1d(column_codes, codes))
+    blocks = numpy.searchsorted(data.array('community_offsets'), positions, side='right') - 1
+    for position, block, idea_id in zip(positions.tolist(), blocks.tolist(),
+                                        data.decode('ideas', 'id', column_codes[positions])):
+        community_id = data.communities[block]
+        if data.community_idx[community_id] == block:
+            communities[idea_id] = community_id
+    return communities
+
+
+def orphan_comments(merged, comments):
+    # ids of the comments placed to ideas that aren't in the
+    # community and of the replies whose chain of parents
+    # doesn't end in a comment to an idea, as found by the
+    # checker when the data set is built
+    top_comments = [comment for comment in comments.itervalues() if comment.parent_type == 'idea']
+    replies = [(comment.id, comment.parent_id) for comment in comments.itervalues()
+               if comment.parent_type != 'idea']
+    orphaned_ids = data_correctness_checker.orphaned_replies(
+        replies, set(comment.id for comment in top_comments))
+    return [comment.id for comment in top_comments if comment.parent_id not in merged] + \
+        [reply_id for reply_id, _ in replies if reply_id in orphaned_ids]
+
+
+def merge_community(community_id, ideas, delta_ideas, delta_comments, delta_votes):
+    merged = OrderedDict((idea.id, idea) for idea in ideas)
+    for idea in delta_ideas:
+        old_idea = merged.get(idea.id)
+        idea.comments_array = old_idea.comments_array if old_idea else []
+        idea.votes_array = old_idea.votes_array if old_idea else []
+        merged[idea.id] = idea
+
+    # changed comments and votes replace the old ones
+    comments, votes = OrderedDict(), OrderedDict()
+    for idea in merged.itervalues():
+        for comment in idea.comments_array:
+            comments[comment.id] = comment
+        for vote in idea.votes_array:
+            votes[vote.id] = (idea.id, vote)
+    for comment in delta_comments:
+        comments[comment.id] = comment
+    for idea_id, vote in delta_votes:
+        votes[vote.id] = (idea_id, vote)
+    orphan_ids = orphan_comments(merged, comments)
+    if len(orphan_ids) > 0:
+        print('Community {} has {} orphan comments'.format(community_id, len(orphan_ids)))
+
+    # place comments again, held back replies are attached
+    # after their parents as done when building the data set
+    idea_comments, hold_replies = {}, {}
+    orphans = set(orphan_ids)
+    for comment in comments.itervalues():
+        if comment.id in orphans:
+            continue
+        if comment.parent_type == 'idea':
+            idea_comments.setdefault(comment.parent_id, []).append(comment)
+        else:
+            hold_replies.setdefault(comment.parent_id, []).append(comment)
+    idea_votes = {}
+    for idea_id, vote in votes.itervalues():
+        idea_votes.setdefault(idea_id, []).append(vote)
+    for idea_id, idea in merged.iteritems():
+        comments_array, comment_ids = [], set()
+        for comment in idea_comments.pop(idea_id, []):
+            metric_calculator.attach_comment(comment, comments_array, comment_ids, hold_replies)
+        idea.comments_array = comments_array
+        idea.votes_array = idea_votes.pop(idea_id, [])
+    metric_calculator.report_unresolved_replies(community_id, hold_replies)
+
+    return merged.values(), orphan_ids
+
+
+def update_dataset(data, delta_ideas, delta_comments, delta_votes, affected):
+    # the data set is rewritten, orphan comments of the
+    # affected communities are returned by community
+    orphan_ids = OrderedDict()
+    community_ideas, community_comments, community_votes = {}, {}, {}
+    for community_id, idea in delta_ideas:
+        community_ideas.setdefault(community_id, []).append(idea)
+    for community_id, comment in delta_comments:
+        community_comments.setdefault(community_id, []).append(comment)
+    for community_id, idea_id, vote in delta_votes:
+        community_votes.setdefault(community_id, []).append((idea_id, vote))
+
+    writer = dataset_store.DatasetWriter(data.path, base=data)
+    for block, community_id in enumerate(data.communities):
+        if community_id not in affected:
+            writer.add_block(data, block)
+        elif data.community_idx[community_id] == block:
+            ideas, community_orphans = merge_community(community_id,
+                                                       data.community_ideas(community_id),
+                                                       community_ideas.get(community_id, []),
+                                                       community_comments.get(community_id, []),
+                                                       community_votes.get(community_id, []))
+            orphan_ids[community_id] = community_orphans
+            for idea in ideas:
+                writer.add_idea(community_id, idea)
+    # new communities
+    new_communities = [community_id for community_id in affected if community_id not in data]
+    for community_id in sorted(new_communities, key=metric_calculator.external_sort.natural_key):
+        ideas, community_orphans = merge_community(community_id, [],
+                                                   community_ideas.get(community_id, []),
+                                                   community_comments.get(community_id, []),
+                                                   community_votes.get(community_id, []))
+        orphan_ids[community_id] = community_orphans
+        for idea in ideas:
+            writer.add_idea(community_id, idea)
+    writer.close()
+
+    return orphan_ids
+
+
+def update_report(data, delta_comments, orphan_ids, fname_orphan_comments, fname_report):
+    # comments of the delta are checked again, errors of the
+    # rest of the data set stay as they were. The report of
+    # the checker and the orphan comments are saved again
+    try:
+        _, _, errors = data_correctness_checker.load_report(fname_report)
+    except IOError:
+        errors = []
+    checked = set(comment.id for _, comment in delta_comments)
+    for community_orphans in orphan_ids.itervalues():
+        checked.update(community_orphans)
+    community_errors = OrderedDict()
+    for error in errors:
+        community_errors[error['community']] = [error_id for error_id in error['ids']
+                                                if error_id not in checked]
+    for community_id, community_orphans in orphan_ids.iteritems():
+        community_errors.setdefault(community_id, []).extend(community_orphans)
+    errors = [{'community': community_id, 'errors': len(error_ids), 'ids': error_ids}
+              for community_id, error_ids in community_errors.iteritems() if error_ids]
+    total_errors = sum(error['errors'] for error in errors)
+    # comments of the checked exports are placed or orphans
+    total_comments = len(data.column('comments', 'id')) + total_errors
+    data_correctness_checker.save_report(total_comments, total_errors, errors,
+                                         fname_orphan_comments, fname_report)
+
+
+def update_metric_data(data, affected, cached, quantile_error=None,
+                       newcomer_window=metric_calculator.NEWCOMER_WINDOW):
+    m_data = None
+    if cached:
+        try:
+            with open(metric_calculator.METRIC_DATA, 'rb') as json_m_data:
+                m_data = json.load(json_m_data)
+        except (IOError, ValueError):
+            pass
+    if m_data is None:
+        # nothing to update, collect everything
+        return metric_calculator.collect_data_for_metrics(quantile_error=quantile_error,
+                                                          newcomer_window=newcomer_window)
+
+    communities = metric_calculator.load_communities()
+    authors = metric_calculator.load_authors()
+    for community_id in affected:
+        if community_id not in data or metric_calculator.problematic_community(community_id):
+            continue
+        block = data.community_idx[community_id]
+        m_data.update(metric_calculator.gather_data_columnar(communities, authors,
+                                                             data.slice(block, block + 1),
+                                                             quantile_error, newcomer_window))
+    metric_calculator.save_data_for_metrics(m_data)
+    metric_calculator.record_cached(metric_calculator.METRIC_DATA,
+                                    metric_calculator.metric_data_options(quantile_error,
+                                                                          newcomer_window))
+
+    return m_data
+
+
+def update_community_metrics(m_data, affected, cached, quantile_error=None,
+                             newcomer_window=metric_calculator.NEWCOMER_WINDOW):
+    community_metrics = None
+    if cached:
+        try:
+            with open(metric_calculator.COMMUNITY_METRICS, 'rb') as json_metrics:
+                community_metrics = json.load(json_metrics)
+        except (IOError, ValueError):
+            pass
+    if community_metrics is None:
+        return metric_calculator.compute_metrics(quantile_error=quantile_error,
+                                                 newcomer_window=newcomer_window)
+
+    with open('data/communities_dataset.csv', 'rb') as csv_communities:
+        communities = [community for community in csv.reader(csv_communities, delimiter=',')
+                       if community[0] in affected]
+    community_metrics.update(metric_calculator.productivity(communities, {}))
+    metric_calculator.moderator_interventions(communities, community_metrics)
+    for community_id in affected:
+        if community_id in m_data:
+            metric_calculator.update_community_metrics(community_metrics, community_id,
+                                                       m_data[community_id])
+
+    return community_metrics
+
+
+def apply_delta(fname_ideas=None, fname_comments=None, fname_votes=None, fname_authors=None,
+                fname_orphan_comments='data/orphaned_comments.txt',
+                fname_report='data/output_checker.txt', quantile_error=None,
+                newcomer_window=metric_calculator.NEWCOMER_WINDOW, percentiles=False):
+    data = metric_calculator.load_data()
+    authors = metric_calculator.load_authors()
+    # cached results can be updated only if they are up to
+    # date before applying the delta
+    m_data_cached = metric_calculator.is_cached(metric_calculator.METRIC_DATA,
+                                                metric_calculator.metric_data_options(
+                                                    quantile_error, newcomer_window))
+    metrics_cached = m_data_cached and \
+                     metric_calculator.is_cached(metric_calculator.COMMUNITY_METRICS)
+
+    ideas, _ = read_delta(fname_ideas)
+    comments, _ = read_delta(fname_comments)
+    votes, _ = read_delta(fname_votes, header_lines=2)
+    delta_ideas = [(row[12], idea) for row, idea in ideas]
+    # comments are checked once merged with the ones of their
+    # community (see merge_community)
+    delta_comments = [(row[9], comment) for row, comment in comments]
+    # votes don't carry their community, take it from their ideas
+    vote_communities = dict((idea.id, community_id) for community_id, idea in delta_ideas)
+    vote_communities.update(idea_communities(data, set(row[2] for row, _ in votes) -
+                                             set(vote_communities.keys())))
+    delta_votes = []
+    for row, vote in votes:
+        if row[2] in vote_communities:
+            delta_votes.append((vote_communities[row[2]], row[2], vote))
+        else:
+            print('Vote {} was dropped because its idea is not in the data set'.format(row[0]))
+
+    affected = set(community_id for community_id, _ in delta_ideas)
+    affected.update(community_id for community_id, _ in delta_comments)
+    affected.update(community_id for community_id, _, _ in delta_votes)
+    if fname_authors is not None:
+        delta_authors = metric_calculator.read_authors([fname_authors])
+        authors = authors.merge(delta_authors)
+        metric_calculator.save_authors(authors)
+        cache_manifest.record_delta(metric_calculator.AUTHORS, [fname_authors])
+        # registrations are used to identify newcomers
+        affected.update(str(community_id) for community_id in delta_authors.communities.tolist())
+    print('Updating {} communities, please wait...'.format(len(affected)))
+
+    if delta_ideas or delta_comments or delta_votes:
+        orphan_ids = update_dataset(data, delta_ideas, delta_comments, delta_votes, affected)
+        cache_manifest.record_delta(metric_calculator.DATASET,
+                                    [fname for fname in (fname_ideas, fname_comments, fname_votes)
+                                     if fname is not None])
+        data = metric_calculator.load_data()
+        update_report(data, delta_comments, orphan_ids, fname_orphan_comments, fname_report)
+    m_data = update_metric_data(data, affected, m_data_cached, quantile_error, newcomer_window)
+    community_metrics = update_community_metrics(m_data, affected, metrics_cached,
+                                                 quantile_error, newcomer_window)
+    metric_calculator.save_metric_results(community_metrics, percentiles=percentiles)
+
+    return affected
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Update the data set and the metrics '
+                                                     'of the communities changed by a delta export')
+    arg_parser.add_argument('--ideas', help='delta of ideas')
+    arg_parser.add_argument('--comments', help='delta of comments')
+    arg_parser.add_argument('--votes', help='delta of votes')
+    arg_parser.add_argument('--authors', help='delta of authors')
+    arg_parser.add_argument('--quantile-error', type=float, default=None,
+                            help='rank error of the response time sketches, as used '
+                                 'to compute the metrics (see metric_calculator)')
+    arg_parser.add_argument('--newcomer-window', type=int,
+                            default=metric_calculator.NEWCOMER_WINDOW, metavar='DAYS',
+                            help='newcomer window, as used to compute the metrics')
+    arg_parser.add_argument('--percentiles', action='store_true',
+                            help='add the 90th and 99th percentiles of response times to '
+                                 'community_metrics.csv')
+    args = arg_parser.parse_args()
+    for fname in (args.ideas, args.comments, args.votes, args.authors):
+        if fname is not None and not os.path.exists(fname):
+            arg_parser.error('{} doesn\'t exist'.format(fname))
+    apply_delta(args.ideas, args.comments, args.votes, args.authors,
+                quantile_error=args.quantile_error, newcomer_window=args.newcomer_window,
+                percentiles=args.percentiles)
@@ -0,0 +1,128 @@
+__author__ = 'jorgesaldivar'
+
+
+from contextlib import contextmanager
+
+import datetime
+import functools
+import json
+import sys
+import time
+
+
+PROGRESS_INTERVAL = 0.5  # min seconds between two updates of a progress bar
+
+
+###
+# Progress bar, redrawn at most every PROGRESS_INTERVAL
+# seconds no matter how often it is updated, with the
+# throughput and the estimated time left
+#
+# Based on the progress bar of Greenstick
+# http://stackoverflow.com/questions/3173320/text-progress-bar-in-the-console
+###
+class Progress(object):
+
+    def __init__(self, total, prefix='Progress', suffix='Completed', bar_length=50,
+                 interval=PROGRESS_INTERVAL):
+        self.total = total
+        self.prefix = prefix
+        self.suffix = suffix
+        self.bar_length = bar_length
+        self.interval = interval
+        self.start = time.time()
+        self.last_draw = None
+        self.done = False
+
+    def update(self, iteration):
+        if self.done:
+            return
+        now = time.time()
+        if iteration < self.total and self.last_draw is not None and \
+           now - self.last_draw < self.interval:
+            return
+        self.last_draw = now
+        total = max(self.total, 1)
+        elapsed = now - self.start
+        rate = iteration / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - iteration) / rate if rate > 0 else 0.0
+        filled_length = int(round(self.bar_length * min(iteration, total) / float(total)))
+        bar = '#' * filled_length + '-' * (self.bar_length - filled_length)
+        sys.stdout.write('%s [%s] %.2f%% %s, %.0f/s, ETA %s\r' %
+                         (self.prefix, bar, 100.0 * iteration / total, self.suffix, rate,
+                          datetime.timedelta(seconds=int(eta))))
+        sys.stdout.flush()
+        if iteration >= self.total:
+            self.done = True
+            sys.stdout.write('\n\n')
+
+
+###
+# Timers and counters
+#
+# Stages of the pipeline and functions in the hot path
+# are timed, and events (e.g., ideas skipped) counted,
+# in a registry kept by process. Functions are timed only
+# when profiling is enabled (see profile_functions),
+# which wraps them, so they run at full speed otherwise.
+# Work done by the processes of a pool isn't recorded,
+# only the time the parent waited for it.
+###
+registry = {'timers': {}, 'counters': {}, 'start': time.time()}
+
+
+def count(name, value=1):
+    counters = registry['counters']
+    counters[name] = counters.get(name, 0) + value
+
+
+def add_time(name, seconds):
+    timer = registry['timers'].get(name)
+    if timer is None:
+        timer = registry['timers'][name] = {'calls': 0, 'seconds': 0.0}
+    timer['calls'] += 1
+    timer['seconds'] += seconds
+
+
+@contextmanager
+def timer(name):
+    start = time.time()
+    try:
+        yield
+    finally:
+        add_time(name, time.time() - start)
+
+
+def timed(func, name):
+    @functools.wraps(func)
+    def timed_func(*args, **kwargs):
+        start = time.time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            add_time(name, time.time() - start)
+    return timed_func
+
+
+def profile_functions(module, names):
+    # functions are looked up in the module when they are
+    # called, so replacing them times every call
+    for name in names:
+        setattr(module, name, timed(getattr(module, name), name))
+
+
+def reset():
+    registry['timers'].clear()
+    registry['counters'].clear()
+    registry['start'] = time.time()
+
+
+def report():
+    return {'date': datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'wall_seconds': time.time() - registry['start'],
+            'timers': registry['timers'], 'counters': registry['counters']}
+
+
+def save_report(fname):
+    with open(fname, 'w') as json_file:
+        json.dump(report(), json_file, sort_keys=True, indent=1)
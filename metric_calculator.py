@@ -1,14 +1,98 @@
 __author__ = 'jorgesaldivar'
 
+from collections import OrderedDict
 from dateutil import parser
-from sets import Set
 
+import argparse
+import author_table
+import cache_manifest
+import calendar
 import csv
+import dataset_store
+import data_correctness_checker
 import datetime
+import external_sort
+import heavy_hitters
+import id_dictionary
+import instrumentation
 import json
+import math
+import multiprocessing
 import numpy
+import quantile_sketch
+import records
+import re
 import sys
 
+try:
+    from scipy import sparse
+except ImportError:
+    sparse = None  # only needed by the overlap of communities
+
+
+###
+# Timestamps
+#
+# Datetimes are parsed once, when the data set is
+# built, into seconds since epoch (UTC). Datetimes
+# without time zone are taken as UTC. The exports use
+# a fixed ISO format, dateutil is only used for the
+# strings that don't follow it
+###
+ISO_DATETIME = re.compile(r'^(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})(?:\.(\d+))?'
+                          r'(?:(Z)|([+-])(\d{2}):?(\d{2}))?$')
+
+
+def parse_iso_datetime(dt_string):
+    # returns the fields of the datetime, its microseconds
+    # and its utc offset in seconds (None if naive)
+    match = ISO_DATETIME.match(dt_string)
+    if not match:
+        return None
+    year, month, day, hour, minute, second, fraction, zulu, sign, off_h, off_m = match.groups()
+    fields = (int(year), int(month), int(day), int(hour), int(minute), int(second))
+    microseconds = int((fraction + '000000')[:6]) if fraction else 0
+    if zulu:
+        offset = 0
+    elif sign:
+        offset = (int(off_h) * 3600 + int(off_m) * 60) * (1 if sign == '+' else -1)
+    else:
+        offset = None
+    return fields, microseconds, offset
+
+
+def to_epoch(dt_string):
+    if not dt_string:
+        return None
+    iso_dt = parse_iso_datetime(dt_string)
+    if iso_dt:
+        fields, microseconds, offset = iso_dt
+        epoch = calendar.timegm(fields) - (offset or 0)
+    else:
+        dt = parser.parse(dt_string)
+        if dt.utcoffset() is not None:
+            epoch = calendar.timegm(dt.utctimetuple())
+        else:
+            epoch = calendar.timegm(dt.timetuple())
+        microseconds = dt.microsecond
+    if microseconds:
+        return epoch + microseconds / 1e6
+    return epoch
+
+
+def format_datetime(dt_string):
+    # same output as strftime('%Y-%m-%d %H:%M:%S%z')
+    match = ISO_DATETIME.match(dt_string)
+    if not match:
+        return parser.parse(dt_string).strftime('%Y-%m-%d %H:%M:%S%z')
+    year, month, day, hour, minute, second, _, zulu, sign, off_h, off_m = match.groups()
+    formatted_dt = year + '-' + month + '-' + day + ' ' + hour + ':' + minute + ':' + second
+    if zulu or (sign and off_h == '00' and off_m == '00'):
+        formatted_dt += '+0000'
+    elif sign:
+        formatted_dt += sign + off_h + off_m
+    return formatted_dt
+
 
 ###
 # Data for metric: response time of comments
@@ -20,34 +104,29 @@ import sys
 ###
 def data_metric_response_time_comments(idea):
     ignored_comments, problematic_comments = 0, 0
-    vec_comments, attended_comments = {}, []
-
-    for comment in idea['comments_array']:
-        if comment['parent_type'] == 'idea':
-            try:
-                vec_comments[comment['id']]['creation_dt'] = parser.parse(comment['creation_datetime'])
-            except KeyError:
-                vec_comments[comment['id']] = {'creation_dt': parser.parse(comment['creation_datetime']),
-                                               'replies': []}
-        else:
-            # found a reply, save
-            try:
-                vec_comments[comment['parent_id']]['replies'].append(comment)
-            except KeyError:
-                vec_comments[comment['parent_id']] = {'creation_dt': '', 'replies': [comment]}
+    # comments are kept in the order they appear
+    vec_comments, attended_comments = OrderedDict(), []
+
+    for comment in idea.comments_array:
+        if comment.parent_type == 'idea':
+            vec_comments[comment.id] = {'comment': comment, 'replies': []}
+        elif comment.parent_id in vec_comments:
+            # found a reply, save. Replies to replies
+            # are not considered
+            vec_comments[comment.parent_id]['replies'].append(comment)
 
     for comment_id, comment in vec_comments.iteritems():
         if len(comment['replies']) > 0:
-            first_reaction = sort_elements_chronologically(comment['replies'])[0]
-            response_time = first_reaction - comment['creation_dt']
-            if response_time.total_seconds() < 0:
+            first_reaction = first_element(comment['replies'])
+            response_time = first_reaction.creation_epoch - comment['comment'].creation_epoch
+            if response_time < 0:
                 problematic_comments += 1
                 response_time_hours = -999
             else:
-                response_time_hours = response_time.total_seconds() / 3600
-            first_reaction_dt = first_reaction.strftime('%Y-%m-%d %H:%M:%S%z')
+                response_time_hours = response_time / 3600.0
+            first_reaction_dt = format_datetime(first_reaction.creation_datetime)
             attended_comments.append({'comment_id': comment_id,
-                                      'comment_dt': comment['creation_dt'].strftime('%Y-%m-%d %H:%M:%S%z'),
+                                      'comment_dt': format_datetime(comment['comment'].creation_datetime),
                                       'first_reaction_dt': first_reaction_dt,
                                       'response_time_hours': response_time_hours})
         else:
@@ -70,13 +149,10 @@ def data_metric_response_time_comments(idea):
 # no replied ideas
 #
 ####
-def sort_elements_chronologically(elements):
-    elements_dt = []
-
-    for element in elements:
-        elements_dt.append(parser.parse(element['creation_datetime']))
-
-    return sorted(elements_dt)
+def first_element(elements):
+    # the oldest element, the first one if
+    # several have the same datetime
+    return min(elements, key=lambda element: element.creation_epoch)
 
 
 def data_metric_response_time_idea(idea):
@@ -86,45 +162,44 @@ def data_metric_response_time_idea(idea):
     first_reaction_comment, first_reaction_vote = 0, 0
     first_reaction_dt, response_time_hours = '', 0
 
-    idea_creation_time = parser.parse(idea['creation_datetime'])
-    num_comments = int(idea['comments'])
-    num_votes = int(idea['up_votes']) + int(idea['down_votes'])
-    comments_sorted, votes_sorted = None, None
+    num_comments = idea.comments
+    num_votes = idea.up_votes + idea.down_votes
+    first_comment, first_vote = None, None
 
     if num_comments == 0 and num_votes == 0:
         response_time_hours = -999
     else:
-        if len(idea['comments_array']) == num_comments and \
-           len(idea['votes_array']) == num_votes:
+        if len(idea.comments_array) == num_comments and \
+           len(idea.votes_array) == num_votes:
             if num_comments > 0:
-                comments_sorted = sort_elements_chronologically(idea['comments_array'])
+                first_comment = first_element(idea.comments_array)
             if num_votes > 0:
-                votes_sorted = sort_elements_chronologically(idea['votes_array'])
-            if comments_sorted:
-                if votes_sorted:
-                    if comments_sorted[0] > votes_sorted[0]:  # '>' means which is newer
-                        first_reaction = votes_sorted[0]
+                first_vote = first_element(idea.votes_array)
+            if first_comment:
+                if first_vote:
+                    if first_comment.creation_epoch > first_vote.creation_epoch:  # '>' means which is newer
+                        first_reaction = first_vote
                         type_first_reaction = 'vote'
                     else:
-                        first_reaction = comments_sorted[0]
+                        first_reaction = first_comment
                         type_first_reaction = 'comment'
                 else:
-                    first_reaction = comments_sorted[0]
+                    first_reaction = first_comment
                     type_first_reaction = 'comment'
             else:
-                first_reaction = votes_sorted[0]
+                first_reaction = first_vote
                 type_first_reaction = 'vote'
-            response_time = first_reaction - idea_creation_time
-            if response_time.total_seconds() < 0:
+            response_time = first_reaction.creation_epoch - idea.creation_epoch
+            if response_time < 0:
                 problematic_idea = 1
                 response_time_hours = -999
             else:
-                response_time_hours = response_time.total_seconds() / 3600
+                response_time_hours = response_time / 3600.0
                 if type_first_reaction == 'comment':
                     first_reaction_comment = 1
                 else:
                     first_reaction_vote = 1
-            first_reaction_dt = first_reaction.strftime('%Y-%m-%d %H:%M:%S%z')
+            first_reaction_dt = format_datetime(first_reaction.creation_datetime)
         else:
             uncompleted_idea = 1
             response_time_hours = -999
@@ -145,24 +220,24 @@ def data_metric_number_votes_replies_comments(idea):
     replies, replies_voted, replies_p_voted, replies_n_voted = 0, 0, 0, 0
     replies_replied, comments = 0, 0
 
-    for comment in idea['comments_array']:
-        if comment['parent_type'] == 'idea':
+    for comment in idea.comments_array:
+        if comment.parent_type == 'idea':
             comments += 1
-            if comment['up_votes'] != '0' or comment['down_votes'] != '0':
+            if comment.up_votes != 0 or comment.down_votes != 0:
                 comments_voted += 1
-                if comment['up_votes'] != '0':
+                if comment.up_votes != 0:
                     comments_p_voted += 1
                 else:
                     comments_n_voted += 1
         else:
             replies += 1
-            if comment['up_votes'] != '0' or comment['down_votes'] != '0':
+            if comment.up_votes != 0 or comment.down_votes != 0:
                 replies_voted += 1
-                if comment['up_votes'] != '0':
+                if comment.up_votes != 0:
                     replies_p_voted += 1
                 else:
                     replies_n_voted += 1
-            if comment['replies'] != '0':
+            if comment.replies != 0:
                 replies_replied += 1
 
     return comments, comments_voted, comments_p_voted, comments_n_voted, replies, replies_voted, \
@@ -181,13 +256,13 @@ def data_metric_number_votes_comments_idea(idea):
     ignored_idea, attended_idea, idea_only_voted, idea_only_commented = 0, 0, 0, 0
     idea_voted_commented = 0
 
-    if idea['up_votes'] != '0' or idea['down_votes'] != '0':
+    if idea.up_votes != 0 or idea.down_votes != 0:
         idea_voted = 1
-        if idea['up_votes'] != '0':
+        if idea.up_votes != 0:
             idea_p_voted = 1
-        if idea['down_votes'] != '0':
+        if idea.down_votes != 0:
             idea_n_voted = 1
-    if idea['comments'] != '0':
+    if idea.comments != 0:
         idea_commented = 1
     if idea_voted == 0 and idea_commented == 0:
         ignored_idea = 1
@@ -212,7 +287,7 @@ def data_metric_number_votes_comments_idea(idea):
 #
 ####
 def data_metric_irrelevant_idea(idea):
-    if idea['status'] == 'offtopic' or idea['status'] == 'recyclebin':
+    if idea.status == 'offtopic' or idea.status == 'recyclebin':
         return 1
     else:
         return 0
@@ -225,41 +300,43 @@ def data_metric_irrelevant_idea(idea):
 # posted by newcomers were answered
 #
 ###
-def created_by_newcomer(idea, authors):
-    newcomer_time_window = 5  # 5 days
+NEWCOMER_WINDOW = 5  # days
+
 
+def created_by_newcomer(idea, authors, newcomer_time_window=NEWCOMER_WINDOW):
     # Identify whether an idea was created by someone who has
     # registered within the last newcomer_time_window days
 
-    try:
-        idea_author = authors[idea['author_id']]
-        author_registration_time = parser.parse(idea_author['registration_datetime'])
-        idea_creation_time = parser.parse(idea['creation_datetime'])
-        diff = author_registration_time - idea_creation_time
-        # If the time between the registration and the creation of the idea is equal or
-        # less than the defined newcomer time window, the author can be considered a
-        # newcomer
-        if diff.days <= newcomer_time_window:
-            return {'isnewcomer': True, 'explanation': ''}
-        else:
-            if diff.days < 0:
-                return {'isnewcomer': False, 'explanation': 'Wrong_registration_date'}
-            else:
-                return {'isnewcomer': False, 'explanation': 'No_newcomer'}
-    except KeyError:
+    author_registration_time = authors.registration_epoch(idea.author_id)
+    if author_registration_time is None:
         return {'isnewcomer': False, 'explanation': 'Unknown_registration_date'}
+    diff_days = int(math.floor((idea.creation_epoch - author_registration_time) / 86400.0))
+    # If the time between the registration and the creation of the idea is equal or
+    # less than the defined newcomer time window, the author can be considered a
+    # newcomer. Ideas created before the registration of their authors are wrong
+    if 0 <= diff_days <= newcomer_time_window:
+        return {'isnewcomer': True, 'explanation': ''}
+    else:
+        if diff_days < 0:
+            return {'isnewcomer': False, 'explanation': 'Wrong_registration_date'}
+        else:
+            return {'isnewcomer': False, 'explanation': 'No_newcomer'}
 
 
-def data_metric_feedback_newcomer_idea(idea, authors):
+def data_metric_feedback_newcomer_idea(idea, authors, response_time_idea=None,
+                                       newcomer_window=NEWCOMER_WINDOW):
     idea_by_newcomer, received_feedback = 0, 0
     type_first_feedback, first_feedback_dt = '', ''
     response_time_hours = -999
 
-    idea_creator = created_by_newcomer(idea, authors)
+    idea_creator = created_by_newcomer(idea, authors, newcomer_window)
     if idea_creator['isnewcomer']:
         idea_by_newcomer = 1
+        if response_time_idea is None:
+            # not computed by the caller
+            response_time_idea = data_metric_response_time_idea(idea)
         response_time_hours, problematic_idea, first_react_comment, first_react_vote, \
-        first_feedback_dt, uncompleted_idea = data_metric_response_time_idea(idea)
+        first_feedback_dt, uncompleted_idea = response_time_idea
         if uncompleted_idea == 1:
             received_feedback = 1
         elif problematic_idea == 1:
@@ -277,13 +354,14 @@ def data_metric_feedback_newcomer_idea(idea, authors):
                first_feedback_dt, response_time_hours
 
 
-def problematic_community(community_id):
-    TESTING_COMMUNITIES = ['13542', '24523', '2538', '2137', '22174', '25813', '10495',
-                           '34206', '8188', '6408', '8538', '10806']
-    INCOMPLETE_COMMUNITIES = ['20036', '2780', '15287', '23001', '31589', '13493', '18116']
-    UNAVAILABLE_COMMUNITIES = ['27159', '27749', '33602', '29324', '31683']
-    SPAM_COMMUNITIES = ['27157', '24385']
+TESTING_COMMUNITIES = ['13542', '24523', '2538', '2137', '22174', '25813', '10495',
+                       '34206', '8188', '6408', '8538', '10806']
+INCOMPLETE_COMMUNITIES = ['20036', '2780', '15287', '23001', '31589', '13493', '18116']
+UNAVAILABLE_COMMUNITIES = ['27159', '27749', '33602', '29324', '31683']
+SPAM_COMMUNITIES = ['27157', '24385']
 
+
+def problematic_community(community_id):
     if community_id in TESTING_COMMUNITIES: return True
     elif community_id in INCOMPLETE_COMMUNITIES: return True
     elif community_id in UNAVAILABLE_COMMUNITIES: return True
@@ -296,115 +374,604 @@ def problematic_community(community_id):
 # compute metrics
 #
 ##
-def gather_data(communities, authors, data):
-    tot_communities = len(data)
+def new_community_data(total_ideas):
+    community_data = {}
+    community_data['01_ideas'] = total_ideas
+    community_data['02_problematic_ideas'] = 0
+    community_data['03_attended_ideas'] = 0
+    community_data['04_attended_uncompleted_ideas'] = 0
+    community_data['05_ignored_ideas'] = 0
+    community_data['06_voted_ideas'] = 0
+    community_data['07_up_voted_ideas'] = 0
+    community_data['08_down_voted_ideas'] = 0
+    community_data['09_commented_ideas'] = 0
+    community_data['10_attended_only_vote_ideas'] = 0
+    community_data['11_attended_only_comment_ideas'] = 0
+    community_data['12_attended_vote_comment_ideas'] = 0
+    community_data['13_ideas_with_comment_as_first_reaction'] = 0
+    community_data['14_ideas_with_vote_as_first_reaction'] = 0
+    community_data['15_response_times_ideas'] = []
+    community_data['16_comments'] = 0
+    community_data['17_ignored_comments'] = 0
+    community_data['18_problematic_comments'] = 0
+    community_data['19_voted_comments'] = 0
+    community_data['20_up_voted_comments'] = 0
+    community_data['21_down_voted_comments'] = 0
+    community_data['22_replies'] = 0
+    community_data['23_voted_replies'] = 0
+    community_data['24_up_voted_replies'] = 0
+    community_data['25_down_voted_replies'] = 0
+    community_data['26_replied_replies'] = 0
+    community_data['27_response_times_comments'] = []
+    community_data['28_irrelevant_ideas'] = 0
+    community_data['29_newcomer_ideas'] = 0
+    community_data['30_attended_newcomer_ideas'] = 0
+    community_data['31_array_attended_newcomer_ideas'] = []
+
+    return community_data
+
+
+def accumulate_idea(community_data, idea, authors, newcomer_window=NEWCOMER_WINDOW):
+    idea_voted, idea_p_voted, idea_n_voted, idea_commented, ignored_idea, attended_idea, \
+    idea_only_voted, idea_only_commented, idea_voted_commented = \
+    data_metric_number_votes_comments_idea(idea)
+    community_data['06_voted_ideas'] += idea_voted
+    community_data['07_up_voted_ideas'] += idea_p_voted
+    community_data['08_down_voted_ideas'] += idea_n_voted
+    community_data['09_commented_ideas'] += idea_commented
+    community_data['05_ignored_ideas'] += ignored_idea
+    community_data['03_attended_ideas'] += attended_idea
+    community_data['10_attended_only_vote_ideas'] += idea_only_voted
+    community_data['11_attended_only_comment_ideas'] += idea_only_commented
+    community_data['12_attended_vote_comment_ideas'] += idea_voted_commented
+    comments, comments_voted, comments_p_voted, comments_n_voted, replies, \
+    replies_voted, replies_p_voted, replies_n_voted, replies_replied = \
+    data_metric_number_votes_replies_comments(idea)
+    community_data['16_comments'] += comments
+    community_data['22_replies'] += replies
+    community_data['19_voted_comments'] += comments_voted
+    community_data['20_up_voted_comments'] += comments_p_voted
+    community_data['21_down_voted_comments'] += comments_n_voted
+    community_data['23_voted_replies'] += replies_voted
+    community_data['24_up_voted_replies'] += replies_p_voted
+    community_data['25_down_voted_replies'] += replies_n_voted
+    community_data['26_replied_replies'] += replies_replied
+    response_time_idea = data_metric_response_time_idea(idea)
+    response_time_hour, problematic_idea, first_react_comment, first_react_vote, \
+    first_react_dt, uncompleted_idea = response_time_idea
+    community_data['02_problematic_ideas'] += problematic_idea
+    community_data['04_attended_uncompleted_ideas'] += uncompleted_idea
+    community_data['13_ideas_with_comment_as_first_reaction'] += \
+        first_react_comment
+    community_data['14_ideas_with_vote_as_first_reaction'] += \
+        first_react_vote
+    if response_time_hour != -999:  # only save response time of completed ideas
+        if first_react_vote == 1:
+            type_first_reaction = 'vote'
+        else:
+            type_first_reaction = 'comment'
+        community_data['15_response_times_ideas'].\
+            append({'idea_id': idea.id, 'response_time_hour': response_time_hour,
+                    'idea_dt': idea.creation_datetime, 'first_reaction_dt': first_react_dt,
+                    'type_first_reaction': type_first_reaction})                                
+    ignored_comments, problematic_comments, attended_comments = data_metric_response_time_comments(idea)
+    community_data['17_ignored_comments'] += ignored_comments
+    community_data['18_problematic_comments'] += problematic_comments
+    community_data['27_response_times_comments'] += attended_comments
+    community_data['28_irrelevant_ideas'] += data_metric_irrelevant_idea(idea)
+    idea_by_newcomer, received_feedback, type_first_feedback, \
+    first_feedback_dt, response_time_hours = \
+        data_metric_feedback_newcomer_idea(idea, authors, response_time_idea, newcomer_window)
+    community_data['29_newcomer_ideas'] += idea_by_newcomer
+    community_data['30_attended_newcomer_ideas'] += received_feedback
+    if idea_by_newcomer == 1 and received_feedback == 1 and response_time_hours != -999:
+        attended_idea = {'idea_id': idea.id, 'type_first_feedback': type_first_feedback,
+                         'first_feedback_dt': first_feedback_dt,
+                         'response_time_first_feedback_hours': response_time_hours,
+                         'idea_creation_dt': idea.creation_datetime}
+        community_data['31_array_attended_newcomer_ideas'].append(attended_idea)
+
+    return community_data
+
+
+def gather_data(communities, authors, data, newcomer_window=NEWCOMER_WINDOW):
+    progress = instrumentation.Progress(len(data))
     community_counter = 0
     metric_data = {}
 
     for community_id, ideas in data.iteritems():
         if problematic_community(community_id):
+            instrumentation.count('problematic_communities_skipped')
+            instrumentation.count('problematic_ideas_skipped', len(ideas))
             continue
         community_counter += 1
-        print_progress_bar(community_counter, tot_communities, prefix='Progress',
-                           suffix='Completed', bar_length=50)
+        progress.update(community_counter)
         total_ideas = len(ideas)
         for idx in range(0, total_ideas):
             idea = ideas[idx]
             if idx == 0:
                 # initialize community metric vars
-                metric_data[community_id] = {}
-                metric_data[community_id]['01_ideas'] = total_ideas
-                metric_data[community_id]['02_problematic_ideas'] = 0
-                metric_data[community_id]['03_attended_ideas'] = 0
-                metric_data[community_id]['04_attended_uncompleted_ideas'] = 0
-                metric_data[community_id]['05_ignored_ideas'] = 0
-                metric_data[community_id]['06_voted_ideas'] = 0
-                metric_data[community_id]['07_up_voted_ideas'] = 0
-                metric_data[community_id]['08_down_voted_ideas'] = 0
-                metric_data[community_id]['09_commented_ideas'] = 0
-                metric_data[community_id]['10_attended_only_vote_ideas'] = 0
-                metric_data[community_id]['11_attended_only_comment_ideas'] = 0
-                metric_data[community_id]['12_attended_vote_comment_ideas'] = 0
-                metric_data[community_id]['13_ideas_with_comment_as_first_reaction'] = 0
-                metric_data[community_id]['14_ideas_with_vote_as_first_reaction'] = 0
-                metric_data[community_id]['15_response_times_ideas'] = []
-                metric_data[community_id]['16_comments'] = 0
-                metric_data[community_id]['17_ignored_comments'] = 0
-                metric_data[community_id]['18_problematic_comments'] = 0
-                metric_data[community_id]['19_voted_comments'] = 0
-                metric_data[community_id]['20_up_voted_comments'] = 0
-                metric_data[community_id]['21_down_voted_comments'] = 0
-                metric_data[community_id]['22_replies'] = 0
-                metric_data[community_id]['23_voted_replies'] = 0
-                metric_data[community_id]['24_up_voted_replies'] = 0
-                metric_data[community_id]['25_down_voted_replies'] = 0
-                metric_data[community_id]['26_replied_replies'] = 0
-                metric_data[community_id]['27_response_times_comments'] = []
-                metric_data[community_id]['28_irrelevant_ideas'] = 0
-                metric_data[community_id]['29_newcomer_ideas'] = 0
-                metric_data[community_id]['30_attended_newcomer_ideas'] = 0
-                metric_data[community_id]['31_array_attended_newcomer_ideas'] = []    
-            idea_voted, idea_p_voted, idea_n_voted, idea_commented, ignored_idea, attended_idea, \
-            idea_only_voted, idea_only_commented, idea_voted_commented = \
-            data_metric_number_votes_comments_idea(idea)
-            metric_data[community_id]['06_voted_ideas'] += idea_voted
-            metric_data[community_id]['07_up_voted_ideas'] += idea_p_voted
-            metric_data[community_id]['08_down_voted_ideas'] += idea_n_voted
-            metric_data[community_id]['09_commented_ideas'] += idea_commented
-            metric_data[community_id]['05_ignored_ideas'] += ignored_idea
-            metric_data[community_id]['03_attended_ideas'] += attended_idea
-            metric_data[community_id]['10_attended_only_vote_ideas'] += idea_only_voted
-            metric_data[community_id]['11_attended_only_comment_ideas'] += idea_only_commented
-            metric_data[community_id]['12_attended_vote_comment_ideas'] += idea_voted_commented
-            comments, comments_voted, comments_p_voted, comments_n_voted, replies, \
-            replies_voted, replies_p_voted, replies_n_voted, replies_replied = \
-            data_metric_number_votes_replies_comments(idea)
-            metric_data[community_id]['16_comments'] += comments
-            metric_data[community_id]['22_replies'] += replies
-            metric_data[community_id]['19_voted_comments'] += comments_voted
-            metric_data[community_id]['20_up_voted_comments'] += comments_p_voted
-            metric_data[community_id]['21_down_voted_comments'] += comments_n_voted
-            metric_data[community_id]['23_voted_replies'] += replies_voted
-            metric_data[community_id]['24_up_voted_replies'] += replies_p_voted
-            metric_data[community_id]['25_down_voted_replies'] += replies_n_voted
-            metric_data[community_id]['26_replied_replies'] += replies_replied
-            response_time_hour, problematic_idea, first_react_comment, first_react_vote, \
-            first_react_dt, uncompleted_idea = data_metric_response_time_idea(idea)
-            metric_data[community_id]['02_problematic_ideas'] += problematic_idea
-            metric_data[community_id]['04_attended_uncompleted_ideas'] += uncompleted_idea
-            metric_data[community_id]['13_ideas_with_comment_as_first_reaction'] += \
-                first_react_comment
-            metric_data[community_id]['14_ideas_with_vote_as_first_reaction'] += \
-                first_react_vote
-            if response_time_hour != -999:  # only save response time of completed ideas
-                if first_react_vote == 1:
-                    type_first_reaction = 'vote'
-                else:
-                    type_first_reaction = 'comment'
-                metric_data[community_id]['15_response_times_ideas'].\
-                    append({'idea_id': idea['id'], 'response_time_hour': response_time_hour,
-                            'idea_dt': idea['creation_datetime'], 'first_reaction_dt': first_react_dt,
-                            'type_first_reaction': type_first_reaction})                                
-            ignored_comments, problematic_comments, attended_comments = data_metric_response_time_comments(idea)
-            metric_data[community_id]['17_ignored_comments'] += ignored_comments
-            metric_data[community_id]['18_problematic_comments'] += problematic_comments
-            metric_data[community_id]['27_response_times_comments'] += attended_comments
-            metric_data[community_id]['28_irrelevant_ideas'] += data_metric_irrelevant_idea(idea)
-            idea_by_newcomer, received_feedback, type_first_feedback, \
-            first_feedback_dt, response_time_hours = data_metric_feedback_newcomer_idea(idea, authors)
-            metric_data[community_id]['29_newcomer_ideas'] += idea_by_newcomer
-            metric_data[community_id]['30_attended_newcomer_ideas'] += received_feedback
-            if idea_by_newcomer == 1 and received_feedback == 1 and response_time_hours != -999:
-                attended_idea = {'idea_id': idea['id'], 'type_first_feedback': type_first_feedback,
-                                 'first_feedback_dt': first_feedback_dt,
-                                 'response_time_first_feedback_hours': response_time_hours,
-                                 'idea_creation_dt': idea['creation_datetime']}
-                metric_data[community_id]['31_array_attended_newcomer_ideas'].append(attended_idea)
+                metric_data[community_id] = new_community_data(total_ideas)
+            accumulate_idea(metric_data[community_id], idea, authors, newcomer_window)
         metric_data[community_id]['32_tags_content'] = communities.get(community_id)['tags']
 
     return metric_data
 
 
+##
+# Columnar engine for gather_data
+#
+# Computes the same data as gather_data working on
+# the columns of the data set (see dataset_store)
+# instead of idea by idea. Per-idea and per-comment
+# flags are computed for the whole data set at once
+# and then added up by community with bincount.
+# Only the response time records are built one by one.
+#
+# When quantile_error is given, response times are
+# summarized with quantile sketches (see quantile_sketch)
+# instead of being kept record by record, so the data
+# collected for each community doesn't grow with its
+# size. Medians and percentiles are then approximated
+# with a rank error of about quantile_error.
+#
+# Authors are joined with the ideas once, the newcomer
+# flags of several windows (see gather_data_windows) are
+# derived from the same join.
+##
+def count_by(flags, groups, num_groups):
+    return numpy.bincount(groups[flags], minlength=num_groups)
+
+
+def segment_first(values, segments, num_segments):
+    # position of the smallest value of every segment, the
+    # first one if several are equal, -1 if the segment is empty
+    first = numpy.full(num_segments, -1, dtype=numpy.int64)
+    if len(values) > 0:
+        order = numpy.lexsort((values, segments))
+        sorted_segments = segments[order]
+        starts = numpy.flatnonzero(numpy.concatenate(([True], sorted_segments[1:] !=
+                                                              sorted_segments[:-1])))
+        first[sorted_segments[starts]] = order[starts]
+    return first
+
+
+def first_level_replies(comment_idea, comment_ids, parent_ids, top):
+    # position of the comment answered by every first-level
+    # reply, -1 for comments and replies to replies. Ids of
+    # comments and parents are codes of the same id space
+    num_comments = len(comment_ids)
+    parent_pos = numpy.full(num_comments, -1, dtype=numpy.int64)
+    if num_comments == 0 or top.all():
+        return parent_pos
+    comment_ids = numpy.asarray(comment_ids, dtype=numpy.int64)
+    parent_ids = numpy.asarray(parent_ids, dtype=numpy.int64)
+    width = int(max(comment_ids.max(), parent_ids.max())) + 1
+    top_pos = numpy.flatnonzero(top)
+    top_keys = comment_idea[top_pos] * width + comment_ids[top_pos]
+    order = numpy.argsort(top_keys, kind='mergesort')
+    top_pos, top_keys = top_pos[order], top_keys[order]
+    reply_pos = numpy.flatnonzero(~top)
+    reply_keys = comment_idea[reply_pos] * width + parent_ids[reply_pos]
+    found = numpy.searchsorted(top_keys, reply_keys)
+    found[found == len(top_keys)] = 0
+    matched = (top_keys[found] == reply_keys) if len(top_keys) > 0 \
+        else numpy.zeros(len(reply_keys), dtype=bool)
+    # the parent has to appear before the reply
+    matched &= top_pos[found] < reply_pos
+    parent_pos[reply_pos[matched]] = top_pos[found[matched]]
+    return parent_pos
+
+
+def block_sketches(blocks, values, num_blocks, error):
+    sketches = [quantile_sketch.KLLSketch(error) for _ in range(num_blocks)]
+    for block, value in zip(blocks.tolist(), values.tolist()):
+        sketches[block].update(value)
+    return sketches
+
+
+def registration_epochs(authors, author_codes, id_table):
+    # authors are looked up once, by the codes of their ids
+    unique_codes, idx_authors = numpy.unique(author_codes, return_inverse=True)
+    positions = authors.positions(id_dictionary.decode(id_table, unique_codes))
+    epochs = numpy.where(positions >= 0, authors.registration_epochs[positions], numpy.nan) \
+        if len(authors) > 0 else numpy.full(len(positions), numpy.nan)
+    return epochs[idx_authors]
+
+
+def registration_days(authors, data):
+    # days between the registration of the author of every
+    # idea and the creation of the idea, nan if unknown
+    registration = registration_epochs(authors, data.column('ideas', 'author_id'),
+                                       data.id_table('authors'))
+    with numpy.errstate(invalid='ignore'):
+        return numpy.floor((numpy.asarray(data.column('ideas', 'creation_epoch')) - registration)
+                           / 86400.0)
+
+
+def newcomer_flags(days, newcomer_window):
+    # same rule as created_by_newcomer
+    with numpy.errstate(invalid='ignore'):
+        return ~numpy.isnan(days) & (days >= 0) & (days <= newcomer_window)
+
+
+def response_time_sketches(idea_block, comment_block, answered, newcomers, response_time,
+                           has_reply, reply_time, num_blocks, error):
+    # response times are truncated to hours, as done when
+    # the medians are computed from the records. Sketches of
+    # newcomer ideas are given for every newcomer flags
+    answered_pos = numpy.flatnonzero(answered)
+    idea_hours = numpy.trunc(response_time[answered_pos] / 3600.0).astype(numpy.int64)
+    replied_pos = numpy.flatnonzero(has_reply)
+    with numpy.errstate(invalid='ignore'):
+        comment_hours = numpy.where(reply_time[replied_pos] < 0, -999,
+                                    numpy.trunc(reply_time[replied_pos] / 3600.0))
+    sketches = [block_sketches(idea_block[answered_pos], idea_hours, num_blocks, error),
+                block_sketches(comment_block[replied_pos], comment_hours.astype(numpy.int64),
+                               num_blocks, error)]
+    for newcomer in newcomers:
+        newcomer_pos = numpy.flatnonzero(newcomer[answered_pos])
+        sketches.append(block_sketches(idea_block[answered_pos][newcomer_pos],
+                                       idea_hours[newcomer_pos], num_blocks, error))
+    sketches = [[sketch.to_dict() for sketch in block_sketch] for block_sketch in sketches]
+    return sketches[0], sketches[1], sketches[2:]
+
+
+def gather_data_columnar(communities, authors, data, quantile_error=None,
+                         newcomer_window=NEWCOMER_WINDOW):
+    return gather_data_windows(communities, authors, data, quantile_error,
+                               [newcomer_window])[newcomer_window]
+
+
+###
+# Data collected for metrics with each of the given
+# newcomer windows, by window. Only the data of newcomer
+# ideas depends on the window, the rest is computed once
+# and shared by the data of all windows
+###
+def gather_data_windows(communities, authors, data, quantile_error=None,
+                        newcomer_windows=(NEWCOMER_WINDOW,)):
+    metric_data = dict((window, {}) for window in newcomer_windows)
+    idea_column = lambda field: data.column('ideas', field)
+    comment_column = lambda field: data.column('comments', field)
+
+    community_offsets = numpy.asarray(data.array('community_offsets'))
+    comment_offsets = numpy.asarray(data.array('comment_offsets'))
+    vote_offsets = numpy.asarray(data.array('vote_offsets'))
+    num_blocks = len(community_offsets) - 1
+    num_ideas = int(community_offsets[-1])
+    idea_block = numpy.repeat(numpy.arange(num_blocks), numpy.diff(community_offsets))
+    idea_comments = numpy.diff(comment_offsets)
+    idea_votes = numpy.diff(vote_offsets)
+
+    # ideas voted and commented
+    up_votes, down_votes = idea_column('up_votes'), idea_column('down_votes')
+    p_voted = up_votes != 0
+    n_voted = down_votes != 0
+    voted = p_voted | n_voted
+    commented = idea_column('comments') != 0
+    attended = voted | commented
+    flags = {'06_voted_ideas': voted, '07_up_voted_ideas': p_voted,
+             '08_down_voted_ideas': n_voted, '09_commented_ideas': commented,
+             '05_ignored_ideas': ~attended, '03_attended_ideas': attended,
+             '10_attended_only_vote_ideas': voted & ~commented,
+             '11_attended_only_comment_ideas': commented & ~voted,
+             '12_attended_vote_comment_ideas': voted & commented}
+    status = idea_column('status')
+    flags['28_irrelevant_ideas'] = (status == 'offtopic') | (status == 'recyclebin')
+
+    # comments voted and replied
+    comment_idea = numpy.repeat(numpy.arange(num_ideas), idea_comments)
+    comment_block = idea_block[comment_idea]
+    num_comments = len(comment_idea)
+    top = comment_column('parent_type') == 'idea' if num_comments > 0 \
+        else numpy.zeros(0, dtype=bool)
+    if num_comments > 0:
+        c_p_voted = comment_column('up_votes') != 0
+        c_voted = c_p_voted | (comment_column('down_votes') != 0)
+        c_replied = comment_column('replies') != 0
+    else:
+        c_p_voted = c_voted = c_replied = numpy.zeros(0, dtype=bool)
+    comment_flags = {'16_comments': top, '22_replies': ~top,
+                     '19_voted_comments': top & c_voted,
+                     '20_up_voted_comments': top & c_p_voted,
+                     '21_down_voted_comments': top & c_voted & ~c_p_voted,
+                     '23_voted_replies': ~top & c_voted,
+                     '24_up_voted_replies': ~top & c_p_voted,
+                     '25_down_voted_replies': ~top & c_voted & ~c_p_voted,
+                     '26_replied_replies': ~top & c_replied}
+
+    # response time of ideas
+    idea_epoch = numpy.asarray(idea_column('creation_epoch'))
+    reported_comments = numpy.asarray(idea_column('comments'), dtype=numpy.int64)
+    reported_votes = numpy.asarray(up_votes, dtype=numpy.int64) + down_votes
+    reacted = (reported_comments != 0) | (reported_votes != 0)
+    completed = reacted & (idea_comments == reported_comments) & (idea_votes == reported_votes)
+    uncompleted = reacted & ~completed
+    comment_epoch = numpy.asarray(comment_column('creation_epoch')) if num_comments > 0 \
+        else numpy.zeros(0)
+    vote_epoch = numpy.asarray(data.column('votes', 'creation_epoch')) \
+        if vote_offsets[-1] > 0 else numpy.zeros(0)
+    vote_idea = numpy.repeat(numpy.arange(num_ideas), idea_votes)
+    first_comment = segment_first(comment_epoch, comment_idea, num_ideas)
+    first_vote = segment_first(vote_epoch, vote_idea, num_ideas)
+    first_comment_epoch = numpy.where(first_comment >= 0, comment_epoch[first_comment] if
+                                      num_comments > 0 else numpy.nan, numpy.nan)
+    first_vote_epoch = numpy.where(first_vote >= 0, vote_epoch[first_vote] if
+                                   len(vote_epoch) > 0 else numpy.nan, numpy.nan)
+    with numpy.errstate(invalid='ignore'):  # nan when there are no reactions
+        # the comment is the first reaction unless the vote is older
+        vote_first = (first_vote >= 0) & ((first_comment < 0) |
+                                          (first_comment_epoch > first_vote_epoch))
+        first_reaction_epoch = numpy.where(vote_first, first_vote_epoch, first_comment_epoch)
+        response_time = first_reaction_epoch - idea_epoch
+        problematic = completed & (response_time < 0)
+    answered = completed & ~problematic
+    first_react_vote = answered & vote_first
+    first_react_comment = answered & ~vote_first
+    flags.update({'02_problematic_ideas': problematic,
+                  '04_attended_uncompleted_ideas': uncompleted,
+                  '13_ideas_with_comment_as_first_reaction': first_react_comment,
+                  '14_ideas_with_vote_as_first_reaction': first_react_vote})
+
+    # feedback on newcomer ideas
+    days = registration_days(authors, data)
+    newcomers = [newcomer_flags(days, window) for window in newcomer_windows]
+    newcomer_counters = []
+    for newcomer in newcomers:
+        newcomer_ideas = {'29_newcomer_ideas': newcomer,
+                          '30_attended_newcomer_ideas': newcomer & (uncompleted | completed)}
+        if quantile_error is not None:
+            # the type of first feedback isn't kept in the sketches
+            newcomer_ideas['33_newcomer_ideas_first_feedback_vote'] = newcomer & first_react_vote
+        newcomer_counters.append(dict((metric_id, count_by(metric_flags, idea_block, num_blocks))
+                                      for metric_id, metric_flags in newcomer_ideas.iteritems()))
+
+    # response time of comments
+    parent_pos = first_level_replies(comment_idea, comment_column('id') if num_comments > 0
+                                     else numpy.zeros(0, dtype=numpy.int32),
+                                     comment_column('parent_id') if num_comments > 0
+                                     else numpy.zeros(0, dtype=numpy.int32), top)
+    replies_pos = numpy.flatnonzero(parent_pos >= 0)
+    first_reply = segment_first(comment_epoch[replies_pos], parent_pos[replies_pos], num_comments)
+    has_reply = first_reply >= 0
+    first_reply[has_reply] = replies_pos[first_reply[has_reply]]
+    comment_flags['17_ignored_comments'] = top & ~has_reply
+    reply_time = numpy.full(num_comments, numpy.nan)
+    reply_time[has_reply] = comment_epoch[first_reply[has_reply]] - comment_epoch[has_reply]
+    with numpy.errstate(invalid='ignore'):
+        comment_flags['18_problematic_comments'] = has_reply & (reply_time < 0)
+
+    counters = {}
+    for metric_id, metric_flags in flags.iteritems():
+        counters[metric_id] = count_by(metric_flags, idea_block, num_blocks)
+    for metric_id, metric_flags in comment_flags.iteritems():
+        counters[metric_id] = count_by(metric_flags, comment_block, num_blocks)
+    total_ideas = numpy.diff(community_offsets)
+
+    metric_suffix = ''
+    if quantile_error is None:
+        # records of response times
+        response_times_ideas = [[] for _ in range(num_blocks)]
+        response_times_comments = [[] for _ in range(num_blocks)]
+        attended_newcomer_ideas = [[[] for _ in range(num_blocks)] for _ in newcomers]
+        answered_pos = numpy.flatnonzero(answered)
+        first_react_pos = numpy.where(first_react_vote, first_vote, first_comment)[answered_pos]
+        react_vote = first_react_vote[answered_pos]
+        first_react_dts = [None] * len(answered_pos)
+        if react_vote.any():
+            vote_dts = data.column('votes', 'creation_datetime')[first_react_pos[react_vote]]
+            vote_dts = vote_dts.tolist()
+            for idx, vote_dt in zip(numpy.flatnonzero(react_vote).tolist(), vote_dts):
+                first_react_dts[idx] = vote_dt
+        if (~react_vote).any():
+            comment_dts = comment_column('creation_datetime')[first_react_pos[~react_vote]]
+            comment_dts = comment_dts.tolist()
+            for idx, comment_dt in zip(numpy.flatnonzero(~react_vote).tolist(), comment_dts):
+                first_react_dts[idx] = comment_dt
+        # newcomer flags of every window by answered idea
+        answered_newcomer = zip(*[newcomer[answered_pos].tolist() for newcomer in newcomers])
+        for idx, idea_id, idea_dt, react_dt, is_vote, newcomer_by_window, response_time_hour in \
+                zip(answered_pos.tolist(),
+                    data.decode('ideas', 'id', idea_column('id')[answered_pos]),
+                    idea_column('creation_datetime')[answered_pos].tolist(), first_react_dts,
+                    react_vote.tolist(), answered_newcomer,
+                    (response_time[answered_pos] / 3600.0).tolist()):
+            type_first_reaction = 'vote' if is_vote else 'comment'
+            first_react_dt = format_datetime(react_dt)
+            block = idea_block[idx]
+            response_times_ideas[block].append({'idea_id': idea_id,
+                                                'response_time_hour': response_time_hour,
+                                                'idea_dt': idea_dt,
+                                                'first_reaction_dt': first_react_dt,
+                                                'type_first_reaction': type_first_reaction})
+            if any(newcomer_by_window):
+                attended_idea = {'idea_id': idea_id, 'type_first_feedback': type_first_reaction,
+                                 'first_feedback_dt': first_react_dt,
+                                 'response_time_first_feedback_hours': response_time_hour,
+                                 'idea_creation_dt': idea_dt}
+                for window_ideas, is_newcomer in zip(attended_newcomer_ideas, newcomer_by_window):
+                    if is_newcomer:
+                        window_ideas[block].append(attended_idea)
+        replied_pos = numpy.flatnonzero(has_reply)
+        if len(replied_pos) > 0:
+            comment_dts = comment_column('creation_datetime')
+            for block, comment_id, comment_dt, reply_dt, comment_reply_time in \
+                    zip(comment_block[replied_pos].tolist(),
+                        data.decode('comments', 'id', comment_column('id')[replied_pos]),
+                        comment_dts[replied_pos].tolist(),
+                        comment_dts[first_reply[replied_pos]].tolist(),
+                        reply_time[replied_pos].tolist()):
+                if comment_reply_time < 0:
+                    response_time_hours = -999
+                else:
+                    response_time_hours = comment_reply_time / 3600.0
+                response_times_comments[block].append({'comment_id': comment_id,
+                                                       'comment_dt': format_datetime(comment_dt),
+                                                       'first_reaction_dt':
+                                                           format_datetime(reply_dt),
+                                                       'response_time_hours': response_time_hours})
+    else:
+        response_times_ideas, response_times_comments, attended_newcomer_ideas = \
+            response_time_sketches(idea_block, comment_block, answered, newcomers, response_time,
+                                   has_reply, reply_time, num_blocks, quantile_error)
+        metric_suffix = '_sketch'
+
+    for block, community_id in enumerate(data.communities):
+        if data.community_idx.get(community_id) != block:
+            # replaced by a later block of the same community
+            continue
+        if problematic_community(community_id):
+            instrumentation.count('problematic_communities_skipped')
+            instrumentation.count('problematic_ideas_skipped', int(total_ideas[block]))
+            continue
+        community_data = {'01_ideas': int(total_ideas[block])}
+        for metric_id, metric_counters in counters.iteritems():
+            community_data[metric_id] = int(metric_counters[block])
+        community_data['15_response_times_ideas' + metric_suffix] = response_times_ideas[block]
+        community_data['27_response_times_comments' + metric_suffix] = \
+            response_times_comments[block]
+        community_data['32_tags_content'] = communities.get(community_id)['tags']
+        for window, window_counters, window_ideas in zip(newcomer_windows, newcomer_counters,
+                                                         attended_newcomer_ideas):
+            window_data = dict(community_data)
+            for metric_id, metric_counters in window_counters.iteritems():
+                window_data[metric_id] = int(metric_counters[block])
+            window_data['31_array_attended_newcomer_ideas' + metric_suffix] = window_ideas[block]
+            metric_data[window][community_id] = window_data
+
+    return metric_data
+
+
+###
+# Parallel collection
+#
+# Communities are independent from each other, so they
+# are split in chunks processed by a pool of processes.
+# The data set, the communities and the authors are set
+# up before the pool is created and inherited by the
+# workers (fork), so they aren't pickled for every task.
+# Results are merged following the order of the chunks,
+# which is the order of a serial run
+###
+shared_state = {}
+
+
+def split_blocks(data, num_chunks):
+    # contiguous ranges of communities with
+    # roughly the same number of ideas
+    community_offsets = data.array('community_offsets')
+    num_blocks = len(community_offsets) - 1
+    bounds = [0]
+    for chunk in range(1, num_chunks):
+        block = int(numpy.searchsorted(community_offsets,
+                                       community_offsets[-1] * chunk // num_chunks))
+        if bounds[-1] < block < num_blocks:
+            bounds.append(block)
+    bounds.append(num_blocks)
+    return zip(bounds[:-1], bounds[1:])
+
+
+def gather_data_chunk(bounds):
+    data = shared_state['data'].slice(*bounds)
+    newcomer_windows = shared_state['newcomer_windows']
+    metric_data = gather_data_windows(shared_state['communities'], shared_state['authors'],
+                                      data, shared_state['quantile_error'], newcomer_windows)
+    return [(community_id, [metric_data[window][community_id] for window in newcomer_windows])
+            for community_id in data.communities
+            if community_id in metric_data[newcomer_windows[0]]]
+
+
+def gather_data_parallel(communities, authors, data, workers, quantile_error=None,
+                         newcomer_window=NEWCOMER_WINDOW):
+    return gather_data_windows_parallel(communities, authors, data, workers, quantile_error,
+                                        [newcomer_window])[newcomer_window]
+
+
+def gather_data_windows_parallel(communities, authors, data, workers, quantile_error=None,
+                                 newcomer_windows=(NEWCOMER_WINDOW,)):
+    shared_state.update({'data': data, 'communities': communities, 'authors': authors,
+                         'quantile_error': quantile_error,
+                         'newcomer_windows': list(newcomer_windows)})
+    chunks = split_blocks(data, workers * 4)
+    metric_data = dict((window, {}) for window in newcomer_windows)
+    progress = instrumentation.Progress(len(chunks))
+
+    pool = multiprocessing.Pool(processes=workers)
+    try:
+        for chunk_idx, chunk_data in enumerate(pool.imap(gather_data_chunk, chunks)):
+            progress.update(chunk_idx + 1)
+            for community_id, windows_data in chunk_data:
+                for window, community_data in zip(newcomer_windows, windows_data):
+                    metric_data[window][community_id] = community_data
+    finally:
+        pool.close()
+        pool.join()
+        shared_state.clear()
+
+    return metric_data
+
+
+###
+# Streaming collection
+#
+# Ideas are taken one at a time as they are assembled
+# from the exports (see iter_checked_dataset), added to
+# the data of their community and discarded, so neither
+# the data set nor the data of other communities are
+# kept in memory. The data of a community is handed out
+# as soon as its last idea is seen, exports are grouped
+# by community (see external_sort)
+###
+def records_to_sketches(community_data, error):
+    # same data as gather_data_columnar with quantile_error
+    newcomer_ideas = community_data.pop('31_array_attended_newcomer_ideas')
+    community_data['33_newcomer_ideas_first_feedback_vote'] = \
+        sum(1 for idea in newcomer_ideas if idea['type_first_feedback'] == 'vote')
+    for metric_id, records, field in \
+        (('15_response_times_ideas', community_data.pop('15_response_times_ideas'),
+          'response_time_hour'),
+         ('27_response_times_comments', community_data.pop('27_response_times_comments'),
+          'response_time_hours'),
+         ('31_array_attended_newcomer_ideas', newcomer_ideas,
+          'response_time_first_feedback_hours')):
+        sketch = quantile_sketch.KLLSketch(error)
+        for record in records:
+            sketch.update(int(record[field]))
+        community_data[metric_id + '_sketch'] = sketch.to_dict()
+
+
+def finish_community_data(communities, community_id, community_data, quantile_error):
+    community_data['32_tags_content'] = communities.get(community_id)['tags']
+    if quantile_error is not None:
+        records_to_sketches(community_data, quantile_error)
+    return community_id, community_data
+
+
+def stream_metric_data(communities, authors, ideas, quantile_error=None,
+                       newcomer_window=NEWCOMER_WINDOW):
+    community_id, community_data = None, None
+
+    for idea_community_id, idea in ideas:
+        if idea_community_id != community_id:
+            if community_data is not None:
+                yield finish_community_data(communities, community_id, community_data,
+                                            quantile_error)
+            community_id = idea_community_id
+            if problematic_community(community_id):
+                instrumentation.count('problematic_communities_skipped')
+                community_data = None
+            else:
+                community_data = new_community_data(0)
+        if community_data is not None:
+            community_data['01_ideas'] += 1
+            accumulate_idea(community_data, idea, authors, newcomer_window)
+        else:
+            instrumentation.count('problematic_ideas_skipped')
+    if community_data is not None:
+        yield finish_community_data(communities, community_id, community_data, quantile_error)
+
+
 ###
 # Load in a dictionary all the ideas, comments, and votes
 # grouped by community. The goal is to facilitate the posterior
@@ -420,139 +987,260 @@ def get_dict(keys, values):
         raise Exception('Dimension miss match')
 
 
-def build_dataset(fname_ideas, fname_comments, fname_orphan_comments, fname_votes):
-    community_ideas, total_dict = [], {}
+def next_row(reader):
+    try:
+        return next(reader)
+    except StopIteration:
+        return None
+
+
+def count_rows(fname):
+    with open(fname, 'rb') as csv_file:
+        return sum(1 for _ in csv.reader(csv_file, delimiter=','))
+
+
+###
+# Attach a comment to the idea together with the
+# replies that were held back waiting for it. Replies
+# are indexed by the id of their parent, so replies
+# at any depth are attached right after their parent
+###
+def attach_comment(new_comment, idea_comments, comment_ids, hold_replies):
+    pending = [new_comment]
+
+    while pending:
+        comment = pending.pop()
+        idea_comments.append(comment)
+        comment_ids.add(comment.id)
+        replies = hold_replies.pop(comment.id, None)
+        if replies:
+            pending.extend(reversed(replies))
+
+
+def report_unresolved_replies(community_id, hold_replies):
+    num_unresolved = sum(len(replies) for replies in hold_replies.itervalues())
+    if num_unresolved > 0:
+        print('Community {} has {} replies whose parent couldn\'t be found'.
+              format(community_id, num_unresolved))
+
+
+def track_progress(ideas, total_ideas):
+    progress = instrumentation.Progress(total_ideas)
+    idx_ideas = 0
+    for idea in ideas:
+        idx_ideas += 1
+        progress.update(idx_ideas)
+        yield idea
+
 
-    with open(fname_ideas, 'rb') as csv_ideas:
+###
+# Validate and stream the data set in one pass
+#
+# The three files are sorted in the same order (by
+# community and idea, see external_sort), so a single
+# forward pass over each of them, a merge-join on the
+# idea id, is enough to assemble every idea with its
+# comments and votes. Orphan comments are found while
+# scanning: comments placed to ideas that aren't in their
+# community and replies whose chain of parents doesn't
+# end in a comment to an idea of their community. Replies
+# are attached at any depth. Orphans are added to the
+# report of the checker (see
+# data_correctness_checker.save_report). In the order of
+# external_sort, replies come before the comments to
+# ideas of their community.
+#
+# Memory is bounded by the idea being assembled plus the
+# replies held back in its community, not by a single
+# idea. Replies only carry the id of their parent, the
+# idea they belong to is known once their chain of
+# parents reaches a comment to an idea, so sorting them
+# by idea would need the same map of parents of the
+# community. Held back replies are freed idea by idea, as
+# their threads are attached, so the bound is the replies
+# of the largest community, never the whole export.
+###
+def new_community_check(community_id):
+    return {'community': community_id, 'error_ids': [], 'replies': [],
+            'top_comment_ids': set(), 'hold_replies': {}}
+
+
+def check_comment(line_comment, comment, check, idea_comments, comment_ids):
+    if line_comment[7] == 'idea':
+        check['top_comment_ids'].add(line_comment[0])
+        if idea_comments is None:
+            # the idea isn't in the community
+            check['error_ids'].append(line_comment[0])
+            return
+        attach_comment(comment, idea_comments, comment_ids, check['hold_replies'])
+    else:
+        check['replies'].append((line_comment[0], line_comment[8]))
+        if line_comment[8] in comment_ids:
+            attach_comment(comment, idea_comments, comment_ids, check['hold_replies'])
+        else:
+            check['hold_replies'].setdefault(line_comment[8], []).append(comment)
+
+
+def finish_community_check(check, report):
+    orphaned_ids = data_correctness_checker.orphaned_replies(check['replies'],
+                                                             check['top_comment_ids'])
+    error_ids = check['error_ids'] + [reply_id for reply_id, _ in check['replies']
+                                      if reply_id in orphaned_ids]
+    if len(error_ids) > 0:
+        report['errors'] += len(error_ids)
+        report['communities'].append({'community': check['community'],
+                                      'errors': len(error_ids), 'ids': error_ids})
+    # replies whose chain of parents ends in a comment placed
+    # to an idea that couldn't be found
+    report_unresolved_replies(check['community'],
+                              dict((parent_id, replies) for parent_id, replies
+                                   in check['hold_replies'].iteritems()
+                                   if not any(reply.id in orphaned_ids for reply in replies)))
+
+
+def iter_checked_dataset(fname_ideas, fname_comments, fname_votes, report):
+    key = external_sort.natural_key
+
+    with open(fname_ideas, 'rb') as csv_ideas, \
+         open(fname_comments, 'rb') as csv_comments, \
+         open(fname_votes, 'rb') as csv_votes:
         reader_ideas = csv.reader(csv_ideas, delimiter=',')
-        list_ideas = list(reader_ideas)
-        total_ideas = len(list_ideas)
-        header_ideas = list_ideas[0]
-        community_id = list_ideas[1][12]
-        with open(fname_comments, 'rb') as csv_comments:
-            reader_comments = csv.reader(csv_comments, delimiter=',')
-            list_comments = list(reader_comments)
-            total_comments = len(list_comments)
-            comment_pointer = 1  # skip the first line since it contains header info
-            orphan_comments = list(open(fname_orphan_comments))
-            orphan_comments = [line.rstrip() for line in orphan_comments]  # Take out newline character
-            header_comments = list_comments[0]
-            hold_replies = []
-            with open(fname_votes, 'rb') as csv_votes:
-                reader_votes = csv.reader(csv_votes, delimiter=',')
-                list_votes = list(reader_votes)
-                total_votes = len(list_votes)
-                vote_pointer = 2
-                header_votes = list_votes[1]
-                print('Be patient, we are processing {} ideas, {} comments, and {} votes'.
-                      format(total_ideas, total_comments, total_votes))
-                for idx_ideas in range(1, total_ideas):
-                    print_progress_bar(idx_ideas, total_ideas, prefix='Progress',
-                                       suffix='Completed', bar_length=50)
-                    line_idea = list_ideas[idx_ideas]
-                    try:
-                        if line_idea[12] != community_id:
-                            # Save ideas when community change
-                            total_dict[community_id] = community_ideas
-                            community_id = line_idea[12]
-                            community_ideas = []
-                        # Collect ideas related to the community
-                        dict_idea = get_dict(header_ideas, line_idea)
-                        idea_id = line_idea[0]
-                        idea_comments, comment_ids = [], []
-                        # Collect comments related to the idea
-                        for idx_comment in range(comment_pointer, total_comments):
-                            line_comment = list_comments[idx_comment]
-                            if line_comment[0] in orphan_comments:
-                                # Ignore orphan comments (comments whose parent (ideas/comment)
-                                # are not in the data set)
-                                continue
-                            else:
-                                if line_comment[7] == 'idea':
-                                    if line_comment[8] != idea_id:
-                                        # Exit the loop when there no more comments to the idea
-                                        comment_pointer = idx_comment
-                                        break
-                                    dict_comment = get_dict(header_comments, line_comment)
-                                    idea_comments.append(dict_comment)
-                                    comment_ids.append(line_comment[0])
-                                    # save held back replies if parent appears
-                                    for hold_reply in list(hold_replies):
-                                        if hold_reply['parent_id'] == line_comment[0]:
-                                            idea_comments.append(hold_reply)
-                                            hold_replies.remove(hold_reply)
-                                else:
-                                    # find whether the parent comment is a comment to this idea
-                                    # if yes, save the reply, if not hold back
-                                    parent_comment_id = line_comment[8]
-                                    # see if parent was already stored in the array
-                                    dict_comment = get_dict(header_comments, line_comment)
-                                    if parent_comment_id in comment_ids:
-                                        idea_comments.append(dict_comment)
-                                    else:
-                                        hold_replies.append(dict_comment)
-                        dict_idea.update({'comments_array': idea_comments})
-                        idea_votes = []
-                        for idx_vote in range(vote_pointer, total_votes):
-                            line_vote = list_votes[idx_vote]
-                            if line_vote[2] != idea_id:
-                                # Exist the loop when finding votes no related to the idea
-                                vote_pointer = idx_vote
-                                break
-                            dict_vote = get_dict(header_votes, line_vote)
-                            idea_votes.append(dict_vote)
-                        dict_idea.update({'votes_array': idea_votes})
-                        community_ideas.append(dict_idea)
-                    except Exception as e:
-                        print(e.message)
-                        break
-                if len(community_ideas) > 0:
-                    total_dict[community_id] = community_ideas
-                csv_votes.close()
-            csv_comments.close()
-        csv_ideas.close()
-
-    return total_dict
-
-
-# Print text-based progress bar
-# Author: Greenstick
-# Taken from
-# http://stackoverflow.com/questions/3173320/text-progress-bar-in-the-console
-def print_progress_bar(iteration, total, prefix='', suffix='',
-                       decimals=2, bar_length=100):
-    """
-    @params:
-        iteration   - Required  : current iteration (Int)
-        total       - Required  : total iterations (Int)
-        prefix      - Optional  : prefix string (Str)
-        suffix      - Optional  : suffix string (Str)
-    """
-    filled_length = int(round(bar_length * iteration / float(total)))
-    percents = round(100.00 * (iteration / float(total)), decimals)
-    bar = '#' * filled_length + '-' * (bar_length- filled_length)
-    sys.stdout.write('%s [%s] %s%s %s\r' % (prefix, bar, percents, '%', suffix)),
-    sys.stdout.flush()
-    if iteration == total:
-        print("\n")
+        reader_comments = csv.reader(csv_comments, delimiter=',')
+        reader_votes = csv.reader(csv_votes, delimiter=',')
+        header_ideas = next(reader_ideas)
+        header_comments = next(reader_comments)
+        next(reader_votes)  # the header of the votes file is in the second line
+        header_votes = next(reader_votes)
+        idea_reader = records.RowReader(header_ideas, to_epoch)
+        comment_reader = records.RowReader(header_comments, to_epoch)
+        vote_reader = records.RowReader(header_votes, to_epoch)
+        line_idea = next_row(reader_ideas)
+        line_comment = next_row(reader_comments)
+        line_vote = next_row(reader_votes)
+        while line_idea is not None or line_comment is not None:
+            # communities may have ideas, comments or both
+            if line_comment is None or \
+               (line_idea is not None and key(line_idea[12]) <= key(line_comment[9])):
+                community_id = line_idea[12]
+            else:
+                community_id = line_comment[9]
+            check = new_community_check(community_id)
+            while line_idea is not None and line_idea[12] == community_id:
+                idea = idea_reader.read(line_idea)
+                idea_id = line_idea[0]
+                idea_comments, comment_ids = idea.comments_array, set()
+                while line_comment is not None and line_comment[9] == community_id:
+                    if line_comment[7] == 'idea' and line_comment[8] != idea_id:
+                        if key(line_comment[8]) > key(idea_id):
+                            # comments to the next ideas
+                            break
+                        check_comment(line_comment, None, check, None, None)
+                    else:
+                        check_comment(line_comment, comment_reader.read(line_comment), check,
+                                      idea_comments, comment_ids)
+                    report['comments'] += 1
+                    line_comment = next_row(reader_comments)
+                while line_vote is not None and line_vote[2] == idea_id:
+                    idea.votes_array.append(vote_reader.read(line_vote))
+                    line_vote = next_row(reader_votes)
+                yield community_id, idea
+                line_idea = next_row(reader_ideas)
+            # the ideas of the comments left weren't found
+            while line_comment is not None and line_comment[9] == community_id:
+                check_comment(line_comment, None, check, None, set())
+                report['comments'] += 1
+                line_comment = next_row(reader_comments)
+            finish_community_check(check, report)
+
+
+def stream_checked_dataset(fname_ideas, fname_comments, fname_votes, report):
+    total_ideas = count_rows(fname_ideas)
+    print('Be patient, we are processing {} ideas'.format(total_ideas - 1))
+    return track_progress(iter_checked_dataset(fname_ideas, fname_comments, fname_votes,
+                                               report), total_ideas - 1)
+
+
+###
+# Cached files
+#
+# The data set, the authors, the data collected for
+# metrics and the metrics are cached between runs (see
+# cache_manifest). Each one is listed with its inputs,
+# the version of the code that builds it (bump it when
+# the code changes its content) and the cached files it
+# is built from. A cached file is rebuilt when any of
+# them, or the options used to build it, changed.
+###
+DATASET = 'data/dataset'
+AUTHORS = 'data/authors'
+METRIC_DATA = 'data/metric_data.json'
+COMMUNITY_METRICS = 'data/community_metrics.json'
+CACHED_FILES = {
+    DATASET: (['data/idsc_ideas_no_text_last.csv', 'data/idsc_comments_no_text_last.csv',
+               'data/idsc_votes_last.csv'], 5, []),
+    AUTHORS: (['data/idsc_authors_reloaded.csv', 'data/idsc_authors_reloaded2.csv'], 2, []),
+    METRIC_DATA: (['data/idsc_communities.csv'], 2, [DATASET, AUTHORS]),
+    COMMUNITY_METRICS: (['data/communities_dataset.csv'], 1, [METRIC_DATA])
+}
+
+
+def cache_config(artifact, options=None):
+    _, _, cached_inputs = CACHED_FILES[artifact]
+    config = dict((cached_input, cache_manifest.recorded_build(cached_input))
+                  for cached_input in cached_inputs)
+    if artifact == METRIC_DATA:
+        config['problematic_communities'] = TESTING_COMMUNITIES + INCOMPLETE_COMMUNITIES + \
+                                            UNAVAILABLE_COMMUNITIES + SPAM_COMMUNITIES
+    config.update(options or {})
+    return config
+
+
+def recorded_options(artifact):
+    # options the artifact was last built with, i.e., its
+    # recorded configuration but the part set by cache_config
+    config = cache_manifest.recorded_config(artifact) or {}
+    derived = cache_config(artifact)
+    return dict((key, value) for key, value in config.iteritems() if key not in derived)
+
+
+def is_cached(artifact, options=None):
+    fnames_in, version, cached_inputs = CACHED_FILES[artifact]
+    # inputs are checked against the options they were built with
+    if not all(is_cached(cached_input, recorded_options(cached_input))
+               for cached_input in cached_inputs):
+        return False
+    return cache_manifest.is_fresh(artifact, fnames_in, version, cache_config(artifact, options))
+
 
+def record_cached(artifact, options=None):
+    fnames_in, version, _ = CACHED_FILES[artifact]
+    return cache_manifest.record(artifact, fnames_in, version, cache_config(artifact, options))
 
+
+###
+# The data set is saved in a columnar format (see
+# dataset_store) and memory-mapped when loaded. It is
+# checked while it is built, so the report of the
+# checker and the orphan comments are saved too
+###
 def load_data():
-    try:
-        with open('data/dataset.json') as json_file:
-            j_data = json.load(json_file)
-            json_file.close()
-            return j_data
-    except Exception as e:
-        dataset = build_dataset('data/idsc_ideas_no_text_last.csv',
-                                'data/idsc_comments_no_text_last.csv',
-                                'data/orphaned_comments.txt',
-                                'data/idsc_votes_last.csv')
-        j_dataset = json.dumps(dataset)
-        with open('data/dataset.json', 'w') as json_file:
-            json_file.write(j_dataset)
-            json_file.close()
-        return dataset
+    if is_cached(DATASET):
+        try:
+            return dataset_store.open_dataset(DATASET)
+        except (IOError, ValueError, KeyError) as e:
+            print('The data set couldn\'t be loaded ({}), rebuilding it...'.format(e))
+    fname_ideas, fname_comments, fname_votes = \
+        external_sort.sort_exports('data/idsc_ideas_no_text_last.csv',
+                                   'data/idsc_comments_no_text_last.csv',
+                                   'data/idsc_votes_last.csv')
+    report = {'comments': 0, 'errors': 0, 'communities': []}
+    dataset_store.write_dataset(stream_checked_dataset(fname_ideas, fname_comments, fname_votes,
+                                                       report),
+                                DATASET)
+    data_correctness_checker.save_report(report['comments'], report['errors'],
+                                         report['communities'])
+    record_cached(DATASET)
+    return dataset_store.open_dataset(DATASET)
 
 
 def load_communities():
@@ -570,83 +1258,68 @@ def load_communities():
     return communities
 
 
-def identify_author_reg_datetime(author):
-    # identify author registration datetime
-    author_len = len(author)
-    idx_registration_dt = -1
-    num_values = []
-    for i in range(0, author_len):
-        try:
-            datetime.datetime.strptime(author[i].split('.')[0], '%Y-%m-%dT%H:%M:%S')
-            idx_registration_dt = i
-        except ValueError:
-            pass
-        try:
-            num_values.append(int(author[i]))  # save all numeric values
-        except ValueError:
-            pass
-    return {'idx_reg_dt': idx_registration_dt, 'numeric_values': num_values}
+###
+# Authors are read into a table (see author_table) saved
+# as arrays. Rows that don't follow the layout of their
+# file are skipped and reported
+###
+def read_authors(fnames):
+    malformed = []
+    authors = author_table.read_table(fnames, to_epoch, malformed)
+    if malformed:
+        print('{} rows of authors are malformed and were skipped, see {}'.
+              format(len(malformed), author_table.REPORT))
+        instrumentation.count('malformed_authors', len(malformed))
+    author_table.save_report(malformed)
+    return authors
 
 
-def load_authors():
-    authors = {}
+def save_authors(authors):
+    authors.save(AUTHORS)
 
-    try:
-        with open('data/authors.json', 'rb') as json_authors:
-            authors = json.load(json_authors)
-    except Exception:
-        with open('data/idsc_authors_reloaded.csv', 'rb') as csv_author1:
-            reader_author1 = csv.reader(csv_author1, delimiter=',')
-            list_author1 = list(reader_author1)
-            total_author1 = len(list_author1)
-            with open('data/idsc_authors_reloaded2.csv', 'rb') as csv_author2:
-                reader_author2 = csv.reader(csv_author2, delimiter=',')
-                list_author2 = list(reader_author2)
-                total_author2 = len(list_author2)
-                for idx in range(2, total_author1):
-                    author = list_author1[idx]
-                    ret = identify_author_reg_datetime(author)
-                    if ret['idx_reg_dt'] != -1:
-                        reg_datetime = author[ret['idx_reg_dt']]
-                    else:
-                        reg_datetime = ''
-                    authors[author[0]] = {'id': author[0], 'registration_datetime': reg_datetime,
-                                          # know that community id will be always located at the end of the array
-                                          'community': ret['numeric_values'][-1], 'admin': author[2],
-                                          'moderator': author[3]}
-                for idx in range(2, total_author2):
-                    author = list_author2[idx]
-                    ret = identify_author_reg_datetime(author)
-                    if ret['idx_reg_dt'] != -1:
-                        reg_datetime = author[ret['idx_reg_dt']]
-                    else:
-                        reg_datetime = ''
-                    authors[author[0]] = {'id': author[0], 'registration_datetime': reg_datetime,
-                                          'community': ret['numeric_values'][-1], 'admin': author[2],
-                                          'moderator': author[3]}
-        j_author = json.dumps(authors)
-        with open('data/authors.json', 'w') as json_file:
-                json_file.write(j_author)
+
+def load_authors():
+    if is_cached(AUTHORS):
+        try:
+            return author_table.load_table(AUTHORS)
+        except (IOError, ValueError) as e:
+            print('Authors couldn\'t be loaded ({}), reading them again...'.format(e))
+    fnames_authors, _, _ = CACHED_FILES[AUTHORS]
+    authors = read_authors(fnames_authors)
+    save_authors(authors)
+    record_cached(AUTHORS)
 
     return authors
 
 
 def save_data_for_metrics(metric_results):
-    j_results = json.dumps(metric_results)
-    with open('data/metric_data.json', 'w') as json_file:
+    # keys are sorted so the file doesn't depend on
+    # the order in which communities were collected
+    j_results = json.dumps(metric_results, sort_keys=True)
+    with cache_manifest.atomic_write(METRIC_DATA) as json_file:
         json_file.write(j_results)
-        json_file.close()
 
 
-def collect_data_for_metrics():
+def metric_data_options(quantile_error=None, newcomer_window=NEWCOMER_WINDOW):
+    # options the data collected for metrics was built with
+    return {'quantile_error': quantile_error, 'newcomer_window': newcomer_window}
+
+
+def collect_data_for_metrics(workers=1, quantile_error=None, newcomer_window=NEWCOMER_WINDOW):
     print('Loading file data...')
     data = load_data()
     communities = load_communities()
     authors = load_authors()
     print('Collecting data for metrics, please wait...')
-    metrics_data = gather_data(communities, authors, data)
+    if workers > 1:
+        metrics_data = gather_data_parallel(communities, authors, data, workers, quantile_error,
+                                            newcomer_window)
+    else:
+        metrics_data = gather_data_columnar(communities, authors, data, quantile_error,
+                                            newcomer_window)
     print('Saving collected data, please wait...')
     save_data_for_metrics(metrics_data)
+    record_cached(METRIC_DATA, metric_data_options(quantile_error, newcomer_window))
 
     return metrics_data
 
@@ -732,6 +1405,33 @@ def productivity(communities_ds, metric_results):
     return metric_results
 
 
+##
+# Median, 90th and 99th percentiles of response times
+# (hours), taken from their records or, when the data
+# was collected with quantile sketches, from the sketch
+##
+RESPONSE_TIME_QUANTILES = [0.5, 0.9, 0.99]
+
+
+def response_time_quantiles(community_data, metric_id, field):
+    if metric_id + '_sketch' in community_data:
+        sketch = quantile_sketch.from_dict(community_data[metric_id + '_sketch'])
+        if not sketch.is_exact():
+            return sketch.quantiles(RESPONSE_TIME_QUANTILES)
+        response_times = sketch.values()
+    else:
+        response_times = [int(record[field]) for record in community_data[metric_id]]
+    if len(response_times) == 0:
+        return [numpy.median(response_times), numpy.nan, numpy.nan]
+    return [numpy.median(response_times)] + \
+        numpy.percentile(response_times, [100 * q for q in RESPONSE_TIME_QUANTILES[1:]]).tolist()
+
+
+def set_response_times(metrics, name, quantiles):
+    metrics[name + '_median_response_time_hours'], metrics[name + '_p90_response_time_hours'], \
+        metrics[name + '_p99_response_time_hours'] = quantiles
+
+
 ##
 # Computer metrics 4)-13)
 ##
@@ -798,28 +1498,25 @@ def community_responsiveness(community_data):
 
     # metric 12) avg. response time to ideas
     if ratio_unhealthy_ideas <= 0.05 and int(community_data['03_attended_ideas']) > 0:
-        rt_ideas = []
-        for idea in community_data['15_response_times_ideas']:
-            rt_ideas.append(int(idea['response_time_hour']))
-        media_rt = numpy.median(rt_ideas)
-        community_res_metrics['ideas_median_response_time_hours'] = media_rt
+        set_response_times(community_res_metrics, 'ideas',
+                           response_time_quantiles(community_data, '15_response_times_ideas',
+                                                   'response_time_hour'))
     else:
-        community_res_metrics['ideas_median_response_time_hours'] = -999
+        set_response_times(community_res_metrics, 'ideas', [-999] * 3)
 
     # metric 13) avg. response time to comments
     if int(community_data['16_comments']) > 0 and num_attended_comments > 0:
         ratio_unhealthy_comments = float(community_data['18_problematic_comments'])/\
                                    float(community_data['16_comments'])
         if ratio_unhealthy_comments <= 0.05:
-            rt_comments = []
-            for comment in community_data['27_response_times_comments']:
-                rt_comments.append(int(comment['response_time_hours']))
-            media_rt = numpy.median(rt_comments)
-            community_res_metrics['comments_median_response_time_hours'] = media_rt
+            set_response_times(community_res_metrics, 'comments',
+                               response_time_quantiles(community_data,
+                                                       '27_response_times_comments',
+                                                       'response_time_hours'))
         else:
-            community_res_metrics['comments_median_response_time_hours'] = -999
+            set_response_times(community_res_metrics, 'comments', [-999] * 3)
     else:
-        community_res_metrics['comments_median_response_time_hours'] = -999
+        set_response_times(community_res_metrics, 'comments', [-999] * 3)
 
     return community_res_metrics
 
@@ -863,13 +1560,17 @@ def newcomers_treatment(community_data):
     ratio_unhealthy_ideas = float(num_unhealthy_ideas)/float(community_data['01_ideas'])
     if ratio_unhealthy_ideas <= 0.05:
         num_first_feedback_comments, num_first_feedback_votes = 0, 0
-        feedback_rt = []
-        for feedback in community_data['31_array_attended_newcomer_ideas']:
-            if feedback['type_first_feedback'] == 'vote':
-                num_first_feedback_votes += 1
-            else:
-                num_first_feedback_comments += 1
-            feedback_rt.append(int(feedback['response_time_first_feedback_hours']))
+        if '31_array_attended_newcomer_ideas_sketch' in community_data:
+            num_first_feedback_votes = int(community_data['33_newcomer_ideas_first_feedback_vote'])
+            num_first_feedback_comments = \
+                community_data['31_array_attended_newcomer_ideas_sketch']['count'] - \
+                num_first_feedback_votes
+        else:
+            for feedback in community_data['31_array_attended_newcomer_ideas']:
+                if feedback['type_first_feedback'] == 'vote':
+                    num_first_feedback_votes += 1
+                else:
+                    num_first_feedback_comments += 1
         if int(community_nc_metrics['attended_newcomer_ideas']) > 0:
             # metric: 18) ratio of voting as first feedback to newcomers' ideas
             community_nc_metrics['vote_first_feedback_newcomer_ideas'] = \
@@ -878,16 +1579,18 @@ def newcomers_treatment(community_data):
             community_nc_metrics['comment_first_feedback_newcomer_ideas'] = \
             float(num_first_feedback_comments)/float(community_data['30_attended_newcomer_ideas'])
             # metric: 20) avg. response time to newcomer ideas
-            media_rt = numpy.median(feedback_rt)
-            community_nc_metrics['newcomer_ideas_median_response_time_hours'] = media_rt
+            set_response_times(community_nc_metrics, 'newcomer_ideas',
+                               response_time_quantiles(community_data,
+                                                       '31_array_attended_newcomer_ideas',
+                                                       'response_time_first_feedback_hours'))
         else:
             community_nc_metrics['vote_first_feedback_newcomer_ideas'] = 0
             community_nc_metrics['comment_first_feedback_newcomer_ideas'] = 0
-            community_nc_metrics['newcomer_ideas_median_response_time_hours'] = -999
+            set_response_times(community_nc_metrics, 'newcomer_ideas', [-999] * 3)
     else:
         community_nc_metrics['vote_first_feedback_newcomer_ideas'] = 0
         community_nc_metrics['comment_first_feedback_newcomer_ideas'] = 0
-        community_nc_metrics['newcomer_ideas_median_response_time_hours'] = -999
+        set_response_times(community_nc_metrics, 'newcomer_ideas', [-999] * 3)
 
     return community_nc_metrics
 
@@ -938,17 +1641,27 @@ def moderator_interventions(communities_ds, metric_results):
     return metric_results
 
 
-def compute_metrics():
+def update_community_metrics(community_metrics, community_id, community_data):
+    # compute responsiveness metrics
+    community_metrics[community_id].update(community_responsiveness(community_data))
+    # compute content quality
+    community_metrics[community_id].update(content_quality(community_data))
+    # compute newcomer treatment
+    community_metrics[community_id].update(newcomers_treatment(community_data))
+
+
+def compute_metrics(workers=1, quantile_error=None, newcomer_window=NEWCOMER_WINDOW):
     print('Computing metrics, please wait...')
     # load data collected previously to compute metrics
-    try:
-        with open('data/metric_data.json', 'rb') as json_m_data:
-            m_data = json.load(json_m_data)
-    except IOError as e:
-        m_data = collect_data_for_metrics()
-    except Exception as e:
-        print e
-        return
+    m_data = None
+    if is_cached(METRIC_DATA, metric_data_options(quantile_error, newcomer_window)):
+        try:
+            with open(METRIC_DATA, 'rb') as json_m_data:
+                m_data = json.load(json_m_data)
+        except (IOError, ValueError) as e:
+            print('Collected data couldn\'t be loaded ({}), collecting it again...'.format(e))
+    if m_data is None:
+        m_data = collect_data_for_metrics(workers, quantile_error, newcomer_window)
     # load data about community interventions
     with open('data/communities_dataset.csv', 'rb') as csv_communities:
         overall_communities = csv.reader(csv_communities, delimiter=',')
@@ -959,20 +1672,66 @@ def compute_metrics():
         # compute intervention metrics
         community_metrics = moderator_interventions(communities, community_metrics)
         for community_id, community_data in m_data.iteritems():
-            if community_id == '33443':
-                pass
-            # compute responsiveness metrics
-            community_metrics[community_id].update(community_responsiveness(community_data))
-            # compute content quality
-            community_metrics[community_id].update(content_quality(community_data))
-            # compute newcomer treatment
-            community_metrics[community_id].update(newcomers_treatment(community_data))
+            update_community_metrics(community_metrics, community_id, community_data)
+
+    return community_metrics
+
+
+###
+# Compute the metrics in one pass over the exports
+# (see stream_metric_data). The data set isn't built
+# and the data collected for metrics is saved only if
+# asked, the cached files aren't used nor updated
+###
+def compute_metrics_streaming(quantile_error=None, save_data=False,
+                              newcomer_window=NEWCOMER_WINDOW):
+    print('Computing metrics in streaming mode, please wait...')
+    communities = load_communities()
+    authors = load_authors()
+    fname_ideas, fname_comments, fname_votes = \
+        external_sort.sort_exports(*CACHED_FILES[DATASET][0])
+    with open('data/communities_dataset.csv', 'rb') as csv_communities:
+        communities_ds = list(csv.reader(csv_communities, delimiter=','))
+    community_metrics = productivity(communities_ds, {})
+    community_metrics = moderator_interventions(communities_ds, community_metrics)
+    report = {'comments': 0, 'errors': 0, 'communities': []}
+    ideas = stream_checked_dataset(fname_ideas, fname_comments, fname_votes, report)
+    m_data = {}
+    for community_id, community_data in stream_metric_data(communities, authors, ideas,
+                                                           quantile_error, newcomer_window):
+        update_community_metrics(community_metrics, community_id, community_data)
+        if save_data:
+            m_data[community_id] = community_data
+    data_correctness_checker.save_report(report['comments'], report['errors'],
+                                         report['communities'])
+    if save_data:
+        print('Saving collected data, please wait...')
+        save_data_for_metrics(m_data)
+        # not built from the cached data set
+        cache_manifest.forget(METRIC_DATA)
 
     return community_metrics
 
 
-def save_metric_results(community_metrics):
+PERCENTILE_COLUMNS = [('p90_response_time_ideas_hs', 'ideas_p90_response_time_hours'),
+                      ('p99_response_time_ideas_hs', 'ideas_p99_response_time_hours'),
+                      ('p90_response_time_comments_hs', 'comments_p90_response_time_hours'),
+                      ('p99_response_time_comments_hs', 'comments_p99_response_time_hours'),
+                      ('p90_response_time_newcomer_ideas_hs',
+                       'newcomer_ideas_p90_response_time_hours'),
+                      ('p99_response_time_newcomer_ideas_hs',
+                       'newcomer_ideas_p99_response_time_hours')]
+
+
+def save_metric_results(community_metrics, cache=True, percentiles=False):
     print('Saving metric results, please wait...')
+    # keep the metrics to update them later (see incremental_update)
+    with cache_manifest.atomic_write(COMMUNITY_METRICS) as json_file:
+        json.dump(community_metrics, json_file, sort_keys=True)
+    if cache:
+        record_cached(COMMUNITY_METRICS)
+    else:
+        cache_manifest.forget(COMMUNITY_METRICS)
     with open('data/community_metrics.csv', 'w') as csv_output:
         output = csv.writer(csv_output, delimiter=',')
         header = ['community_id', 'ideas_by_members', 'comments_by_members', 'votes_by_members',
@@ -988,6 +1747,9 @@ def save_metric_results(community_metrics):
                   'moderator_comments_by_comments', 'moderator_votes_by_votes', 'moderators_by_members',
                   'moderator_ideas_by_interventions', 'moderator_comments_by_interventions',
                   'moderator_votes_by_interventions', 'contributors_by_members']
+        if percentiles:
+            # 90th and 99th percentiles of response times are only output when asked
+            header += [column for column, _ in PERCENTILE_COLUMNS]
         output.writerow(header)
         for community_id, community_data in community_metrics.iteritems():
             row = [community_id, community_data['ideas_by_members'], community_data['comments_by_members'],
@@ -1008,26 +1770,170 @@ def save_metric_results(community_metrics):
                    community_data['ratio_moderators'], community_data['ratio_type_inter_ideas'],
                    community_data['ratio_type_inter_comments'], community_data['ratio_type_inter_votes'],
                    community_data['contributors_by_members']]
+            if percentiles:
+                row += [community_data[metric] for _, metric in PERCENTILE_COLUMNS]
             output.writerow(row)
 
 
-def is_author_admin_or_mod(authors, author_id):
-    author = authors.get(author_id)
-    if author:
-        if author['admin'] == 'True' or \
-           author['moderator'] == 'True':
-            return True
-        else:
-            return False
+###
+# Metrics of newcomers' ideas (16-20) of every community
+# with each of the given newcomer windows, collected in
+# one pass over the data set (see gather_data_windows).
+# The data collected for metrics isn't cached
+###
+def sweep_newcomer_windows(newcomer_windows, workers=1, quantile_error=None):
+    print('Loading file data...')
+    data = load_data()
+    communities = load_communities()
+    authors = load_authors()
+    print('Collecting data for {} newcomer windows, please wait...'.format(len(newcomer_windows)))
+    if workers > 1:
+        windows_data = gather_data_windows_parallel(communities, authors, data, workers,
+                                                    quantile_error, newcomer_windows)
     else:
-        return False
+        windows_data = gather_data_windows(communities, authors, data, quantile_error,
+                                           newcomer_windows)
+    print('Saving newcomer metrics, please wait...')
+    with open('data/newcomer_window_sweep.csv', 'w') as csv_output:
+        output = csv.writer(csv_output, delimiter=',')
+        header = ['community_id', 'newcomer_window_days', 'newcomer_ideas_by_ideas',
+                  'attended_newcomer_ideas_by_newcomer_ideas',
+                  'newcomer_ideas_attended_firstly_by_vote_by_newcomer_ideas',
+                  'newcomer_ideas_attended_firstly_by_comment_by_newcomer_ideas',
+                  'median_response_time_newcomer_ideas_hs', 'p90_response_time_newcomer_ideas_hs',
+                  'p99_response_time_newcomer_ideas_hs']
+        output.writerow(header)
+        for community_id in sorted(windows_data[newcomer_windows[0]],
+                                   key=external_sort.natural_key):
+            for window in newcomer_windows:
+                community_data = newcomers_treatment(windows_data[window][community_id])
+                row = [community_id, window, community_data['newcomer_ideas'],
+                       community_data['attended_newcomer_ideas'],
+                       community_data['vote_first_feedback_newcomer_ideas'],
+                       community_data['comment_first_feedback_newcomer_ideas'],
+                       community_data['newcomer_ideas_median_response_time_hours'],
+                       community_data['newcomer_ideas_p90_response_time_hours'],
+                       community_data['newcomer_ideas_p99_response_time_hours']]
+                output.writerow(row)
+
+    return windows_data
 
 
-def compute_influence_mod_intervention():
+###
+# Interventions of moderators
+#
+# For every idea whose comments and votes are all in the
+# data set, count the comments and votes of moderators
+# (admins included), of the author of the idea and of the
+# rest of the participants. Counters are computed for all
+# the ideas at once on the codes of the authors (see
+# dataset_store): a map, by code, of the authors that are
+# moderators is built once, interventions are added up by
+# idea with bincount and distinct participants are counted
+# from the unique (idea, author) pairs. Comments of
+# moderators count as interventions even when they are
+# the authors of the idea, votes of the author of the idea
+# count as votes of the author
+##
+def moderator_map(authors, data):
+    # admins and moderators by code of the authors of the data set
+    return authors.admins_or_mods(data.id_table('authors'))
+
+
+def distinct_by(groups, values, num_groups):
+    # number of distinct values by group
+    if len(values) == 0:
+        return numpy.zeros(num_groups, dtype=numpy.int64)
+    width = int(values.max()) + 1
+    pairs = numpy.unique(groups * width + values)
+    return numpy.bincount(pairs // width, minlength=num_groups)
+
+
+def intervention_counts(data, moderators):
+    comment_offsets = numpy.asarray(data.array('comment_offsets'))
+    vote_offsets = numpy.asarray(data.array('vote_offsets'))
+    num_ideas = len(comment_offsets) - 1
+    idea_comments = numpy.diff(comment_offsets)
+    idea_votes = numpy.diff(vote_offsets)
+    comments = numpy.asarray(data.column('ideas', 'comments'), dtype=numpy.int64)
+    up_votes = numpy.asarray(data.column('ideas', 'up_votes'), dtype=numpy.int64)
+    down_votes = numpy.asarray(data.column('ideas', 'down_votes'), dtype=numpy.int64)
+    idea_author = numpy.asarray(data.column('ideas', 'author_id'), dtype=numpy.int64)
+    comment_idea = numpy.repeat(numpy.arange(num_ideas), idea_comments)
+    vote_idea = numpy.repeat(numpy.arange(num_ideas), idea_votes)
+    comment_author = numpy.asarray(data.column('comments', 'author_id'), dtype=numpy.int64) \
+        if len(comment_idea) > 0 else numpy.zeros(0, dtype=numpy.int64)
+    vote_author = numpy.asarray(data.column('votes', 'author'), dtype=numpy.int64) \
+        if len(vote_idea) > 0 else numpy.zeros(0, dtype=numpy.int64)
+
+    comment_mod = moderators[comment_author]
+    comment_own = comment_author == idea_author[comment_idea]
+    comment_part = ~comment_mod & ~comment_own
+    vote_own = vote_author == idea_author[vote_idea]
+    vote_mod = ~vote_own & moderators[vote_author]
+    vote_part = ~vote_own & ~vote_mod
+    votes = up_votes + down_votes
+    return {'complete': (idea_comments == comments) & (idea_votes == votes),
+            'comments': comments, 'votes': votes, 'score': up_votes - down_votes,
+            'mod_comments': count_by(comment_mod, comment_idea, num_ideas),
+            'mod_votes': count_by(vote_mod, vote_idea, num_ideas),
+            'distinct_comment_authors': distinct_by(comment_idea[comment_part],
+                                                    comment_author[comment_part], num_ideas),
+            'author_admin': moderators[idea_author],
+            'author_comments': count_by(~comment_mod & comment_own, comment_idea, num_ideas),
+            'author_votes': count_by(vote_own, vote_idea, num_ideas),
+            'participants': distinct_by(numpy.concatenate((comment_idea[comment_part],
+                                                           vote_idea[vote_part])),
+                                        numpy.concatenate((comment_author[comment_part],
+                                                           vote_author[vote_part])), num_ideas)}
+
+
+INTERVENTION_COUNTS = ['comments', 'votes', 'score', 'mod_comments', 'mod_votes',
+                       'distinct_comment_authors', 'author_admin', 'author_comments',
+                       'author_votes', 'participants']
+
+
+def intervention_counts_chunk(bounds):
+    return intervention_counts(shared_state['data'].slice(*bounds), shared_state['moderators'])
+
+
+def intervention_counts_parallel(data, moderators, workers):
+    # counters of the chunks follow the order of the ideas
+    shared_state.update({'data': data, 'moderators': moderators})
+    chunks = split_blocks(data, workers * 4)
+    progress = instrumentation.Progress(len(chunks))
+    chunk_counts = []
+    pool = multiprocessing.Pool(processes=workers)
+    try:
+        for chunk_idx, counts in enumerate(pool.imap(intervention_counts_chunk, chunks)):
+            progress.update(chunk_idx + 1)
+            chunk_counts.append(counts)
+    finally:
+        pool.close()
+        pool.join()
+        shared_state.clear()
+    return dict((name, numpy.concatenate([counts[name] for counts in chunk_counts]))
+                for name in chunk_counts[0])
+
+
+def mod_intervention_rows(community_id, community_users, data, counts):
+    start, end = data.idea_range(community_id)
+    positions = start + numpy.flatnonzero(counts['complete'][start:end])
+    columns = [data.decode('ideas', 'id', data.column('ideas', 'id')[positions])]
+    columns += [counts[name][positions].tolist() for name in INTERVENTION_COUNTS]
+    return [[community_id, community_users] + list(values) for values in zip(*columns)]
+
+
+def compute_influence_mod_intervention(workers=1):
     data = load_data()
     authors = load_authors()
+    moderators = moderator_map(authors, data)
+    if workers > 1 and len(data.communities) > 0:
+        counts = intervention_counts_parallel(data, moderators, workers)
+    else:
+        counts = intervention_counts(data, moderators)
     community_counter = 0
-    tot_communities = len(data)
+    progress = instrumentation.Progress(len(data))
     with open('data/community_mod_intervention_details.csv', 'w') as csv_output:
         output = csv.writer(csv_output, delimiter=',')
         header = ['community_id', 'users', 'idea_id', 'comments','votes', 'score',
@@ -1038,62 +1944,97 @@ def compute_influence_mod_intervention():
             overall_communities = csv.reader(csv_communities, delimiter=',')
             for community in overall_communities:
                 community_counter += 1
-                print_progress_bar(community_counter, tot_communities, prefix='Progress',
-                                   suffix='Completed', bar_length=50)
+                progress.update(community_counter)
                 if community[0] == 'id': continue
                 community_id = community[0]
                 community_users = int(community[8])
-                if problematic_community(community_id): continue
-                c_ideas = data.get(community_id)
-                if not c_ideas: continue
-                for idea in c_ideas:
-                    comments = int(idea['comments'])
-                    if len(idea['comments_array']) != comments:
-                        # consider only cases where all comments
-                        # are in the data set
-                        continue
-                    votes = int(idea['up_votes']) + int(idea['down_votes'])
-                    score = int(idea['up_votes']) - int(idea['down_votes'])
-                    if len(idea['votes_array']) != votes:
-                        # consider only cases where all votes
-                        # are in the data set
-                        continue
-                    is_admin = is_author_admin_or_mod(authors, idea['author_id'])
-                    author_comments = 0
-                    author_votes = 0
-                    mod_comments = 0
-                    mod_votes = 0
-                    participants = []
-                    for comment in idea['comments_array']:
-                        if is_author_admin_or_mod(authors, comment['author_id']):
-                            mod_comments += 1
-                        else:
-                            if comment['author_id'] == idea['author_id']:
-                                author_comments += 1
-                            else:
-                                # If it isn't moderator or author, then
-                                # it is participants
-                                try:
-                                    participants.index(comment['author_id'])
-                                except ValueError:
-                                    participants.append(comment['author_id'])
-                    distinct_author_comments = len(participants)
-                    for vote in idea['votes_array']:
-                        if vote['author'] == idea['author_id']:
-                            author_votes += 1
-                        else:
-                            if is_author_admin_or_mod(authors, vote['author']):
-                                mod_votes += 1
-                            else:
-                                try:
-                                    participants.index(vote['author'])
-                                except ValueError:
-                                    participants.append(vote['author'])
-                    num_participants = len(participants)
-                    row = [community_id, community_users, idea['id'], comments, votes, score,
-                           mod_comments, mod_votes, distinct_author_comments, is_admin,
-                           author_comments, author_votes, num_participants]
-                    output.writerow(row)
+                if problematic_community(community_id):
+                    instrumentation.count('problematic_communities_skipped')
+                    continue
+                if community_id not in data: continue
+                output.writerows(mod_intervention_rows(community_id, community_users, data,
+                                                       counts))
+
+
+###
+# Participation by role
+#
+# Authors are ideators, voters and/or commenters of a
+# community. Their roles are kept as a mask of bits by
+# (community, author code) pair, built for all the
+# communities at once: pairs are sorted once and the
+# bits of each pair or-ed together. Counting the pairs
+# of every community by mask gives, with sums of a few
+# columns, the size of every role and of their
+# intersections and differences. Top ideators are found
+# with a partial selection of the ideas by ideator
+##
+IDEATOR, VOTER, COMMENTER = 1, 2, 4
+ROLE_MASKS = 8
+
+
+ROLE_COLUMNS = {IDEATOR: ('ideas', 'author_id'), VOTER: ('votes', 'author'),
+                COMMENTER: ('comments', 'author_id')}
+
+
+def role_keys(data, role):
+    # block * number of authors + author code, by row of the
+    # ideas, votes or comments of the role
+    num_authors = max(len(data.id_table('authors')), 1)
+    community_offsets = numpy.asarray(data.array('community_offsets'))
+    blocks = numpy.repeat(numpy.arange(len(data.communities)), numpy.diff(community_offsets))
+    if role != IDEATOR:
+        offsets = 'vote_offsets' if role == VOTER else 'comment_offsets'
+        blocks = numpy.repeat(blocks, numpy.diff(data.array(offsets)))
+    return blocks * num_authors + data.column(*ROLE_COLUMNS[role]), num_authors
+
+
+def author_roles(data):
+    # blocks, author codes and masks of roles of the
+    # (community, author) pairs, sorted by block and code
+    keys, num_authors = zip(*[role_keys(data, role) for role in (IDEATOR, VOTER, COMMENTER)])
+    num_authors = num_authors[0]
+    roles = numpy.repeat(numpy.array([IDEATOR, VOTER, COMMENTER], dtype=numpy.int64),
+                         [len(role_rows) for role_rows in keys])
+    keys = numpy.concatenate(keys)
+    if len(keys) == 0:
+        empty = numpy.zeros(0, dtype=numpy.int64)
+        return empty, empty, empty
+    order = numpy.argsort(keys, kind='mergesort')
+    keys = keys[order]
+    starts = numpy.flatnonzero(numpy.concatenate(([True], keys[1:] != keys[:-1])))
+    masks = numpy.bitwise_or.reduceat(roles[order], starts)
+    return keys[starts] // num_authors, keys[starts] % num_authors, masks
+
+
+def participation_roles(data):
+    # number of authors of every community (block) by mask of roles
+    num_blocks = len(data.communities)
+    blocks, _, masks = author_roles(data)
+    return numpy.bincount(blocks * ROLE_MASKS + masks,
+                          minlength=num_blocks * ROLE_MASKS).reshape(num_blocks, ROLE_MASKS)
+
+
+def contributions(data, role):
+    # ideas, votes or comments of every (community, author)
+    # pair of the role, sorted by community and author code,
+    # and where the pairs of every community start
+    keys, num_authors = role_keys(data, role)
+    keys, counts = numpy.unique(keys, return_counts=True)
+    return keys % num_authors, counts, numpy.searchsorted(keys // num_authors,
+                                                          numpy.arange(len(data.communities) + 1))
+
+
+def top_counts(counts, k):
+    # k largest counts, in decreasing order
+    if len(counts) > k:
+        counts = counts[numpy.argpartition(-counts, k - 1)[:k]]
+    return sorted(counts.tolist(), reverse=True)
+
+
+def role_sizes(masks, roles):
+    # authors having all the roles
+    return sum(masks[:, mask] for mask in range(ROLE_MASKS) if mask & roles == roles)
 
 
 def compute_participation_level():
@@ -1106,46 +2047,494 @@ def compute_participation_level():
                   'commenters_voters', 'only_ideators', 'only_voters',
                   'only_commenters', 'top_ideators', 'tot_top_ideators']
         output.writerow(header)
-        with open('data/dataset.json') as json_file:
-            j_data = json.load(json_file)
-            for community_id, ideas in j_data.iteritems():
-                ideators, voters, commenters = Set([]), Set([]), Set([])
-                dict_ideators = {}
-                for idea in ideas:
-                    if idea['author_id'] not in ideators:
-                        ideators.add(idea['author_id'])
-                    if idea['author_id'] not in dict_ideators.keys():
-                        dict_ideators[idea['author_id']] = 1
-                    else:
-                        dict_ideators[idea['author_id']] += 1
-                    for comment in idea['comments_array']:
-                        if comment['author_id'] not in commenters:
-                            commenters.add(comment['author_id'])
-                    for vote in idea['votes_array']:
-                        if vote['author'] not in voters:
-                            voters.add(vote['author'])
-                super_part = len(ideators & voters & commenters)
-                ideators_voters = len(ideators & voters)
-                ideators_commenters = len(ideators & commenters)
-                commenters_voters = len(commenters & voters)
-                only_ideators = len((ideators - voters) - commenters)
-                only_voters = len((voters - ideators) - commenters)
-                only_commenters = len((commenters - ideators)-voters)
-                sorted_ideators = sorted(dict_ideators.values(), reverse=True)
-                if len(dict_ideators) > max_top_ideators:
-                    top_ideators = sorted_ideators[:max_top_ideators]
-                else:
-                    top_ideators = sorted_ideators
-                row = [community_id, len(ideators), len(voters), len(commenters),
-                       super_part, ideators_voters, ideators_commenters,
-                       commenters_voters, only_ideators, only_voters, only_commenters,
-                       "-".join(map(str, top_ideators)), sum(top_ideators)]
-                output.writerow(row)
+        data = load_data()
+        masks = participation_roles(data)
+        columns = numpy.column_stack((role_sizes(masks, IDEATOR), role_sizes(masks, VOTER),
+                                      role_sizes(masks, COMMENTER),
+                                      role_sizes(masks, IDEATOR | VOTER | COMMENTER),
+                                      role_sizes(masks, IDEATOR | VOTER),
+                                      role_sizes(masks, IDEATOR | COMMENTER),
+                                      role_sizes(masks, COMMENTER | VOTER),
+                                      masks[:, IDEATOR], masks[:, VOTER],
+                                      masks[:, COMMENTER])).tolist()
+        _, ideator_ideas, ideator_offsets = contributions(data, IDEATOR)
+        for block, community_id in enumerate(data.communities):
+            if data.community_idx[community_id] != block:
+                continue  # superseded by a later block of the community
+            top_ideators = top_counts(ideator_ideas[ideator_offsets[block]:
+                                                    ideator_offsets[block + 1]],
+                                      max_top_ideators)
+            output.writerow([community_id] + columns[block] +
+                            ["-".join(map(str, top_ideators)), sum(top_ideators)])
+
 
+###
+# Top contributors
+#
+# Authors with the most ideas, votes and comments of
+# every community. Exact counts come from the pairs of
+# (community, author) of the data set (see contributions)
+# and the top ones are found with a partial selection.
+# For communities too large to count every author, or
+# when the exports are streamed, approximate counts are
+# kept in fixed memory by community with heavy-hitter
+# sketches (see heavy_hitters). Their counts are upper
+# bounds, the true count is at most max_error lower
+##
+ROLE_NAMES = [(IDEATOR, 'ideator'), (VOTER, 'voter'), (COMMENTER, 'commenter')]
+
+
+def top_positions(author_ids, counts, k):
+    # positions of the k largest counts, ties broken by author id
+    candidates = numpy.arange(len(counts))
+    if len(counts) > k:
+        kth = numpy.partition(counts, len(counts) - k)[len(counts) - k]
+        candidates = numpy.flatnonzero(counts >= kth)
+    order = numpy.lexsort((author_ids[candidates], -counts[candidates]))
+    return candidates[order[:k]]
+
+
+def exact_top_contributors(data, k):
+    author_ids = data.id_table('authors')
+    role_counts = [(name, contributions(data, role)) for role, name in ROLE_NAMES]
+    for block, community_id in enumerate(data.communities):
+        if data.community_idx[community_id] != block:
+            continue  # superseded by a later block of the community
+        rows = []
+        for name, (codes, counts, offsets) in role_counts:
+            start, end = offsets[block], offsets[block + 1]
+            ids, community_counts = author_ids[codes[start:end]], counts[start:end]
+            positions = top_positions(ids, community_counts, k)
+            top_authors = zip(ids[positions].tolist(), community_counts[positions].tolist())
+            rows.extend([community_id, name, rank + 1, author_id, count, 0]
+                        for rank, (author_id, count) in enumerate(top_authors))
+        yield rows
+
+
+def heavy_hitter_rows(community_id, hitters, k):
+    return [[community_id, name, rank + 1, author_id, count, max_error]
+            for (_, name), role_hitters in zip(ROLE_NAMES, hitters)
+            for rank, (author_id, count, max_error) in enumerate(role_hitters.top(k))]
+
+
+def sketch_top_contributors(ideas, k, error):
+    # ideas are a stream of (community_id, idea) grouped by
+    # community, only the sketches of one community are kept
+    community_id, hitters = None, None
+    for idea_community_id, idea in ideas:
+        if idea_community_id != community_id:
+            if hitters is not None:
+                yield heavy_hitter_rows(community_id, hitters, k)
+            community_id = idea_community_id
+            hitters = [heavy_hitters.HeavyHitters(error) for _ in ROLE_NAMES]
+        ideators, voters, commenters = hitters
+        ideators.update(idea.author_id)
+        for vote in idea.votes_array:
+            voters.update(vote.author)
+        for comment in idea.comments_array:
+            commenters.update(comment.author_id)
+    if hitters is not None:
+        yield heavy_hitter_rows(community_id, hitters, k)
+
+
+def compute_top_contributors(k=5, error=None, stream=False):
+    if error is None:
+        community_rows = exact_top_contributors(load_data(), k)
+    elif stream:
+        fname_ideas, fname_comments, fname_votes = \
+            external_sort.sort_exports(*CACHED_FILES[DATASET][0])
+        report = {'comments': 0, 'errors': 0, 'communities': []}
+        ideas = stream_checked_dataset(fname_ideas, fname_comments, fname_votes, report)
+        community_rows = sketch_top_contributors(ideas, k, error)
+    else:
+        # only the author columns are read
+        ideas = ((community_id, idea) for community_id, community_ideas in
+                 load_data().iteritems(idea_fields=['author_id'], comment_fields=['author_id'],
+                                       vote_fields=['author'])
+                 for idea in community_ideas)
+        community_rows = sketch_top_contributors(ideas, k, error)
+    with open('data/community_top_contributors.csv', 'w') as csv_output:
+        output = csv.writer(csv_output, delimiter=',')
+        header = ['community_id', 'role', 'rank', 'author_id', 'count', 'max_error']
+        output.writerow(header)
+        for rows in community_rows:
+            output.writerows(rows)
+
+
+###
+# Overlap of the members of communities
+#
+# Members of a community are the authors having any role
+# in it (see author_roles). Communities and members are
+# the rows and columns of a sparse incidence matrix M, the
+# product M * M.T gives the number of members shared by
+# every pair of communities, without a dense matrix of
+# communities by authors. The product is computed for a
+# chunk of rows of M at a time, so only the pairs of a
+# chunk are in memory, and only pairs above the
+# thresholds are written, as an edge list
+##
+OVERLAP_CHUNK = 1000  # communities by product
+
+
+def community_members(data):
+    # incidence matrix of the current blocks of communities
+    # by author code, and the ids of its rows
+    blocks, codes, _ = author_roles(data)
+    current = numpy.array([data.community_idx[community_id] == block
+                           for block, community_id in enumerate(data.communities)], dtype=bool)
+    rows = numpy.cumsum(current) - 1
+    member = current[blocks]
+    members = sparse.csr_matrix((numpy.ones(member.sum(), dtype=numpy.int32),
+                                 (rows[blocks[member]], codes[member])),
+                                shape=(int(current.sum()), len(data.id_table('authors'))))
+    return members, [community_id for block, community_id in enumerate(data.communities)
+                     if current[block]]
+
+
+def overlap_edges(members, min_overlap=1, min_jaccard=0.0, chunk=OVERLAP_CHUNK):
+    # pairs (a, b), a < b, of rows sharing at least min_overlap
+    # members and with a jaccard similarity of at least min_jaccard
+    sizes = numpy.asarray(members.sum(axis=1)).ravel()
+    members_t = members.T.tocsr()
+    for start in range(0, members.shape[0], chunk):
+        shared = sparse.triu(members[start:start + chunk] * members_t, k=start + 1).tocoo()
+        rows, cols, overlap = shared.row + start, shared.col, shared.data
+        jaccard = overlap / (sizes[rows] + sizes[cols] - overlap).astype(numpy.float64)
+        keep = (overlap >= min_overlap) & (jaccard >= min_jaccard)
+        rows, cols, overlap, jaccard = rows[keep], cols[keep], overlap[keep], jaccard[keep]
+        order = numpy.lexsort((cols, rows))
+        rows, cols = rows[order], cols[order]
+        yield rows, cols, sizes[rows], sizes[cols], overlap[order], jaccard[order]
+
+
+def compute_community_overlap(min_overlap=1, min_jaccard=0.0):
+    if sparse is None:
+        raise Exception('The overlap of communities needs scipy')
+    data = load_data()
+    members, community_ids = community_members(data)
+    with open('data/community_overlap.csv', 'w') as csv_output:
+        output = csv.writer(csv_output, delimiter=',')
+        header = ['community_a', 'community_b', 'members_a', 'members_b', 'shared_members',
+                  'jaccard']
+        output.writerow(header)
+        for rows, cols, sizes_a, sizes_b, overlap, jaccard in \
+                overlap_edges(members, min_overlap, min_jaccard):
+            instrumentation.count('community_overlap_edges', len(rows))
+            output.writerows(zip([community_ids[row] for row in rows],
+                                 [community_ids[col] for col in cols],
+                                 sizes_a.tolist(), sizes_b.tolist(), overlap.tolist(),
+                                 jaccard.tolist()))
+
+
+###
+# Conversation trees
+#
+# Every top-level comment of an idea starts a thread,
+# replies at any depth hang from the comment they answer.
+# Parents are found by indexing an array with the codes
+# of the comments, so the trees of all the ideas are
+# built at once in linear time, and are walked level by
+# level, breadth first, without recursion: a level is
+# the children of the comments of the previous one.
+# Results are kept by idea and by comment as columns
+# (see save_columns), communities are summed up from them
+##
+CONVERSATIONS = 'data/conversations'
+
+
+def reply_parents(comment_idea, comment_ids, parent_ids, top):
+    # position of the comment answered by every reply, -1
+    # for top-level comments and replies whose parent isn't
+    # a previous comment of the same idea. Ids of comments
+    # and parents are codes of the same id space
+    num_comments = len(comment_ids)
+    parent_pos = numpy.full(num_comments, -1, dtype=numpy.int64)
+    reply_pos = numpy.flatnonzero(~top)
+    if len(reply_pos) == 0:
+        return parent_pos
+    comment_ids = numpy.asarray(comment_ids, dtype=numpy.int64)
+    parent_ids = numpy.asarray(parent_ids, dtype=numpy.int64)
+    position = numpy.full(int(max(comment_ids.max(), parent_ids.max())) + 1, -1,
+                          dtype=numpy.int64)
+    # the first comment of a code wins
+    position[comment_ids[::-1]] = numpy.arange(num_comments - 1, -1, -1)
+    found = position[parent_ids[reply_pos]]
+    valid = (found >= 0) & (found < reply_pos)
+    valid[valid] &= comment_idea[found[valid]] == comment_idea[reply_pos[valid]]
+    parent_pos[reply_pos[valid]] = found[valid]
+    return parent_pos
+
+
+def reply_levels(parent_pos, top):
+    # depth of every comment (0 for top-level comments, -1
+    # when it can't be reached from one), position of its
+    # thread, depth of every thread and number of replies
+    # of every comment
+    num_comments = len(parent_pos)
+    depth = numpy.full(num_comments, -1, dtype=numpy.int64)
+    thread = numpy.full(num_comments, -1, dtype=numpy.int64)
+    thread_depth = numpy.zeros(num_comments, dtype=numpy.int64)
+    reply_pos = numpy.flatnonzero(parent_pos >= 0)
+    children = reply_pos[numpy.argsort(parent_pos[reply_pos], kind='mergesort')]
+    num_children = numpy.bincount(parent_pos[reply_pos], minlength=num_comments)
+    child_offsets = numpy.concatenate(([0], numpy.cumsum(num_children)))
+    frontier = numpy.flatnonzero(top)
+    depth[frontier], thread[frontier] = 0, frontier
+    level = 0
+    while len(frontier) > 0:
+        sizes = num_children[frontier]
+        starts = child_offsets[frontier] - (numpy.cumsum(sizes) - sizes)
+        parents = numpy.repeat(frontier, sizes)
+        frontier = children[numpy.arange(sizes.sum()) + numpy.repeat(starts, sizes)]
+        level += 1
+        depth[frontier] = level
+        thread[frontier] = thread[parents]
+        thread_depth[thread[frontier]] = level
+    return depth, thread, thread_depth, num_children
+
+
+def conversation_trees(data, moderators):
+    # columns by idea and by comment of the data set or a slice
+    comment_offsets = numpy.asarray(data.array('comment_offsets'))
+    num_ideas = len(comment_offsets) - 1
+    idea_comments = numpy.diff(comment_offsets)
+    comment_idea = numpy.repeat(numpy.arange(num_ideas), idea_comments)
+    if len(comment_idea) > 0:
+        top = data.column('comments', 'parent_type') == 'idea'
+        comment_ids = data.column('comments', 'id')
+        parent_ids = data.column('comments', 'parent_id')
+        comment_epoch = numpy.asarray(data.column('comments', 'creation_epoch'))
+        moderator = moderators[data.column('comments', 'author_id')]
+    else:
+        top = moderator = numpy.zeros(0, dtype=bool)
+        comment_ids = parent_ids = numpy.zeros(0, dtype=numpy.int32)
+        comment_epoch = numpy.zeros(0)
+    parent_pos = reply_parents(comment_idea, comment_ids, parent_ids, top)
+    depth, thread, thread_depth, num_children = reply_levels(parent_pos, top)
+    reply = depth > 0
+    latency = numpy.full(len(depth), numpy.nan)
+    latency[reply] = (comment_epoch[reply] - comment_epoch[parent_pos[reply]]) / 3600.0
+    moderator_thread = numpy.zeros(len(depth), dtype=bool)
+    moderator_thread[thread[moderator & (depth >= 0)]] = True
+    max_depth = numpy.zeros(num_ideas, dtype=numpy.int64)
+    commented = idea_comments > 0
+    if commented.any():
+        max_depth[commented] = numpy.maximum.reduceat(numpy.maximum(depth, 0),
+                                                      comment_offsets[:-1][commented])
+    replied = num_children > 0
+    return {'ideas': {'threads': count_by(top, comment_idea, num_ideas),
+                      'replied_threads': count_by(top & replied, comment_idea, num_ideas),
+                      'replies': count_by(reply, comment_idea, num_ideas),
+                      'replied_comments': count_by(replied & (depth >= 0), comment_idea,
+                                                   num_ideas),
+                      'max_depth': max_depth,
+                      'thread_depths': numpy.bincount(comment_idea[top],
+                                                      weights=thread_depth[top],
+                                                      minlength=num_ideas).astype(numpy.int64),
+                      'moderator_threads': count_by(top & moderator_thread, comment_idea,
+                                                    num_ideas)},
+            'comments': {'depth': depth, 'thread': thread,
+                         'reply_latency_hours': latency}}
+
+
+def level_latencies(blocks, depth, latency):
+    # replies, problematic replies (answered before their
+    # parent) and quantiles of the latency of the rest, by
+    # (block, level)
+    reply = depth > 0
+    blocks, depth, latency = blocks[reply], depth[reply], latency[reply]
+    if len(blocks) == 0:
+        return []
+    width = int(depth.max()) + 1
+    keys = blocks * width + depth
+    with numpy.errstate(invalid='ignore'):
+        problematic = latency < 0
+    keys_ok, latency_ok = keys[~problematic & ~numpy.isnan(latency)], \
+        latency[~problematic & ~numpy.isnan(latency)]
+    order = numpy.lexsort((latency_ok, keys_ok))
+    keys_ok, latency_ok = keys_ok[order], latency_ok[order]
+    group_keys, replies = numpy.unique(keys, return_counts=True)
+    problematic = numpy.bincount(numpy.searchsorted(group_keys, keys[problematic]),
+                                 minlength=len(group_keys))
+    bounds = numpy.searchsorted(keys_ok, numpy.concatenate((group_keys, [keys.max() + 1])))
+    levels = []
+    for idx, key in enumerate(group_keys.tolist()):
+        values = latency_ok[bounds[idx]:bounds[idx + 1]]
+        quantiles = [numpy.median(values)] + numpy.percentile(
+            values, [100 * q for q in RESPONSE_TIME_QUANTILES[1:]]).tolist() \
+            if len(values) > 0 else [numpy.nan] * len(RESPONSE_TIME_QUANTILES)
+        levels.append((key // width, key % width, int(replies[idx]), int(problematic[idx]),
+                       quantiles))
+    return levels
+
+
+def ratio(numerators, denominators):
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        return numpy.where(denominators > 0, numerators / denominators.astype(numpy.float64),
+                           numpy.nan)
+
+
+def compute_conversation_analytics():
+    data = load_data()
+    moderators = moderator_map(load_authors(), data)
+    trees = conversation_trees(data, moderators)
+    ideas = trees['ideas']
+    community_offsets = numpy.asarray(data.array('community_offsets'))
+    num_blocks = len(community_offsets) - 1
+    idea_block = numpy.repeat(numpy.arange(num_blocks), numpy.diff(community_offsets))
+    idea_ids = data.column('ideas', 'id')
+    ideas['id'] = data.id_table('ideas')[idea_ids] if len(idea_ids) > 0 \
+        else numpy.zeros(0, dtype=numpy.string_)
+    ideas['community_id'] = numpy.asarray(data.communities, dtype=numpy.string_)[idea_block] \
+        if len(idea_block) > 0 else numpy.zeros(0, dtype=numpy.string_)
+    ideas['branching_factor'] = ratio(ideas['replies'], ideas['replied_comments'])
+    dataset_store.save_columns(CONVERSATIONS, trees)
+
+    sums = dict((field, numpy.bincount(idea_block, weights=ideas[field],
+                                       minlength=num_blocks).astype(numpy.int64))
+                for field in ('threads', 'replied_threads', 'replies', 'replied_comments',
+                              'thread_depths', 'moderator_threads'))
+    max_depth = numpy.zeros(num_blocks, dtype=numpy.int64)
+    with_ideas = numpy.diff(community_offsets) > 0
+    if with_ideas.any():
+        max_depth[with_ideas] = numpy.maximum.reduceat(ideas['max_depth'],
+                                                       community_offsets[:-1][with_ideas])
+    columns = numpy.column_stack((sums['threads'], sums['replied_threads'], sums['replies'],
+                                  max_depth,
+                                  ratio(sums['thread_depths'], sums['replied_threads']),
+                                  ratio(sums['replies'], sums['replied_comments']),
+                                  ratio(sums['moderator_threads'], sums['threads'])))
+    current = [block for block, community_id in enumerate(data.communities)
+               if data.community_idx[community_id] == block]
+    with open('data/community_conversations.csv', 'w') as csv_output:
+        output = csv.writer(csv_output, delimiter=',')
+        header = ['community_id', 'threads', 'replied_threads', 'replies', 'max_depth',
+                  'mean_thread_depth', 'branching_factor', 'moderator_thread_share']
+        output.writerow(header)
+        for block in current:
+            values = columns[block].tolist()
+            output.writerow([data.communities[block]] + [int(value) for value in values[:4]] +
+                            values[4:])
+    comment_block = numpy.repeat(idea_block, numpy.diff(data.array('comment_offsets')))
+    is_current = numpy.zeros(num_blocks, dtype=bool)
+    is_current[current] = True
+    with open('data/community_reply_latency.csv', 'w') as csv_output:
+        output = csv.writer(csv_output, delimiter=',')
+        header = ['community_id', 'level', 'replies', 'problematic_replies',
+                  'median_latency_hours', 'p90_latency_hours', 'p99_latency_hours']
+        output.writerow(header)
+        for block, level, replies, problematic, quantiles in \
+                level_latencies(comment_block, trees['comments']['depth'],
+                                trees['comments']['reply_latency_hours']):
+            if is_current[block]:
+                output.writerow([data.communities[block], level, replies, problematic] +
+                                quantiles)
+
+
+###
+# Profiling
+#
+# Stages of the pipeline and functions computing the
+# data of metrics that are timed when a profile is
+# asked (see instrumentation)
+###
+PROFILED_STAGES = ['load_data', 'load_authors', 'load_communities', 'collect_data_for_metrics',
+                   'gather_data', 'gather_data_windows', 'gather_data_windows_parallel',
+                   'compute_metrics', 'compute_metrics_streaming', 'save_data_for_metrics',
+                   'save_metric_results', 'compute_influence_mod_intervention',
+                   'compute_participation_level', 'compute_community_overlap',
+                   'compute_top_contributors', 'compute_conversation_analytics']
+PROFILED_FUNCTIONS = ['data_metric_response_time_comments', 'data_metric_response_time_idea',
+                      'data_metric_number_votes_replies_comments',
+                      'data_metric_number_votes_comments_idea', 'data_metric_irrelevant_idea',
+                      'data_metric_feedback_newcomer_idea', 'accumulate_idea', 'segment_first',
+                      'first_level_replies', 'registration_epochs', 'registration_days',
+                      'response_time_sketches',
+                      'productivity', 'community_responsiveness', 'content_quality',
+                      'newcomers_treatment', 'moderator_interventions', 'intervention_counts',
+                      'participation_roles', 'contributions', 'author_roles',
+                      'community_members', 'exact_top_contributors', 'sketch_top_contributors',
+                      'conversation_trees', 'level_latencies']
+
+
+def enable_profiling():
+    instrumentation.profile_functions(sys.modules[__name__], PROFILED_STAGES + PROFILED_FUNCTIONS)
 
 
 if __name__ == '__main__':
-    #compute_participation_level()
-    compute_influence_mod_intervention()
-    #metric_results = compute_metrics()
-    #save_metric_results(metric_results)
\ No newline at end of file
+    arg_parser = argparse.ArgumentParser(description='Compute metrics of open innovation communities')
+    arg_parser.add_argument('task', nargs='?', default='interventions',
+                            choices=['metrics', 'interventions', 'participation',
+                                     'newcomer-sweep', 'overlap', 'top-contributors',
+                                     'conversations'])
+    arg_parser.add_argument('--workers', type=int, default=1,
+                            help='number of processes used to collect the data of communities')
+    arg_parser.add_argument('--quantile-error', type=float, default=None,
+                            help='approximate response time medians and percentiles with '
+                                 'sketches of this rank error (e.g., 0.01) instead of keeping '
+                                 'every response time')
+    arg_parser.add_argument('--percentiles', action='store_true',
+                            help='add the 90th and 99th percentiles of response times to '
+                                 'community_metrics.csv')
+    arg_parser.add_argument('--newcomer-window', type=int, nargs='+', default=[NEWCOMER_WINDOW],
+                            metavar='DAYS',
+                            help='days after their registration in which authors are taken as '
+                                 'newcomers (default {}), several windows can be given to the '
+                                 'newcomer-sweep task'.format(NEWCOMER_WINDOW))
+    arg_parser.add_argument('--min-overlap', type=int, default=1, metavar='MEMBERS',
+                            help='pairs of communities sharing fewer members are left out of '
+                                 'the overlap task (default 1)')
+    arg_parser.add_argument('--min-jaccard', type=float, default=0.0,
+                            help='pairs of communities with a lower jaccard similarity of their '
+                                 'members are left out of the overlap task (default 0)')
+    arg_parser.add_argument('--top', type=int, default=5, metavar='K',
+                            help='authors listed by role and community by the top-contributors '
+                                 'task (default 5)')
+    arg_parser.add_argument('--heavy-hitter-error', type=float, default=None,
+                            help='approximate the counts of the top-contributors task with '
+                                 'heavy-hitter sketches of this error (e.g., 0.001) instead of '
+                                 'counting every author')
+    arg_parser.add_argument('--stream', action='store_true',
+                            help='compute the metrics, or the approximate top contributors, in '
+                                 'one pass over the exports, without building the data set')
+    arg_parser.add_argument('--save-metric-data', action='store_true',
+                            help='save the data collected for metrics in streaming mode')
+    arg_parser.add_argument('--profile', metavar='FILE',
+                            help='time the stages and the functions computing the data of '
+                                 'metrics, and save the timers and counters to FILE (json)')
+    args = arg_parser.parse_args()
+    if args.quantile_error is not None and not 0 < args.quantile_error < 1:
+        arg_parser.error('--quantile-error has to be between 0 and 1')
+    if args.top < 1:
+        arg_parser.error('--top has to be at least 1')
+    if args.heavy_hitter_error is not None and not 0 < args.heavy_hitter_error < 1:
+        arg_parser.error('--heavy-hitter-error has to be between 0 and 1')
+    if args.task == 'top-contributors' and args.stream and args.heavy_hitter_error is None:
+        arg_parser.error('top contributors can only be streamed with --heavy-hitter-error')
+    if args.task != 'newcomer-sweep' and len(args.newcomer_window) > 1:
+        arg_parser.error('several newcomer windows can only be given to the newcomer-sweep task')
+    newcomer_window = args.newcomer_window[0]
+    if args.profile:
+        enable_profiling()
+    if args.task == 'metrics' and args.stream:
+        metric_results = compute_metrics_streaming(args.quantile_error, args.save_metric_data,
+                                                   newcomer_window)
+        save_metric_results(metric_results, cache=False, percentiles=args.percentiles)
+    elif args.task == 'metrics':
+        metric_results = compute_metrics(args.workers, args.quantile_error, newcomer_window)
+        save_metric_results(metric_results, percentiles=args.percentiles)
+    elif args.task == 'newcomer-sweep':
+        sweep_newcomer_windows(args.newcomer_window, args.workers, args.quantile_error)
+    elif args.task == 'interventions':
+        compute_influence_mod_intervention(args.workers)
+    elif args.task == 'overlap':
+        compute_community_overlap(args.min_overlap, args.min_jaccard)
+    elif args.task == 'top-contributors':
+        compute_top_contributors(args.top, args.heavy_hitter_error, args.stream)
+    elif args.task == 'conversations':
+        compute_conversation_analytics()
+    else:
+        compute_participation_level()
+    if args.profile:
+        instrumentation.save_report(args.profile)
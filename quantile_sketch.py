@@ -0,0 +1,119 @@
+__author__ = 'jorgesaldivar'
+
+
+import math
+import random
+
+
+SEED = 17  # compactions are randomized, but runs are reproducible
+
+
+###
+# KLL quantile sketch
+#
+# Bounded-memory summary of a stream of values that
+# answers quantile queries with a rank error of about
+# error * n (Karnin, Lang and Liberty, "Optimal quantile
+# approximation in streams", 2016). Values are kept in
+# a hierarchy of compactors, when a compactor is full
+# its values are sorted and every other value is
+# promoted to the next level, where each value stands
+# for twice as many values. The sketch takes O(1/error)
+# memory no matter how many values it summarizes, and
+# sketches of different streams can be merged. Streams
+# shorter than the capacity of the sketch are kept in
+# full, so their quantiles are exact.
+###
+class KLLSketch(object):
+
+    def __init__(self, error=0.01):
+        self.error = error
+        self.k = max(8, int(math.ceil(1.65 / error)))
+        self.compactors = [[]]
+        self.count = 0
+        self.size = 0
+        self.max_size = self.capacity(0)
+        self.rng = random.Random(SEED)
+
+    def capacity(self, level):
+        depth = len(self.compactors) - level - 1
+        return int(math.ceil(self.k * (2.0 / 3.0) ** depth)) + 1
+
+    def grow(self):
+        self.compactors.append([])
+        self.max_size = sum(self.capacity(level) for level in range(len(self.compactors)))
+
+    def update(self, value):
+        self.compactors[0].append(value)
+        self.count += 1
+        self.size += 1
+        if self.size >= self.max_size:
+            self.compress()
+
+    def compress(self):
+        for level in range(len(self.compactors)):
+            compactor = self.compactors[level]
+            if len(compactor) < self.capacity(level):
+                continue
+            if level + 1 == len(self.compactors):
+                self.grow()
+            compactor.sort()
+            # an odd value out stays in the compactor
+            keep = compactor[-1:] if len(compactor) % 2 else []
+            pairs = compactor[:len(compactor) - len(keep)]
+            self.compactors[level + 1].extend(pairs[self.rng.randint(0, 1)::2])
+            self.compactors[level] = keep
+            self.size = sum(len(values) for values in self.compactors)
+            if self.size < self.max_size:
+                break
+
+    def merge(self, other):
+        while len(self.compactors) < len(other.compactors):
+            self.grow()
+        for level, values in enumerate(other.compactors):
+            self.compactors[level].extend(values)
+        self.count += other.count
+        self.size = sum(len(values) for values in self.compactors)
+        while self.size >= self.max_size:
+            self.compress()
+        return self
+
+    def quantiles(self, fractions):
+        # smallest value whose weighted rank reaches every
+        # fraction of the stream
+        weighted = sorted((value, 2 ** level) for level, values in enumerate(self.compactors)
+                          for value in values)
+        total = sum(weight for _, weight in weighted)
+        results = []
+        for fraction in fractions:
+            rank, result = 0, None
+            for value, weight in weighted:
+                rank += weight
+                result = value
+                if rank >= fraction * total:
+                    break
+            results.append(result)
+        return results
+
+    def quantile(self, fraction):
+        return self.quantiles([fraction])[0]
+
+    def is_exact(self):
+        # nothing was compacted yet, every value is kept
+        return len(self.compactors) == 1
+
+    def values(self):
+        return list(self.compactors[0])
+
+    def to_dict(self):
+        return {'error': self.error, 'count': self.count, 'compactors': self.compactors}
+
+
+def from_dict(dict_sketch):
+    sketch = KLLSketch(dict_sketch['error'])
+    for _ in range(len(dict_sketch['compactors']) - 1):
+        sketch.grow()
+    sketch.compactors = [list(values) for values in dict_sketch['compactors']]
+    sketch.count = dict_sketch['count']
+    sketch.size = sum(len(values) for values in sketch.compactors)
+    return sketch
@@ -0,0 +1,121 @@
+__author__ = 'jorgesaldivar'
+
+
+import itertools
+import operator
+import re
+
+
+INT_FIELDS = ('comments', 'up_votes', 'down_votes', 'replies', 'value')
+EPOCH_FIELD = 'creation_epoch'
+ARRAY_FIELDS = ('comments_array', 'votes_array')
+
+
+###
+# Compact records
+#
+# Rows of ideas, comments and votes are kept in objects
+# with a slot by column instead of dictionaries. Slots
+# are resolved once from the header of the export, and
+# counters are converted to int when the row is read,
+# so metrics read them as they are. Fields are read as
+# attributes (idea.up_votes) or, where the field name
+# is only known at run time, as items (idea['up_votes']).
+###
+class Record(object):
+
+    __slots__ = ()
+    fields = ()
+    attributes = {}
+
+    def __getitem__(self, field):
+        try:
+            return getattr(self, self.attributes[field])
+        except (KeyError, AttributeError):
+            raise KeyError(field)
+
+    def __setitem__(self, field, value):
+        setattr(self, self.attributes[field], value)
+
+    def __contains__(self, field):
+        return field in self.attributes and hasattr(self, self.attributes[field])
+
+    def get(self, field, default=None):
+        try:
+            return self[field]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [field for field in self.fields if hasattr(self, self.attributes[field])]
+
+
+def getter(row, fields):
+    # function returning the values of the fields of a
+    # row (record or dictionary) as a tuple
+    if isinstance(row, Record):
+        get = operator.attrgetter(*[row.attributes[field] for field in fields])
+    else:
+        get = operator.itemgetter(*fields)
+    return get if len(fields) > 1 else lambda row: (get(row),)
+
+
+def attribute_name(field):
+    name = re.sub(r'\W', '_', field)
+    return '_' + name if not name or name[0].isdigit() else name
+
+
+record_types = {}
+
+
+def record_type(fields):
+    fields = tuple(fields)
+    cls = record_types.get(fields)
+    if cls is None:
+        all_fields = fields + tuple(field for field in (EPOCH_FIELD,) + ARRAY_FIELDS
+                                    if field not in fields)
+        attributes = dict((field, attribute_name(field)) for field in all_fields)
+        cls = type('Record', (Record,), {'__slots__': tuple(attributes[field]
+                                                             for field in all_fields),
+                                         'fields': all_fields, 'attributes': attributes})
+        record_types[fields] = cls
+    return cls
+
+
+class RowReader(object):
+    # build records from the rows of an export
+
+    def __init__(self, header, to_epoch=None):
+        self.cls = record_type(header)
+        self.names = [attribute_name(field) for field in header]
+        self.int_idx = [idx for idx, field in enumerate(header) if field in INT_FIELDS]
+        self.dt_idx = header.index('creation_datetime') \
+            if to_epoch is not None and 'creation_datetime' in header else None
+        self.to_epoch = to_epoch
+
+    def read(self, row):
+        if len(row) != len(self.names):
+            raise Exception('Dimension miss match')
+        record = self.cls()
+        values = list(row)
+        for idx in self.int_idx:
+            # counters missing in the export count as 0
+            values[idx] = int(values[idx]) if values[idx] else 0
+        map(setattr, itertools.repeat(record, len(values)), self.names, values)
+        if self.dt_idx is not None:
+            record.creation_epoch = self.to_epoch(values[self.dt_idx])
+        record.comments_array = []
+        record.votes_array = []
+        return record
+
+
+def from_columns(fields, columns, num_rows):
+    # records of the given fields, values are already typed
+    cls = record_type(fields)
+    names = [cls.attributes[field] for field in fields]
+    rows = []
+    for values in zip(*columns) if columns else [()] * num_rows:
+        record = cls()
+        map(setattr, itertools.repeat(record, len(names)), names, values)
+        rows.append(record)
+    return rows
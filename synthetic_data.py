@@ -0,0 +1,336 @@
+__author__ = 'jorgesaldivar'
+
+
+import argparse
+import csv
+import datetime
+import os
+import random
+
+
+FIRST_COMMUNITY_ID = 40000  # above the ids of the problematic communities
+FIRST_DAY = datetime.datetime(2009, 1, 1)
+LIFETIME_DAYS = 1500        # max lifetime of a community
+TIME_ZONE = '-07:00'        # the platform dumps datetimes in local time
+MAX_REACTIONS = 10000       # cap of comments and votes of an idea
+STATUSES = ['active'] * 12 + ['review', 'progress', 'complete', 'offtopic', 'recyclebin']
+STATUS_COUNTERS = {'review': 'ideas_in_review', 'progress': 'ideas_in_progress',
+                   'complete': 'ideas_complete'}
+COUNTERS = ['ideas_in_review', 'ideas_in_progress', 'ideas_complete', 'votes', 'up_votes',
+            'down_votes', 'comments', 'ideas_by_moderators', 'votes_by_moderators',
+            'comments_by_moderators', 'moderator_interventions']
+OBSERVATION_DATE = ['Observation Date', '2015-01-01']
+
+HEADER_IDEAS = ['id', 'creation_datetime', 'author_id', 'status', 'comments', 'up_votes',
+                'down_votes', 'campaign_id', 'tags', 'url', 'language', 'modification_datetime',
+                'community_id']
+HEADER_COMMENTS = ['id', 'creation_datetime', 'author_id', 'up_votes', 'down_votes', 'replies',
+                   'url', 'parent_type', 'parent_id', 'community_id']
+HEADER_VOTES = ['id', 'author', 'idea_id', 'value', 'creation_datetime']
+HEADER_AUTHORS = ['id', 'name', 'admin', 'moderator', 'email_domain', 'registration_datetime',
+                  'language', 'community_id']
+HEADER_COMMUNITIES = ['id', 'name', 'url', 'campaigns', 'ideas', 'users', 'tags', 'language']
+HEADER_COMMUNITIES_DS = ['id', 'name', 'url', 'campaigns', 'ideas', 'ideas_in_review',
+                         'ideas_in_progress', 'ideas_complete', 'users', 'contributors', 'votes',
+                         'up_votes', 'down_votes', 'comments', 'language', 'first_idea_dt',
+                         'last_idea_dt', 'lifetime_days', 'moderators', 'tags', 'lifecycle_states',
+                         'ideas_by_moderators', 'votes_by_moderators', 'comments_by_moderators',
+                         'moderator_interventions']
+
+
+###
+# Synthetic data set
+#
+# Write exports of ideas, comments, votes, authors and
+# communities with the layout of the IdeaScale exports
+# read by metric_calculator, to have reproducible
+# workloads of any size without sharing real data.
+#
+# Sizes of communities, reactions to ideas and activity
+# of authors follow a Pareto distribution of the given
+# shape (activity), the smaller the shape the heavier
+# the tail. Comments are replies with probability
+# reply_rate, up to reply_depth levels (replies to
+# replies are kept by the checker, their threads are
+# analyzed by the conversations task).
+# A fraction of comments (orphan_rate) is placed to
+# ideas missing in the exports, and a fraction of ideas
+# (anomaly_rate) has reactions dated before the idea or
+# counters that don't match their reactions, as in the
+# real exports.
+#
+# Rows are written as they are generated, community by
+# community, so only one idea is kept in memory. Ideas
+# get a couple of comments and votes on average, the
+# exports have about 5 * ideas * communities rows.
+###
+def pareto(rng, activity):
+    # Pareto value with mean 1
+    return rng.paretovariate(activity) * (activity - 1) / activity
+
+
+def reactions(rng, activity, mean):
+    return min(MAX_REACTIONS, int(round(mean * pareto(rng, activity))))
+
+
+def pick_author(rng, activity, members):
+    # rank of the member, a few members contribute most
+    # of the content
+    return int(members * rng.random() ** (activity / (activity - 1)))
+
+
+def format_dt(dt):
+    return dt.strftime('%Y-%m-%d %H:%M:%S') + TIME_ZONE
+
+
+def after(rng, dt, mean_hours):
+    return dt + datetime.timedelta(seconds=int(rng.expovariate(1.0 / (mean_hours * 3600))) + 1)
+
+
+class Community(object):
+
+    def __init__(self, rng, community_id, first_author_id, num_ideas, activity):
+        self.id = community_id
+        self.num_ideas = num_ideas
+        self.first_author_id = first_author_id
+        self.members = max(5, int(num_ideas * pareto(rng, activity)))
+        self.start = FIRST_DAY + datetime.timedelta(days=rng.randint(0, LIFETIME_DAYS // 2))
+        self.lifetime = rng.randint(1, LIFETIME_DAYS // 2)
+        self.tags = rng.randint(0, max(1, num_ideas // 2))
+        self.moderators = set(rank for rank in range(self.members) if rng.random() < 0.02)
+        self.admin = rng.randrange(self.members)
+        self.moderators.add(self.admin)
+        self.contributors = set()
+        self.counters = dict((counter, 0) for counter in COUNTERS)
+
+    def author_id(self, rank):
+        return str(self.first_author_id + rank)
+
+    def contribute(self, rank, counter):
+        self.contributors.add(rank)
+        if rank in self.moderators:
+            self.counters[counter + '_by_moderators'] += 1
+            self.counters['moderator_interventions'] += 1
+
+    def random_dt(self, rng):
+        return self.start + datetime.timedelta(seconds=rng.randint(0, self.lifetime * 86400))
+
+
+class SyntheticExports(object):
+
+    def __init__(self, path, seed=1, communities=100, ideas=100, activity=1.5, reply_rate=0.4,
+                 reply_depth=2, orphan_rate=0.01, anomaly_rate=0.01):
+        if activity <= 1:
+            raise ValueError('activity has to be greater than 1, got {}'.format(activity))
+        self.path = path
+        self.rng = random.Random(seed)
+        self.num_communities = communities
+        self.mean_ideas = ideas
+        self.activity = activity
+        self.reply_rate = reply_rate
+        self.reply_depth = reply_depth
+        self.orphan_rate = orphan_rate
+        self.anomaly_rate = anomaly_rate
+        self.next_ids = {'idea': 1, 'comment': 1, 'vote': 1, 'author': 1}
+        self.rows = dict((table, 0) for table in ('ideas', 'comments', 'votes', 'authors'))
+
+    def new_id(self, table):
+        new_id = self.next_ids[table]
+        self.next_ids[table] += 1
+        return str(new_id)
+
+    def write(self):
+        files = {}
+        try:
+            for name in ('ideas', 'comments', 'votes', 'authors', 'authors2', 'communities',
+                         'communities_ds'):
+                files[name] = open(os.path.join(self.path, FILE_NAMES[name]), 'wb')
+            writers = dict((name, csv.writer(f, delimiter=',')) for name, f in files.iteritems())
+            writers['ideas'].writerow(HEADER_IDEAS)
+            writers['comments'].writerow(HEADER_COMMENTS)
+            for name, header in (('votes', HEADER_VOTES), ('authors', HEADER_AUTHORS),
+                                 ('authors2', HEADER_AUTHORS),
+                                 ('communities', HEADER_COMMUNITIES)):
+                writers[name].writerow(OBSERVATION_DATE)
+                writers[name].writerow(header)
+            writers['communities_ds'].writerow(HEADER_COMMUNITIES_DS)
+            for idx in range(self.num_communities):
+                # authors are split in two files, as exported
+                writers_authors = writers['authors'] if idx < self.num_communities // 2 or \
+                    self.num_communities == 1 else writers['authors2']
+                self.write_community(FIRST_COMMUNITY_ID + idx, writers, writers_authors)
+        finally:
+            for f in files.itervalues():
+                f.close()
+        return self.rows
+
+    def write_community(self, community_id, writers, writers_authors):
+        rng = self.rng
+        num_ideas = max(1, int(round(self.mean_ideas * pareto(rng, self.activity))))
+        community = Community(rng, community_id, self.next_ids['author'], num_ideas,
+                              self.activity)
+        self.next_ids['author'] += community.members
+        first_dt, last_dt = None, None
+        for _ in range(num_ideas):
+            idea_dt = community.random_dt(rng)
+            first_dt = min(first_dt or idea_dt, idea_dt)
+            last_dt = max(last_dt or idea_dt, idea_dt)
+            self.write_idea(community, idea_dt, writers)
+        self.write_authors(community, writers_authors)
+
+        name = 'Community {}'.format(community_id)
+        url = 'http://community{}.ideascale.com'.format(community_id)
+        writers['communities'].writerow([community_id, name, url, 1, num_ideas,
+                                         community.members, community.tags, 'en'])
+        counters = community.counters
+        writers['communities_ds'].writerow(
+            [community_id, name, url, 1, num_ideas, counters['ideas_in_review'],
+             counters['ideas_in_progress'], counters['ideas_complete'], community.members,
+             len(community.contributors), counters['votes'], counters['up_votes'],
+             counters['down_votes'], counters['comments'], 'en', format_dt(first_dt),
+             format_dt(last_dt), (last_dt - first_dt).days, len(community.moderators),
+             community.tags, ' '.join(sorted(set(STATUSES))), counters['ideas_by_moderators'],
+             counters['votes_by_moderators'], counters['comments_by_moderators'],
+             counters['moderator_interventions']])
+
+    def write_idea(self, community, idea_dt, writers):
+        rng = self.rng
+        idea_id = self.new_id('idea')
+        author = pick_author(rng, self.activity, community.members)
+        community.contribute(author, 'ideas')
+        status = rng.choice(STATUSES)
+        if status in STATUS_COUNTERS:
+            community.counters[STATUS_COUNTERS[status]] += 1
+        anomaly = rng.random() < self.anomaly_rate
+        # reactions of ideas with anomalies can come before the idea
+        reaction_dt = idea_dt - datetime.timedelta(days=2) if anomaly and rng.random() < 0.5 \
+            else idea_dt
+
+        # comments, replies are placed to earlier comments
+        comments, orphans = [], 0
+        for _ in range(reactions(rng, self.activity, 2.0)):
+            comment_id = self.new_id('comment')
+            comment_author = pick_author(rng, self.activity, community.members)
+            community.contribute(comment_author, 'comments')
+            parents = [comment for comment in comments
+                       if comment['depth'] < self.reply_depth and not comment['orphan']]
+            if parents and rng.random() < self.reply_rate:
+                parent = rng.choice(parents)
+                parent['replies'] += 1
+                comments.append({'id': comment_id, 'author': comment_author, 'replies': 0,
+                                 'dt': after(rng, parent['dt'], 12), 'parent_type': 'comment',
+                                 'parent_id': parent['id'], 'depth': parent['depth'] + 1,
+                                 'orphan': False})
+            elif rng.random() < self.orphan_rate:
+                # placed to an idea that isn't in the exports
+                comments.append({'id': comment_id, 'author': comment_author, 'replies': 0,
+                                 'dt': after(rng, reaction_dt, 48), 'parent_type': 'idea',
+                                 'parent_id': self.new_id('idea'), 'depth': 0, 'orphan': True})
+                orphans += 1
+            else:
+                comments.append({'id': comment_id, 'author': comment_author, 'replies': 0,
+                                 'dt': after(rng, reaction_dt, 48), 'parent_type': 'idea',
+                                 'parent_id': idea_id, 'depth': 0, 'orphan': False})
+        for comment in comments:
+            up_votes = reactions(rng, self.activity, 0.5)
+            down_votes = reactions(rng, self.activity, 0.1)
+            writers['comments'].writerow([comment['id'], format_dt(comment['dt']),
+                                          community.author_id(comment['author']), up_votes,
+                                          down_votes, comment['replies'], '',
+                                          comment['parent_type'], comment['parent_id'],
+                                          community.id])
+        self.rows['comments'] += len(comments)
+
+        # votes
+        up_votes, down_votes = 0, 0
+        for _ in range(reactions(rng, self.activity, 2.0)):
+            vote_author = pick_author(rng, self.activity, community.members)
+            community.contribute(vote_author, 'votes')
+            value = 1 if rng.random() < 0.8 else -1
+            if value > 0:
+                up_votes += 1
+            else:
+                down_votes += 1
+            writers['votes'].writerow([self.new_id('vote'), community.author_id(vote_author),
+                                       idea_id, value,
+                                       format_dt(after(rng, reaction_dt, 72))])
+        self.rows['votes'] += up_votes + down_votes
+
+        num_comments = len(comments) - orphans
+        if anomaly and rng.random() < 0.5:
+            # counters don't match the reactions exported
+            num_comments += 1
+        community.counters['comments'] += len(comments)
+        community.counters['votes'] += up_votes + down_votes
+        community.counters['up_votes'] += up_votes
+        community.counters['down_votes'] += down_votes
+        writers['ideas'].writerow([idea_id, format_dt(idea_dt), community.author_id(author),
+                                   status, num_comments, up_votes, down_votes, 1, '',
+                                   '', 'en', format_dt(idea_dt), community.id])
+        self.rows['ideas'] += 1
+
+    def write_authors(self, community, writer):
+        rng = self.rng
+        for rank in range(community.members):
+            # some members register just before contributing, i.e.,
+            # they are newcomers when they post their ideas
+            registration_dt = community.random_dt(rng) if rng.random() < 0.8 \
+                else community.start - datetime.timedelta(days=rng.randint(0, 30))
+            is_moderator = rank in community.moderators
+            registration = registration_dt.strftime('%Y-%m-%dT%H:%M:%S.000') + TIME_ZONE
+            writer.writerow([community.author_id(rank), 'Member {}'.format(rank),
+                             str(rank == community.admin), str(is_moderator),
+                             'example.com', registration, 'en', community.id])
+        self.rows['authors'] += community.members
+
+
+FILE_NAMES = {'ideas': 'idsc_ideas_no_text_last.csv',
+              'comments': 'idsc_comments_no_text_last.csv',
+              'votes': 'idsc_votes_last.csv',
+              'authors': 'idsc_authors_reloaded.csv',
+              'authors2': 'idsc_authors_reloaded2.csv',
+              'communities': 'idsc_communities.csv',
+              'communities_ds': 'communities_dataset.csv'}
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Write synthetic exports of open innovation '
+                                                     'communities for load testing')
+    arg_parser.add_argument('--output', default='data',
+                            help='directory where the exports are written')
+    arg_parser.add_argument('--seed', type=int, default=1)
+    arg_parser.add_argument('--communities', type=int, default=100, help='number of communities')
+    arg_parser.add_argument('--ideas', type=int, default=100,
+                            help='mean number of ideas by community')
+    arg_parser.add_argument('--activity', type=float, default=1.5,
+                            help='shape of the Pareto distribution of the size of communities, '
+                                 'of the reactions to ideas and of the contributions of members, '
+                                 'heavier tails when closer to 1')
+    arg_parser.add_argument('--reply-rate', type=float, default=0.4,
+                            help='probability of a comment being a reply')
+    arg_parser.add_argument('--reply-depth', type=int, default=2,
+                            help='max number of levels of replies')
+    arg_parser.add_argument('--orphan-rate', type=float, default=0.01,
+                            help='fraction of comments placed to ideas missing in the exports')
+    arg_parser.add_argument('--anomaly-rate', type=float, default=0.01,
+                            help='fraction of ideas with reactions older than the idea or '
+                                 'counters not matching their reactions')
+    arg_parser.add_argument('--force', action='store_true',
+                            help='overwrite the exports found in the output directory')
+    args = arg_parser.parse_args()
+    if args.activity <= 1:
+        arg_parser.error('--activity has to be greater than 1')
+    if not os.path.isdir(args.output):
+        os.makedirs(args.output)
+    existing = [fname for fname in FILE_NAMES.itervalues()
+                if os.path.exists(os.path.join(args.output, fname))]
+    if existing and not args.force:
+        arg_parser.error('{} already has exports ({}), use --force to overwrite them'.
+                         format(args.output, ', '.join(sorted(existing))))
+    print('Writing synthetic exports, please wait...')
+    exports = SyntheticExports(args.output, args.seed, args.communities, args.ideas,
+                               args.activity, args.reply_rate, args.reply_depth, args.orphan_rate,
+                               args.anomaly_rate)
+    rows = exports.write()
+    print('Wrote {} ideas, {} comments, {} votes and {} authors to {}'.
+          format(rows['ideas'], rows['comments'], rows['votes'], rows['authors'], args.output))
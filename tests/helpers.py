@@ -0,0 +1,75 @@
+__author__ = 'jorgesaldivar'
+
+
+from contextlib import contextmanager
+
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import synthetic_data
+
+
+###
+# Tests run in a temporary directory holding the exports
+# in data/, the working directory of the scripts. Exports
+# are either written by synthetic_data, with a fixed seed,
+# or given row by row
+###
+class ExportsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp_dir = tempfile.mkdtemp()
+        os.chdir(self.tmp_dir)
+        os.makedirs('data')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp_dir)
+
+
+def write_synthetic(path='data', seed=7, communities=12, ideas=30, reply_depth=3, **options):
+    return synthetic_data.SyntheticExports(path, seed, communities, ideas,
+                                           reply_depth=reply_depth, **options).write()
+
+
+def write_exports(path, ideas, comments, votes=(), authors=()):
+    # rows of the exports, in the layout of synthetic_data
+    for name, header, rows in (('ideas', synthetic_data.HEADER_IDEAS, ideas),
+                               ('comments', synthetic_data.HEADER_COMMENTS, comments)):
+        with open(os.path.join(path, synthetic_data.FILE_NAMES[name]), 'wb') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+    for name, header, rows in (('votes', synthetic_data.HEADER_VOTES, votes),
+                               ('authors', synthetic_data.HEADER_AUTHORS, authors),
+                               ('authors2', synthetic_data.HEADER_AUTHORS, []),
+                               ('communities', synthetic_data.HEADER_COMMUNITIES, [])):
+        with open(os.path.join(path, synthetic_data.FILE_NAMES[name]), 'wb') as f:
+            writer = csv.writer(f)
+            writer.writerow(synthetic_data.OBSERVATION_DATE)
+            writer.writerow(header)
+            writer.writerows(rows)
+
+
+def read_rows(fname):
+    with open(fname, 'rb') as f:
+        return list(csv.DictReader(f))
+
+
+@contextmanager
+def quiet():
+    # progress bars and messages of the scripts
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        yield
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
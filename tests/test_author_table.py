@@ -0,0 +1,167 @@
+__author__ = 'jorgesaldivar'
+
+
+from dateutil import parser
+
+import calendar
+import csv
+import datetime
+import os
+import unittest
+
+from tests.helpers import ExportsTestCase, quiet, write_synthetic
+
+import author_table
+import metric_calculator
+import synthetic_data
+
+
+def export_fnames(path):
+    return [os.path.join(path, synthetic_data.FILE_NAMES[name]) for name in ('authors',
+                                                                             'authors2')]
+
+
+def identify_author_reg_datetime(author):
+    # the probing of load_authors before the layout was
+    # inferred by file: the last column parsed by strptime
+    # and every integer of the row
+    idx_registration_dt = -1
+    num_values = []
+    for i in range(0, len(author)):
+        try:
+            datetime.datetime.strptime(author[i].split('.')[0], '%Y-%m-%dT%H:%M:%S')
+            idx_registration_dt = i
+        except ValueError:
+            pass
+        try:
+            num_values.append(int(author[i]))
+        except ValueError:
+            pass
+    return {'idx_reg_dt': idx_registration_dt, 'numeric_values': num_values}
+
+
+def baseline_authors(fnames):
+    # load_authors as it was before the table of authors,
+    # the community is the last integer of the row
+    authors = {}
+    for fname in fnames:
+        with open(fname, 'rb') as csv_authors:
+            list_authors = list(csv.reader(csv_authors, delimiter=','))
+        for author in list_authors[2:]:
+            ret = identify_author_reg_datetime(author)
+            reg_datetime = author[ret['idx_reg_dt']] if ret['idx_reg_dt'] != -1 else ''
+            authors[author[0]] = {'id': author[0], 'registration_datetime': reg_datetime,
+                                  'community': ret['numeric_values'][-1], 'admin': author[2],
+                                  'moderator': author[3]}
+    return authors
+
+
+def baseline_epoch(dt_string):
+    if not dt_string:
+        return None
+    dt = parser.parse(dt_string)
+    return calendar.timegm(dt.utctimetuple()) + dt.microsecond / 1e6
+
+
+def rewrite_authors(fname, rewrite_row):
+    with open(fname, 'rb') as csv_authors:
+        rows = list(csv.reader(csv_authors, delimiter=','))
+    with open(fname, 'wb') as csv_authors:
+        writer = csv.writer(csv_authors, delimiter=',')
+        writer.writerows(rows[:author_table.HEADER_LINES])
+        writer.writerows(rewrite_row(row) for row in rows[author_table.HEADER_LINES:])
+    return len(rows)
+
+
+def append_authors(fname, rows):
+    with open(fname, 'ab') as csv_authors:
+        csv.writer(csv_authors, delimiter=',').writerows(rows)
+
+
+###
+# Authors are read with the layout inferred for their
+# file into the values the baseline probed row by row,
+# and the rows that don't follow the layout are skipped
+# and reported with their line
+###
+class AuthorTableTest(ExportsTestCase):
+
+    def setUp(self):
+        super(AuthorTableTest, self).setUp()
+        write_synthetic(seed=8)
+        fname_authors, fname_authors2 = export_fnames('data')
+        # the second export has no language column, and some
+        # registrations are unknown
+        rewrite_authors(fname_authors2, lambda row: row[:6] + row[7:])
+        self.num_lines = rewrite_authors(
+            fname_authors, lambda row: row[:5] + [''] + row[6:] if int(row[0]) % 10 == 0
+            else row)
+
+    def assertBaselineTable(self, table, baseline):
+        self.assertEqual(sorted(table.ids.tolist()), sorted(baseline.keys()))
+        for author_id, author in baseline.iteritems():
+            position = table.position(author_id)
+            self.assertEqual(table.registration_epoch(author_id),
+                             baseline_epoch(author['registration_datetime']))
+            self.assertEqual(int(table.communities[position]), author['community'])
+            self.assertEqual(table.is_admin_or_mod(author_id),
+                             author['admin'] == 'True' or author['moderator'] == 'True')
+
+    def test_baseline_authors(self):
+        baseline = baseline_authors(export_fnames('data'))
+        self.assertTrue(any(not author['registration_datetime']
+                            for author in baseline.itervalues()))
+        malformed = []
+        table = author_table.read_table(export_fnames('data'), metric_calculator.to_epoch,
+                                        malformed)
+        self.assertEqual(malformed, [])
+        self.assertBaselineTable(table, baseline)
+
+    def test_layouts(self):
+        for fname, layout in zip(export_fnames('data'),
+                                 ({'width': 8, 'registration': 5, 'community': 7},
+                                  {'width': 7, 'registration': 5, 'community': 6})):
+            with open(fname, 'rb') as csv_authors:
+                sample = list(csv.reader(csv_authors, delimiter=','))[author_table.HEADER_LINES:]
+            self.assertEqual(author_table.infer_layout(fname, sample), layout)
+        self.assertEqual(author_table.infer_layout('empty', []),
+                         {'width': 0, 'registration': None, 'community': None})
+        self.assertRaises(Exception, author_table.infer_layout, 'no_community',
+                          [['a1', 'Member 1', 'True', 'False', 'en']])
+        self.assertRaises(Exception, author_table.infer_layout, 'no_flags', [['1', '40000']])
+
+    def test_malformed_rows(self):
+        baseline = baseline_authors(export_fnames('data'))
+        fname_authors = export_fnames('data')[0]
+        append_authors(fname_authors,
+                       [['900001', 'Member', 'False', 'False', 'example.com'],
+                        ['900002', 'Member', 'False', 'False', 'example.com', '2012-01-01',
+                         'en', '40000'],
+                        ['900003', 'Member', 'False', 'False', 'example.com',
+                         '2012-01-01T00:00:00.000-07:00', 'en', 'community']])
+        with quiet():
+            table = metric_calculator.read_authors(export_fnames('data'))
+        self.assertBaselineTable(table, baseline)
+        with open(author_table.REPORT) as f_report:
+            report = f_report.read().splitlines()
+        self.assertEqual(report, [
+            '{}:{}: has 5 columns instead of 8'.format(fname_authors, self.num_lines + 1),
+            '{}:{}: registration 2012-01-01 isn\'t a datetime'.format(fname_authors,
+                                                                      self.num_lines + 2),
+            '{}:{}: community community isn\'t a number'.format(fname_authors,
+                                                                 self.num_lines + 3)])
+
+        # rows of the sample and after it are checked alike
+        author_table.SAMPLE_SIZE, sample_size = 10, author_table.SAMPLE_SIZE
+        try:
+            malformed = []
+            table = author_table.read_table(export_fnames('data'), metric_calculator.to_epoch,
+                                            malformed)
+        finally:
+            author_table.SAMPLE_SIZE = sample_size
+        self.assertEqual(['{}:{}: {}'.format(*row) for row in malformed], report)
+        self.assertBaselineTable(table, baseline)
+
+
+if __name__ == '__main__':
+    unittest.main()
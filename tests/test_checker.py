@@ -0,0 +1,109 @@
+__author__ = 'jorgesaldivar'
+
+
+import csv
+import os
+import unittest
+
+from tests.helpers import ExportsTestCase, quiet, write_synthetic
+
+import data_correctness_checker
+import external_sort
+import metric_calculator
+import synthetic_data
+
+
+def add_replies(path):
+    # replies to a comment to an idea, to a comment that
+    # isn't in the exports and to that reply
+    fname = os.path.join(path, synthetic_data.FILE_NAMES['comments'])
+    with open(fname, 'rb') as csv_comments:
+        comments = list(csv.reader(csv_comments, delimiter=','))
+    top_comment = [comment for comment in comments[1:] if comment[7] == 'idea'][0]
+    replies = [['900001', top_comment[1], '1', 0, 0, 0, '', 'comment', top_comment[0]],
+               ['900002', top_comment[1], '1', 0, 0, 0, '', 'comment', '899999'],
+               ['900003', top_comment[1], '1', 0, 0, 0, '', 'comment', '900002']]
+    with open(fname, 'ab') as csv_comments:
+        csv.writer(csv_comments, delimiter=',').writerows(reply + [top_comment[9]]
+                                                          for reply in replies)
+
+
+def baseline_errors(fname_ideas, fname_comments):
+    # the checker as it was before the index of ideas: ideas
+    # of the community scanned for every comment to an idea
+    # and replies assumed orphaned until a later comment to
+    # an idea is their parent
+    with open(fname_ideas) as csv_ideas:
+        list_ideas = list(csv.reader(csv_ideas, delimiter=','))[1:]
+    with open(fname_comments) as csv_comments:
+        comments = list(csv.reader(csv_comments, delimiter=','))[1:]
+    errors, total_errors = {}, 0
+    community_id, error_ids, orphaned_replies = None, [], []
+
+    def exists_idea_in_community(idea_id, community_id):
+        for line_idea in list_ideas:
+            if line_idea[12] != community_id:
+                return False
+            if line_idea[0] == idea_id:
+                return True
+        return False
+
+    for comment in comments + [None]:
+        if comment is None or (community_id is not None and community_id != comment[9]):
+            error_ids += [reply[0] for reply in orphaned_replies]
+            total_errors += len(orphaned_replies)
+            if error_ids:
+                errors[community_id] = error_ids
+            if comment is None:
+                break
+            while list_ideas[0][12] != comment[9]:
+                list_ideas.pop(0)
+            error_ids, orphaned_replies = [], []
+        community_id = comment[9]
+        if comment[7] == 'idea':
+            orphaned_replies = [reply for reply in orphaned_replies if reply[8] != comment[0]]
+            if not exists_idea_in_community(comment[8], comment[9]):
+                total_errors += 1
+                error_ids.append(comment[0])
+        else:
+            orphaned_replies.append(comment)
+    return len(comments), total_errors, errors
+
+
+###
+# The checker finds the orphans of the checker it
+# replaced, which only knew one level of replies (hence
+# reply_depth=1, plus a reply to an orphaned reply)
+###
+class CheckerTest(ExportsTestCase):
+
+    def test_baseline_orphans(self):
+        for seed in (1, 6):
+            write_synthetic(seed=seed, reply_depth=1, orphan_rate=0.05)
+            add_replies('data')
+            with quiet():
+                fname_ideas, fname_comments, _ = \
+                    external_sort.sort_exports(*metric_calculator.CACHED_FILES[
+                        metric_calculator.DATASET][0])
+            idea_index = data_correctness_checker.index_ideas(fname_ideas)
+            total_comments, total_errors, errors = \
+                data_correctness_checker.check_comments(fname_comments, idea_index)
+            baseline_comments, baseline_total, baseline = baseline_errors(fname_ideas,
+                                                                         fname_comments)
+            self.assertGreater(total_errors, 0)
+            self.assertEqual((total_comments, total_errors),
+                             (baseline_comments, baseline_total))
+            self.assertEqual(dict((error['community'], sorted(error['ids'])) for error in errors),
+                             dict((community_id, sorted(ids))
+                                  for community_id, ids in baseline.iteritems()))
+
+    def test_replies_to_replies(self):
+        # replies are fine as long as their chain of parents
+        # ends in a comment to an idea of the community
+        replies = [('4', '3'), ('3', '2'), ('2', '1'), ('6', '5'), ('8', '7'), ('7', '8')]
+        self.assertEqual(data_correctness_checker.orphaned_replies(replies, set(['1'])),
+                         set(['6', '7', '8']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+__author__ = 'jorgesaldivar'
+
+
+import numpy
+import os
+import unittest
+
+from tests.helpers import ExportsTestCase, quiet, read_rows, write_exports, write_synthetic
+
+import metric_calculator
+
+
+COMMUNITY_ID = '40000'
+
+
+def comment(comment_id, parent_id, hours, author_id='2'):
+    # reply to parent_id, or comment to idea 1 when there's no parent
+    parent_type, parent_id = ('comment', parent_id) if parent_id else ('idea', '1')
+    return [comment_id, '2012-01-01 {:02d}:00:00-07:00'.format(hours), author_id, 0, 0, 0, '',
+            parent_type, parent_id, COMMUNITY_ID]
+
+
+class ConversationTreesTest(ExportsTestCase):
+
+    def test_depth_three_thread(self):
+        # 1 <- 2 <- 3 <- 4, replies exported before the comments they answer
+        write_exports('data',
+                      ideas=[['1', '2012-01-01 00:00:00-07:00', '1', 'active', 5, 0, 0, 1, '', '',
+                              'en', '2012-01-01 00:00:00-07:00', COMMUNITY_ID]],
+                      comments=[comment('4', '3', 4), comment('3', '2', 3), comment('2', '1', 2),
+                                comment('1', None, 1), comment('5', None, 1, author_id='9')],
+                      authors=[['9', 'Moderator', 'False', 'True', 'example.com',
+                                '2011-01-01T00:00:00.000-07:00', 'en', COMMUNITY_ID]])
+        with quiet():
+            metric_calculator.compute_conversation_analytics()
+
+        community, = read_rows('data/community_conversations.csv')
+        self.assertEqual(community['community_id'], COMMUNITY_ID)
+        self.assertEqual(int(community['threads']), 2)
+        self.assertEqual(int(community['replied_threads']), 1)
+        self.assertEqual(int(community['replies']), 3)
+        self.assertEqual(int(community['max_depth']), 3)
+        self.assertEqual(float(community['mean_thread_depth']), 3.0)
+        self.assertEqual(float(community['branching_factor']), 1.0)
+        self.assertEqual(float(community['moderator_thread_share']), 0.5)
+        latencies = read_rows('data/community_reply_latency.csv')
+        self.assertEqual([int(level['level']) for level in latencies], [1, 2, 3])
+        for level in latencies:
+            self.assertEqual(int(level['replies']), 1)
+            self.assertEqual(float(level['median_latency_hours']), 1.0)
+        depths = numpy.load(os.path.join(metric_calculator.CONVERSATIONS, 'comments.depth.npy'))
+        self.assertEqual(sorted(depths.tolist()), [0, 0, 1, 2, 3])
+
+    def test_synthetic_replies_keep_their_depth(self):
+        write_synthetic(reply_depth=3)
+        with quiet():
+            metric_calculator.compute_conversation_analytics()
+        max_depths = [int(community['max_depth'])
+                      for community in read_rows('data/community_conversations.csv')]
+        self.assertEqual(max(max_depths), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+__author__ = 'jorgesaldivar'
+
+
+import unittest
+
+from tests.helpers import ExportsTestCase, quiet, write_synthetic
+
+import cache_manifest
+import metric_calculator
+
+
+###
+# The metrics are the same whatever the engine computing
+# them: one process or several workers, the data set or
+# one pass over the exports
+###
+class EnginesTest(ExportsTestCase):
+
+    def setUp(self):
+        super(EnginesTest, self).setUp()
+        write_synthetic(seed=7)
+        with quiet():
+            self.serial = metric_calculator.compute_metrics(workers=1)
+
+    def test_workers(self):
+        # the cache doesn't depend on the number of workers
+        cache_manifest.forget(metric_calculator.METRIC_DATA)
+        with quiet():
+            parallel = metric_calculator.compute_metrics(workers=3)
+        self.assertEqual(sorted(parallel.keys()), sorted(self.serial.keys()))
+        self.assertEqual(parallel, self.serial)
+
+    def test_streaming(self):
+        with quiet():
+            streamed = metric_calculator.compute_metrics_streaming()
+        self.assertEqual(sorted(streamed.keys()), sorted(self.serial.keys()))
+        self.assertEqual(streamed, self.serial)
+
+    def test_newcomer_windows(self):
+        with quiet():
+            windows_data = metric_calculator.sweep_newcomer_windows([5, 30, 365], workers=3)
+        for community_id, community_data in windows_data[5].iteritems():
+            newcomer_ideas = metric_calculator.newcomers_treatment(community_data)['newcomer_ideas']
+            self.assertEqual(newcomer_ideas, self.serial[community_id]['newcomer_ideas'])
+        # authors are newcomers only in the first days after
+        # their registration
+        newcomer_ideas = [sum(int(community_data['29_newcomer_ideas'])
+                              for community_data in windows_data[window].values())
+                          for window in (5, 30, 365)]
+        self.assertGreater(newcomer_ideas[0], 0)
+        self.assertLess(newcomer_ideas[0], newcomer_ideas[1])
+        self.assertLess(newcomer_ideas[1], newcomer_ideas[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+__author__ = 'jorgesaldivar'
+
+
+import csv
+import filecmp
+import os
+import random
+import shutil
+import unittest
+
+from tests.helpers import ExportsTestCase, quiet, write_synthetic
+
+import external_sort
+import metric_calculator
+import synthetic_data
+
+
+EXPORTS = [('ideas', 1), ('comments', 1), ('votes', 2)]
+
+
+def shuffle_exports(path, seed):
+    # rows of the exports in random order, headers stay
+    rng = random.Random(seed)
+    for table, header_lines in EXPORTS:
+        fname = os.path.join(path, synthetic_data.FILE_NAMES[table])
+        with open(fname, 'rb') as csv_export:
+            rows = list(csv.reader(csv_export, delimiter=','))
+        header, rows = rows[:header_lines], rows[header_lines:]
+        rng.shuffle(rows)
+        with open(fname, 'wb') as csv_export:
+            writer = csv.writer(csv_export, delimiter=',')
+            writer.writerows(header)
+            writer.writerows(rows)
+
+
+def export_fnames(path):
+    return [os.path.join(path, synthetic_data.FILE_NAMES[table]) for table, _ in EXPORTS]
+
+
+###
+# Shuffled exports sorted in runs of a few rows, merged
+# a few runs at a time, are in the order of the exports
+# sorted in memory
+###
+class SortExportsTest(ExportsTestCase):
+
+    def setUp(self):
+        super(SortExportsTest, self).setUp()
+        self.max_fan_in = external_sort.MAX_FAN_IN
+        external_sort.MAX_FAN_IN = 4
+
+    def tearDown(self):
+        external_sort.MAX_FAN_IN = self.max_fan_in
+        super(SortExportsTest, self).tearDown()
+
+    def test_shuffled_exports(self):
+        write_synthetic(seed=5)
+        os.makedirs('shuffled')
+        for fname in export_fnames('data'):
+            shutil.copy(fname, 'shuffled')
+        shuffle_exports('shuffled', 5)
+        max_rows = 7
+        with open(export_fnames('data')[1], 'rb') as csv_comments:
+            num_comments = sum(1 for _ in csv_comments)
+        # runs are merged in more than one pass
+        self.assertGreater(num_comments, max_rows * external_sort.MAX_FAN_IN ** 2)
+
+        with quiet():
+            fnames_unshuffled = external_sort.sort_exports(*export_fnames('data'))
+            fnames_sorted = external_sort.sort_exports(*export_fnames('shuffled'),
+                                                       out_dir='shuffled/sorted',
+                                                       max_rows=max_rows)
+        self.assertEqual(fnames_sorted, export_fnames('shuffled/sorted'))
+        for fname_unshuffled, fname_sorted in zip(fnames_unshuffled, fnames_sorted):
+            self.assertTrue(filecmp.cmp(fname_unshuffled, fname_sorted, shallow=False),
+                            '{} is not in order'.format(fname_sorted))
+
+    def test_metrics_of_shuffled_exports(self):
+        write_synthetic(seed=5)
+        with quiet():
+            unshuffled = metric_calculator.compute_metrics()
+        shuffle_exports('data', 5)
+        with quiet():
+            shuffled = metric_calculator.compute_metrics()
+        self.assertEqual(shuffled, unshuffled)
+
+    def test_order_is_checked_once(self):
+        write_synthetic(seed=5)
+        os.makedirs('in_order')
+        with quiet():
+            for fname in external_sort.sort_exports(*export_fnames('data')):
+                shutil.copy(fname, 'in_order')
+            fnames = external_sort.sort_exports(*export_fnames('in_order'))
+        # exports written in order are used as they are
+        self.assertEqual(fnames, export_fnames('in_order'))
+        is_sorted = external_sort.is_sorted
+
+        def fail(*args):
+            self.fail('unchanged exports were scanned again')
+        external_sort.is_sorted = fail
+        try:
+            self.assertEqual(external_sort.sort_exports(*export_fnames('in_order')), fnames)
+        finally:
+            external_sort.is_sorted = is_sorted
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+__author__ = 'jorgesaldivar'
+
+
+import collections
+import random
+import unittest
+
+from tests.helpers import ExportsTestCase, quiet, read_rows, write_synthetic
+
+import heavy_hitters
+import metric_calculator
+import synthetic_data
+
+
+def skewed_stream(seed, count, members=2000):
+    # authors picked as by synthetic_data, a few of them
+    # contribute most of the content
+    rng = random.Random(seed)
+    return [str(synthetic_data.pick_author(rng, 1.5, members)) for _ in range(count)]
+
+
+def exact_top(counts, k):
+    return sorted(counts.iteritems(), key=lambda (item, count): (-count, item))[:k]
+
+
+###
+# Sketched counts are within their bounds and the top
+# items of a skewed stream are the exact ones
+###
+class HeavyHittersTest(unittest.TestCase):
+
+    def test_top_items(self):
+        for seed in (1, 2):
+            items = skewed_stream(seed, 50000)
+            counts = collections.Counter(items)
+            hitters = heavy_hitters.HeavyHitters(0.005)
+            for item in items:
+                hitters.update(item)
+            self.assertEqual(len(hitters), len(items))
+            top = hitters.top(10)
+            self.assertEqual([item for item, _, _ in top],
+                             [item for item, _ in exact_top(counts, 10)])
+            for item, count, max_error in top:
+                self.assertTrue(count - max_error <= counts[item] <= count)
+
+    def test_count_bounds(self):
+        items = skewed_stream(3, 50000)
+        counts = collections.Counter(items)
+        error = 0.01
+        hitters = heavy_hitters.HeavyHitters(error)
+        for item in items:
+            hitters.update(item)
+        top = hitters.top(len(hitters.summary.counts))
+        for item, count, max_error in top:
+            self.assertTrue(count - max_error <= counts[item] <= count,
+                            '{}: {} not in [{}, {}]'.format(item, counts[item],
+                                                            count - max_error, count))
+        # every item seen more than error * n times is kept
+        reported = set(item for item, _, _ in top)
+        for item, count in counts.iteritems():
+            if count > error * len(items):
+                self.assertIn(item, reported)
+
+    def test_count_min_overestimate(self):
+        items = skewed_stream(4, 50000)
+        counts = collections.Counter(items)
+        error, delta = 0.01, 0.01
+        sketch = heavy_hitters.CountMinSketch(error, delta)
+        for item in items:
+            sketch.update(item)
+        overestimates = [sketch.estimate(item) - count for item, count in counts.iteritems()]
+        self.assertGreaterEqual(min(overestimates), 0)
+        # more than error * n with probability delta at most
+        beyond = sum(1 for overestimate in overestimates if overestimate > error * len(items))
+        self.assertLessEqual(beyond, delta * len(counts))
+
+
+class TopContributorsTest(ExportsTestCase):
+
+    def top_contributors(self, k, error=None):
+        with quiet():
+            metric_calculator.compute_top_contributors(k, error)
+        return read_rows('data/community_top_contributors.csv')
+
+    def test_sketched_top_contributors(self):
+        write_synthetic(seed=4, communities=3, ideas=600)
+        exact = self.top_contributors(5)
+        sketched = self.top_contributors(5, 0.005)
+        self.assertEqual([(row['community_id'], row['role'], row['rank'], row['author_id'],
+                           row['count']) for row in sketched],
+                         [(row['community_id'], row['role'], row['rank'], row['author_id'],
+                           row['count']) for row in exact])
+        # with fewer counters than authors counts are bounds
+        counts = dict(((row['community_id'], row['role'], row['author_id']), int(row['count']))
+                      for row in self.top_contributors(100000))
+        for row in self.top_contributors(3, 0.05):
+            count = counts[(row['community_id'], row['role'], row['author_id'])]
+            self.assertLessEqual(int(row['count']) - int(row['max_error']), count)
+            self.assertLessEqual(count, int(row['count']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,25 @@
+__author__ = 'jorgesaldivar'
+
+
+import unittest
+
+import id_dictionary
+
+
+class IdDictionaryTest(unittest.TestCase):
+
+    def test_encode(self):
+        dictionary = id_dictionary.IdDictionary(['7', '3'])
+        # codes are given in the order ids are first seen, ids
+        # can be a generator
+        codes = dictionary.encode(id_ for id_ in ['3', '10', '7', '10', '2'])
+        self.assertEqual(codes.tolist(), [1, 2, 0, 2, 3])
+        self.assertEqual(dictionary.decode(codes), ['3', '10', '7', '10', '2'])
+        self.assertEqual(id_dictionary.decode(dictionary.table(), codes),
+                         ['3', '10', '7', '10', '2'])
+        self.assertEqual(dictionary.lookup(['2', '11']).tolist(), [3, -1])
+        self.assertEqual(len(dictionary), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+__author__ = 'jorgesaldivar'
+
+
+import csv
+import json
+import os
+import random
+import unittest
+
+from tests.helpers import ExportsTestCase, quiet, write_synthetic
+
+import data_correctness_checker
+import incremental_update
+import metric_calculator
+import synthetic_data
+
+
+DELTA_PATH = os.path.join('data', 'delta')
+
+
+def read_export(fname, header_lines):
+    with open(fname, 'rb') as csv_export:
+        rows = list(csv.reader(csv_export, delimiter=','))
+    return rows[:header_lines], rows[header_lines:]
+
+
+def write_export(fname, header, rows):
+    with open(fname, 'wb') as csv_export:
+        writer = csv.writer(csv_export, delimiter=',')
+        writer.writerows(header)
+        writer.writerows(rows)
+
+
+def split_exports(seed, new_rate=0.03, changed_rate=0.05):
+    # moves a few ideas, with their reactions, and the last
+    # comment and vote of a few others (with the replies to
+    # the comment) from the exports to a delta export
+    rng = random.Random(seed)
+    fnames = dict((table, os.path.join('data', synthetic_data.FILE_NAMES[table]))
+                  for table in ('ideas', 'comments', 'votes'))
+    header_ideas, ideas = read_export(fnames['ideas'], 1)
+    header_comments, comments = read_export(fnames['comments'], 1)
+    header_votes, votes = read_export(fnames['votes'], 2)
+    new_ideas = set(idea[0] for idea in ideas if rng.random() < new_rate)
+    changed_ideas = set(idea[0] for idea in ideas
+                        if idea[0] not in new_ideas and rng.random() < changed_rate)
+    delta_comments = set(comment[0] for comment in comments
+                         if comment[7] == 'idea' and comment[8] in new_ideas)
+    delta_votes = set(vote[0] for vote in votes if vote[2] in new_ideas)
+    for idea_id in changed_ideas:
+        delta_comments.update([comment[0] for comment in comments
+                               if comment[7] == 'idea' and comment[8] == idea_id][-1:])
+        delta_votes.update([vote[0] for vote in votes if vote[2] == idea_id][-1:])
+    while True:
+        replies = set(comment[0] for comment in comments
+                      if comment[7] == 'comment' and comment[8] in delta_comments)
+        if replies <= delta_comments:
+            break
+        delta_comments.update(replies)
+    os.makedirs(DELTA_PATH)
+    write_export(os.path.join(DELTA_PATH, 'ideas.csv'), header_ideas,
+                 [idea for idea in ideas if idea[0] in new_ideas or idea[0] in changed_ideas])
+    write_export(os.path.join(DELTA_PATH, 'comments.csv'), header_comments,
+                 [comment for comment in comments if comment[0] in delta_comments])
+    write_export(os.path.join(DELTA_PATH, 'votes.csv'), header_votes,
+                 [vote for vote in votes if vote[0] in delta_votes])
+    write_export(fnames['ideas'], header_ideas,
+                 [idea for idea in ideas if idea[0] not in new_ideas])
+    write_export(fnames['comments'], header_comments,
+                 [comment for comment in comments if comment[0] not in delta_comments])
+    write_export(fnames['votes'], header_votes,
+                 [vote for vote in votes if vote[0] not in delta_votes])
+
+
+def saved_results():
+    with open(metric_calculator.COMMUNITY_METRICS, 'rb') as json_metrics:
+        community_metrics = json.load(json_metrics)
+    with open('data/orphaned_comments.txt', 'rb') as orphans:
+        orphan_ids = sorted(orphans.read().split())
+    total_comments, total_errors, errors = data_correctness_checker.load_report()
+    errors = dict((error['community'], sorted(error['ids'])) for error in errors)
+    return community_metrics, orphan_ids, (total_comments, total_errors, errors)
+
+
+###
+# Applying a delta export to the cached data set and
+# metrics gives the results of a full rebuild from the
+# exports including the delta, as well as its report of
+# the checker
+###
+class IncrementalUpdateTest(ExportsTestCase):
+
+    def build(self, path, seed, delta):
+        os.makedirs(os.path.join(path, 'data'))
+        os.chdir(path)
+        write_synthetic(seed=seed)
+        if delta:
+            split_exports(seed)
+        with quiet():
+            metric_calculator.save_metric_results(metric_calculator.compute_metrics())
+            if delta:
+                affected = incremental_update.apply_delta(
+                    os.path.join(DELTA_PATH, 'ideas.csv'), os.path.join(DELTA_PATH, 'comments.csv'),
+                    os.path.join(DELTA_PATH, 'votes.csv'))
+        results = saved_results()
+        os.chdir(self.tmp_dir)
+        return (results, affected) if delta else results
+
+    def test_delta_matches_full_rebuild(self):
+        for seed in (3, 11):
+            full = self.build('full_{}'.format(seed), seed, False)
+            incremental, affected = self.build('incremental_{}'.format(seed), seed, True)
+            # some communities are taken from the cache
+            self.assertTrue(0 < len(affected) < len(full[0]))
+            self.assertEqual(incremental, full)
+
+    def test_cached_metrics_are_reused(self):
+        self.build('incremental', 3, True)
+        os.chdir('incremental')
+        self.assertTrue(metric_calculator.is_cached(
+            metric_calculator.METRIC_DATA,
+            metric_calculator.metric_data_options(None, metric_calculator.NEWCOMER_WINDOW)))
+        self.assertTrue(metric_calculator.is_cached(metric_calculator.COMMUNITY_METRICS))
+        self.assertFalse(metric_calculator.is_cached(
+            metric_calculator.METRIC_DATA,
+            metric_calculator.metric_data_options(0.01, metric_calculator.NEWCOMER_WINDOW)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+__author__ = 'jorgesaldivar'
+
+
+import csv
+import unittest
+
+from tests.helpers import ExportsTestCase, quiet, write_synthetic
+
+import external_sort
+import metric_calculator
+
+
+def get_dict(keys, values):
+    return dict(zip(keys, values))
+
+
+def baseline_dataset(fname_ideas, fname_comments, fname_orphan_comments, fname_votes):
+    # build_dataset as it was before the merge-join: the
+    # three exports in lists, orphans in a list and replies
+    # held back in a list scanned for every comment to an idea
+    community_ideas, total_dict = [], {}
+    with open(fname_ideas, 'rb') as csv_ideas, open(fname_comments, 'rb') as csv_comments, \
+            open(fname_votes, 'rb') as csv_votes:
+        list_ideas = list(csv.reader(csv_ideas, delimiter=','))
+        list_comments = list(csv.reader(csv_comments, delimiter=','))
+        list_votes = list(csv.reader(csv_votes, delimiter=','))
+    with open(fname_orphan_comments) as f_orphans:
+        orphan_comments = [line.rstrip() for line in f_orphans]
+    header_ideas, header_comments, header_votes = list_ideas[0], list_comments[0], list_votes[1]
+    community_id = list_ideas[1][12]
+    comment_pointer, vote_pointer, hold_replies = 1, 2, []
+    for line_idea in list_ideas[1:]:
+        if line_idea[12] != community_id:
+            total_dict[community_id] = community_ideas
+            community_id = line_idea[12]
+            community_ideas = []
+        dict_idea = get_dict(header_ideas, line_idea)
+        idea_id = line_idea[0]
+        idea_comments, comment_ids = [], []
+        for idx_comment in range(comment_pointer, len(list_comments)):
+            line_comment = list_comments[idx_comment]
+            if line_comment[0] in orphan_comments:
+                continue
+            if line_comment[7] == 'idea':
+                if line_comment[8] != idea_id:
+                    comment_pointer = idx_comment
+                    break
+                idea_comments.append(get_dict(header_comments, line_comment))
+                comment_ids.append(line_comment[0])
+                for hold_reply in list(hold_replies):
+                    if hold_reply['parent_id'] == line_comment[0]:
+                        idea_comments.append(hold_reply)
+                        hold_replies.remove(hold_reply)
+            elif line_comment[8] in comment_ids:
+                idea_comments.append(get_dict(header_comments, line_comment))
+            else:
+                hold_replies.append(get_dict(header_comments, line_comment))
+        else:
+            comment_pointer = len(list_comments)
+        dict_idea['comments_array'] = idea_comments
+        idea_votes = []
+        for idx_vote in range(vote_pointer, len(list_votes)):
+            line_vote = list_votes[idx_vote]
+            if line_vote[2] != idea_id:
+                vote_pointer = idx_vote
+                break
+            idea_votes.append(get_dict(header_votes, line_vote))
+        else:
+            vote_pointer = len(list_votes)
+        dict_idea['votes_array'] = idea_votes
+        community_ideas.append(dict_idea)
+    if len(community_ideas) > 0:
+        total_dict[community_id] = community_ideas
+    return total_dict
+
+
+def summary(ideas):
+    # ids, authors and counters of the ideas and of their
+    # comments and votes, in their order
+    return [(idea['id'], idea['author_id'], int(idea['comments']),
+             [(comment['id'], comment['parent_id'], comment['author_id'])
+              for comment in idea['comments_array']],
+             [(vote['id'], vote['author'], int(vote['value'])) for vote in idea['votes_array']])
+            for idea in ideas]
+
+
+###
+# The merge-join over the sorted exports builds the data
+# set of the reader it replaced, which only attached
+# replies to comments to ideas (hence reply_depth=1)
+###
+class MergeJoinTest(ExportsTestCase):
+
+    def test_baseline_dataset(self):
+        for seed in (2, 9):
+            write_synthetic(seed=seed, reply_depth=1)
+            with quiet():
+                data = metric_calculator.load_data()
+            fname_ideas, fname_comments, fname_votes = \
+                external_sort.sort_exports(*metric_calculator.CACHED_FILES[
+                    metric_calculator.DATASET][0])
+            with quiet():
+                baseline = baseline_dataset(fname_ideas, fname_comments,
+                                            'data/orphaned_comments.txt', fname_votes)
+            self.assertEqual(sorted(data.keys()), sorted(baseline.keys()))
+            for community_id, ideas in baseline.iteritems():
+                self.assertEqual(summary(data[community_id]), summary(ideas))
+
+    def test_replies_held_back_across_ideas(self):
+        write_synthetic(seed=2, reply_depth=1)
+        with quiet():
+            data = metric_calculator.load_data()
+        # replies come first in their community, those to
+        # comments of the later ideas wait for them
+        held_across_ideas = 0
+        for community_id, ideas in data.iteritems():
+            for idea in ideas[1:]:
+                held_across_ideas += sum(1 for comment in idea['comments_array']
+                                         if comment['parent_type'] == 'comment')
+        self.assertGreater(held_across_ideas, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
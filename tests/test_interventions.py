@@ -0,0 +1,102 @@
+__author__ = 'jorgesaldivar'
+
+
+import csv
+import os
+import unittest
+
+from tests.helpers import ExportsTestCase, quiet, write_synthetic
+
+import metric_calculator
+import synthetic_data
+
+
+def read_flags(path):
+    # admin and moderator flags by author, as load_authors
+    # kept them
+    authors = {}
+    for name in ('authors', 'authors2'):
+        with open(os.path.join(path, synthetic_data.FILE_NAMES[name]), 'rb') as csv_authors:
+            for author in list(csv.reader(csv_authors, delimiter=','))[2:]:
+                authors[author[0]] = {'admin': author[2], 'moderator': author[3]}
+    return authors
+
+
+def is_author_admin_or_mod(authors, author_id):
+    author = authors.get(author_id)
+    return bool(author) and (author['admin'] == 'True' or author['moderator'] == 'True')
+
+
+def baseline_rows(data, authors):
+    # compute_influence_mod_intervention as it was before
+    # the counts by idea with bincount: a loop over the
+    # comments and votes of every idea
+    rows = []
+    with open('data/communities_dataset.csv', 'rb') as csv_communities:
+        for community in list(csv.reader(csv_communities, delimiter=','))[1:]:
+            community_id = community[0]
+            community_users = int(community[8])
+            if metric_calculator.problematic_community(community_id):
+                continue
+            if community_id not in data:
+                continue
+            for idea in data[community_id]:
+                comments = int(idea['comments'])
+                if len(idea['comments_array']) != comments:
+                    continue
+                votes = int(idea['up_votes']) + int(idea['down_votes'])
+                score = int(idea['up_votes']) - int(idea['down_votes'])
+                if len(idea['votes_array']) != votes:
+                    continue
+                is_admin = is_author_admin_or_mod(authors, idea['author_id'])
+                author_comments, author_votes, mod_comments, mod_votes = 0, 0, 0, 0
+                participants = []
+                for comment in idea['comments_array']:
+                    if is_author_admin_or_mod(authors, comment['author_id']):
+                        mod_comments += 1
+                    elif comment['author_id'] == idea['author_id']:
+                        author_comments += 1
+                    elif comment['author_id'] not in participants:
+                        participants.append(comment['author_id'])
+                distinct_author_comments = len(participants)
+                for vote in idea['votes_array']:
+                    if vote['author'] == idea['author_id']:
+                        author_votes += 1
+                    elif is_author_admin_or_mod(authors, vote['author']):
+                        mod_votes += 1
+                    elif vote['author'] not in participants:
+                        participants.append(vote['author'])
+                rows.append([community_id, community_users, idea['id'], comments, votes, score,
+                             mod_comments, mod_votes, distinct_author_comments, is_admin,
+                             author_comments, author_votes, len(participants)])
+    return [[str(value) for value in row] for row in rows]
+
+
+###
+# Interventions of moderators counted by idea with
+# bincount are the ones of the loop they replaced, with
+# one process or several workers
+###
+class InterventionsTest(ExportsTestCase):
+
+    def test_baseline_rows(self):
+        write_synthetic(seed=12, anomaly_rate=0.05)
+        with quiet():
+            data = metric_calculator.load_data()
+        baseline = baseline_rows(data, read_flags('data'))
+        # ideas with comments or votes missing are skipped
+        self.assertLess(len(baseline), sum(len(data[community_id])
+                                           for community_id in data.communities))
+        for column in (6, 7, 8, 9, 10, 11, 12):
+            self.assertTrue(any(row[column] not in ('0', 'False') for row in baseline))
+        for workers in (1, 3):
+            with quiet():
+                metric_calculator.compute_influence_mod_intervention(workers)
+            with open('data/community_mod_intervention_details.csv', 'rb') as csv_output:
+                rows = list(csv.reader(csv_output, delimiter=','))
+            self.assertEqual(rows[0][:3], ['community_id', 'users', 'idea_id'])
+            self.assertEqual(rows[1:], baseline)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+__author__ = 'jorgesaldivar'
+
+
+import numpy
+import unittest
+
+from tests.helpers import ExportsTestCase, quiet, read_rows, write_exports
+
+import metric_calculator
+
+
+DT = '2012-01-01 00:00:00-07:00'
+
+
+def idea(idea_id, author_id, community_id):
+    return [idea_id, DT, author_id, 'active', 0, 0, 0, 1, '', '', 'en', DT, community_id]
+
+
+def comment(comment_id, author_id, idea_id, community_id):
+    return [comment_id, DT, author_id, 0, 0, 0, '', 'idea', idea_id, community_id]
+
+
+def vote(vote_id, author_id, idea_id):
+    return [vote_id, author_id, idea_id, 1, DT]
+
+
+def dense_edges(members, min_overlap, min_jaccard):
+    # pairs of rows above the thresholds, from the dense product
+    dense = members.toarray()
+    shared = dense.dot(dense.T)
+    sizes = dense.sum(axis=1)
+    edges = []
+    for row in range(len(dense)):
+        for col in range(row + 1, len(dense)):
+            if shared[row, col] == 0:
+                continue
+            jaccard = shared[row, col] / float(sizes[row] + sizes[col] - shared[row, col])
+            if shared[row, col] >= min_overlap and jaccard >= min_jaccard:
+                edges.append((row, col, sizes[row], sizes[col], shared[row, col], jaccard))
+    return edges
+
+
+###
+# The overlap of communities computed by chunks of rows
+# of the sparse incidence matrix is the upper triangle of
+# the dense product of the matrix by its transpose
+###
+@unittest.skipIf(metric_calculator.sparse is None, 'the overlap of communities needs scipy')
+class OverlapTest(ExportsTestCase):
+
+    def test_dense_product(self):
+        rng = numpy.random.RandomState(3)
+        dense = (rng.random_sample((11, 40)) < 0.2).astype(numpy.int32)
+        dense[7] = 0  # a community without members
+        members = metric_calculator.sparse.csr_matrix(dense)
+        for min_overlap, min_jaccard in ((1, 0.0), (2, 0.0), (1, 0.1)):
+            expected = dense_edges(members, min_overlap, min_jaccard)
+            self.assertGreater(len(expected), 0)
+            # chunks of 4 rows, pairs cross chunk boundaries
+            for chunk in (4, 11, 100):
+                edges = []
+                for chunk_edges in metric_calculator.overlap_edges(members, min_overlap,
+                                                                   min_jaccard, chunk):
+                    edges.extend(zip(*[values.tolist() for values in chunk_edges]))
+                self.assertEqual([edge[:5] for edge in edges],
+                                 [edge[:5] for edge in expected])
+                for edge, expected_edge in zip(edges, expected):
+                    self.assertAlmostEqual(edge[5], expected_edge[5])
+
+    def test_members_of_exports(self):
+        # members are authors of ideas, comments or votes
+        write_exports('data',
+                      ideas=[idea('1', '10', '1'), idea('2', '11', '2'), idea('3', '12', '3')],
+                      comments=[comment('1', '11', '1', '1'), comment('2', '12', '2', '2')],
+                      votes=[vote('1', '12', '1'), vote('2', '10', '2'), vote('3', '13', '3')])
+        with quiet():
+            metric_calculator.compute_community_overlap()
+        edges = [(edge['community_a'], edge['community_b'], int(edge['members_a']),
+                  int(edge['members_b']), int(edge['shared_members']), float(edge['jaccard']))
+                 for edge in read_rows('data/community_overlap.csv')]
+        # community 1: 10, 11, 12, community 2: 10, 11, 12,
+        # community 3: 12, 13
+        self.assertEqual(edges, [('1', '2', 3, 3, 3, 1.0), ('1', '3', 3, 2, 1, 0.25),
+                                 ('2', '3', 3, 2, 1, 0.25)])
+
+
+if __name__ == '__main__':
+    unittest.main()
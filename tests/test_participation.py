@@ -0,0 +1,62 @@
+__author__ = 'jorgesaldivar'
+
+
+import csv
+import unittest
+
+from tests.helpers import ExportsTestCase, quiet, write_synthetic
+
+import metric_calculator
+
+
+def baseline_rows(data):
+    # compute_participation_level as it was before the masks
+    # of roles: sets of ideators, voters and commenters by
+    # community and their intersections
+    max_top_ideators = 5
+    rows = []
+    for community_id in data.communities:
+        ideators, voters, commenters = set(), set(), set()
+        dict_ideators = {}
+        for idea in data[community_id]:
+            ideators.add(idea['author_id'])
+            dict_ideators[idea['author_id']] = dict_ideators.get(idea['author_id'], 0) + 1
+            for comment in idea['comments_array']:
+                commenters.add(comment['author_id'])
+            for vote in idea['votes_array']:
+                voters.add(vote['author'])
+        top_ideators = sorted(dict_ideators.values(), reverse=True)[:max_top_ideators]
+        rows.append([community_id, len(ideators), len(voters), len(commenters),
+                     len(ideators & voters & commenters), len(ideators & voters),
+                     len(ideators & commenters), len(commenters & voters),
+                     len((ideators - voters) - commenters), len((voters - ideators) - commenters),
+                     len((commenters - ideators) - voters),
+                     "-".join(map(str, top_ideators)), sum(top_ideators)])
+    return [[str(value) for value in row] for row in rows]
+
+
+###
+# Participation counted from the masks of roles of the
+# (community, author) pairs is the one of the sets of
+# ideators, voters and commenters it replaced
+###
+class ParticipationTest(ExportsTestCase):
+
+    def test_baseline_rows(self):
+        for seed in (5, 13):
+            write_synthetic(seed=seed, activity=1.2)
+            with quiet():
+                data = metric_calculator.load_data()
+                metric_calculator.compute_participation_level()
+            baseline = baseline_rows(data)
+            with open('data/community_participation_level.csv', 'rb') as csv_output:
+                rows = list(csv.reader(csv_output, delimiter=','))
+            self.assertEqual(rows[0][:4], ['community_id', 'ideators', 'voters', 'commenters'])
+            self.assertEqual(sorted(rows[1:]), sorted(baseline))
+            # authors with one, two and three roles
+            for column in (4, 5, 6, 7, 8, 9, 10):
+                self.assertTrue(any(row[column] != '0' for row in baseline))
+
+
+if __name__ == '__main__':
+    unittest.main()
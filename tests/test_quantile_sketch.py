@@ -0,0 +1,91 @@
+__author__ = 'jorgesaldivar'
+
+
+import bisect
+import random
+import unittest
+
+from tests.helpers import ExportsTestCase, quiet, write_synthetic
+
+import metric_calculator
+import quantile_sketch
+import synthetic_data
+
+
+FRACTIONS = [0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99]
+
+
+def response_times(seed, count):
+    # heavy tailed, as the response times of the exports,
+    # truncated to hours so there are ties
+    rng = random.Random(seed)
+    return [int(100 * synthetic_data.pareto(rng, 1.5)) for _ in range(count)]
+
+
+###
+# Quantiles of the sketches are within the rank error
+# they were built with, fed value by value or merged as
+# done by the workers
+###
+class KLLSketchTest(unittest.TestCase):
+
+    def assertRankError(self, sketch, values, error):
+        values = sorted(values)
+        for fraction, quantile in zip(FRACTIONS, sketch.quantiles(FRACTIONS)):
+            # ranks of the quantile, several when it's repeated
+            low = bisect.bisect_left(values, quantile)
+            high = bisect.bisect_right(values, quantile)
+            rank = fraction * len(values)
+            self.assertLessEqual(low - error * len(values), rank,
+                                 'quantile {} is too high'.format(fraction))
+            self.assertGreaterEqual(high + error * len(values), rank,
+                                    'quantile {} is too low'.format(fraction))
+
+    def test_rank_error(self):
+        for seed, error in ((1, 0.01), (2, 0.01), (3, 0.05)):
+            values = response_times(seed, 50000)
+            sketch = quantile_sketch.KLLSketch(error)
+            for value in values:
+                sketch.update(value)
+            self.assertFalse(sketch.is_exact())
+            self.assertEqual(sketch.count, len(values))
+            self.assertRankError(sketch, values, error)
+
+    def test_merged_rank_error(self):
+        values = response_times(4, 50000)
+        sketches = []
+        for start in range(0, len(values), 5000):
+            sketch = quantile_sketch.KLLSketch(0.01)
+            for value in values[start:start + 5000]:
+                sketch.update(value)
+            sketches.append(quantile_sketch.from_dict(sketch.to_dict()))
+        merged = reduce(lambda sketch, other: sketch.merge(other), sketches)
+        self.assertEqual(merged.count, len(values))
+        self.assertRankError(merged, values, 0.01)
+
+    def test_short_streams_are_exact(self):
+        values = response_times(5, 100)
+        sketch = quantile_sketch.KLLSketch(0.01)
+        for value in values:
+            sketch.update(value)
+        self.assertTrue(sketch.is_exact())
+        self.assertEqual(sorted(sketch.values()), sorted(values))
+
+
+class SketchedMetricsTest(ExportsTestCase):
+
+    def test_exact_for_small_communities(self):
+        # communities have fewer response times than the
+        # capacity of the sketches, so they are kept in full
+        write_synthetic(seed=7)
+        with quiet():
+            exact = metric_calculator.compute_metrics()
+            sketched = metric_calculator.compute_metrics(quantile_error=0.01)
+        for community_id, metrics in exact.iteritems():
+            for metric in ('ideas_median_response_time_hours',
+                           'comments_median_response_time_hours'):
+                self.assertEqual(sketched[community_id][metric], metrics[metric])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+__author__ = 'jorgesaldivar'
+
+
+from dateutil import parser
+
+import calendar
+import csv
+import os
+import unittest
+
+from tests.helpers import ExportsTestCase, write_synthetic
+
+import metric_calculator
+import records
+import synthetic_data
+
+
+EXPORTS = [('ideas', 1), ('comments', 1), ('votes', 2)]
+
+
+def get_dict(keys, values):
+    return dict(zip(keys, values))
+
+
+def baseline_epoch(dt_string):
+    # the datetime the metrics parsed with dateutil, in
+    # seconds since epoch
+    dt = parser.parse(dt_string)
+    epoch = calendar.timegm(dt.utctimetuple() if dt.utcoffset() is not None
+                            else dt.timetuple())
+    return epoch + dt.microsecond / 1e6 if dt.microsecond else epoch
+
+
+def read_export(path, table, header_lines):
+    with open(os.path.join(path, synthetic_data.FILE_NAMES[table]), 'rb') as csv_export:
+        rows = list(csv.reader(csv_export, delimiter=','))
+    return rows[header_lines - 1], rows[header_lines:]
+
+
+###
+# Records read from the exports hold the values of the
+# dictionaries they replaced, with counters as the int()
+# the metrics took of them and the creation datetime as
+# the epoch of the datetime dateutil parsed
+###
+class RowReaderTest(ExportsTestCase):
+
+    def assertBaselineRecord(self, header, row, record):
+        dict_row = get_dict(header, row)
+        self.assertEqual(sorted(record.keys()),
+                         sorted(header + [records.EPOCH_FIELD] + list(records.ARRAY_FIELDS)))
+        for field, value in dict_row.iteritems():
+            if field in records.INT_FIELDS:
+                self.assertEqual(record[field], int(value) if value else 0)
+                self.assertIsInstance(record[field], int)
+            else:
+                self.assertEqual(record[field], value)
+        self.assertEqual(record[records.EPOCH_FIELD],
+                         baseline_epoch(dict_row['creation_datetime']))
+        self.assertEqual((record.comments_array, record.votes_array), ([], []))
+
+    def test_baseline_values(self):
+        write_synthetic(seed=3, anomaly_rate=0.1)
+        for table, header_lines in EXPORTS:
+            header, rows = read_export('data', table, header_lines)
+            row_reader = records.RowReader(header, metric_calculator.to_epoch)
+            self.assertGreater(len(rows), 0)
+            for row in rows:
+                self.assertBaselineRecord(header, row, row_reader.read(row))
+
+    def test_datetime_formats(self):
+        # formats parsed without dateutil and one left to it
+        header = list(synthetic_data.HEADER_VOTES)
+        row_reader = records.RowReader(header, metric_calculator.to_epoch)
+        for dt_string in ('2012-03-04 05:06:07-07:00', '2012-03-04T05:06:07.250-0700',
+                          '2012-03-04T05:06:07Z', '2012-03-04 05:06:07+05:30',
+                          '2012-03-04 05:06:07', '2012-03-04 05:06:07.5',
+                          'March 4, 2012 5:06:07 PM -0700'):
+            row = ['1', '2', '3', '', dt_string]
+            self.assertBaselineRecord(header, row, row_reader.read(row))
+
+    def test_without_epoch(self):
+        header = list(synthetic_data.HEADER_VOTES)
+        record = records.RowReader(header).read(['1', '2', '3', '-1', '2012-03-04 05:06:07'])
+        self.assertIsNone(record.get(records.EPOCH_FIELD))
+        self.assertEqual(record['value'], -1)
+        self.assertRaises(Exception, records.RowReader(header).read, ['1', '2', '3'])
+
+
+if __name__ == '__main__':
+    unittest.main()